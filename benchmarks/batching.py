@@ -0,0 +1,60 @@
+'''Counts server-to-server messages and signatures per committed request on a
+four server cluster, with and without leader-side batching, as clients send
+bursts of requests faster than they are committed.'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.tests.configs.four_servers_four_clients import (
+    NUM_CLIENTS, build_server_config, client_private_keys)
+from bft_raft.tests.helpers.cluster import MemoryQueueCluster
+
+NUM_BURSTS = 10
+
+
+def run(max_batch_size: int, burst: int) -> tuple:
+    configs = [build_server_config(i) for i in range(4)]
+    for config in configs:
+        config.enable_logging = False
+        config.max_batch_size = max_batch_size
+    cluster = MemoryQueueCluster(configs)
+    cluster.pump()  # run the initial election
+    messengers = [server.memqueue_messenger for server in cluster.servers]
+    num_signed = sum(m.num_signed for m in messengers)
+
+    # All requests of a burst arrive before any of them is committed
+    start = time.perf_counter()
+    num_delivered = 0
+    seqnos = [0] * NUM_CLIENTS
+    for _ in range(NUM_BURSTS):
+        for i in range(burst):
+            client = i % NUM_CLIENTS
+            cluster.submit(client, client_private_keys[client],
+                           seqnos[client], b'operation')
+            seqnos[client] += 1
+        num_delivered += cluster.pump()
+    elapsed = time.perf_counter() - start
+
+    num_requests = NUM_BURSTS * burst
+    assert cluster.servers[0].state.applied_c_cert.slot == num_requests - 1
+    num_signed = sum(m.num_signed for m in messengers) - num_signed
+    return (num_delivered / num_requests, num_signed / num_requests,
+            num_requests / elapsed,
+            cluster.servers[0].state.batching.stats()['mean_size'])
+
+
+def main():
+    print('%-8s %-12s %12s %12s %12s %12s' % (
+        'burst', 'batching', 'msgs/req', 'sigs/req', 'req/s', 'batch size'))
+    for burst in (4, 16, 64):
+        for max_batch_size, name in ((1, 'off'), (64, 'adaptive')):
+            messages, signatures, rate, size = run(max_batch_size, burst)
+            print('%-8d %-12s %12.1f %12.1f %12.0f %12.1f' % (
+                burst, name, messages, signatures, rate, size))
+
+
+if __name__ == "__main__":
+    main()
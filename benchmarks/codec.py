@@ -0,0 +1,88 @@
+'''Compares the message encoding used by AsyncIoMessenger with pickle on
+AppendEntries and C-certificate frames: frame size, encoding and decoding
+time, and the time to read just the envelope (sender and signature) of a
+frame with EnvelopeView.'''
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.messages import (AppendEntriesRequest, AppendEntriesSuccess,
+                               CCert, CertMessage, ClientRequest, CommitMessage,
+                               LogEntry, SignedMessage)
+from bft_raft.messages.encoding import decode
+from bft_raft.messages.frame import EnvelopeView
+from bft_raft.messages.hashable import Hashable
+from bft_raft.tests.helpers.gen_keys import gen_keys
+
+NUM_ITERATIONS = 500
+NUM_ENTRIES = 10
+OPERATION_SIZE = 128
+
+
+def build_append_entries(server_keys: dict, client_key) -> SignedMessage:
+    entries = []
+    prev_ihash = b'0'
+    for i in range(NUM_ENTRIES):
+        req = SignedMessage(ClientRequest(0, i, b'x' * OPERATION_SIZE), client_key)
+        entries.append(LogEntry(1, prev_ihash, req))
+        prev_ihash = entries[-1].incremental_hash()
+    success = SignedMessage(
+        AppendEntriesSuccess(0, 1, NUM_ENTRIES - 1, prev_ihash), server_keys[0])
+    return SignedMessage(
+        AppendEntriesRequest(0, 1, entries, 0, success), server_keys[0])
+
+
+def build_c_cert(server_keys: dict) -> SignedMessage:
+    num_servers = len(server_keys)
+    quorum = 2 * ((num_servers - 1) // 3) + 1
+    commits = [SignedMessage(CommitMessage(i, 1, 5, b'h' * 32), server_keys[i])
+               for i in range(quorum)]
+    cert = CCert(5, b'h' * 32, 1, commits)
+    return SignedMessage(CertMessage(0, 1, cert), server_keys[0])
+
+
+def time_us(func) -> float:
+    return timeit.timeit(func, number=NUM_ITERATIONS) / NUM_ITERATIONS * 1e6
+
+
+def measure(name: str, envelope: SignedMessage) -> None:
+    pickled = pickle.dumps(envelope)
+
+    # Encode from scratch each time, as for a newly created message (an
+    # unpickled copy has no cached encodings)
+    fresh = pickle.loads(pickled)
+    Hashable.cache_digests = False
+    try:
+        pickle_encode = time_us(lambda: pickle.dumps(fresh))
+        codec_encode = time_us(fresh.encode)
+    finally:
+        Hashable.cache_digests = True
+    encoded = envelope.encode()
+    pickle_decode = time_us(lambda: pickle.loads(pickled))
+    codec_decode = time_us(lambda: decode(encoded))
+    peek = time_us(lambda: EnvelopeView(encoded))
+
+    print('%-28s %-7s %8d %12.1f %12.1f' % (
+        name, 'pickle', len(pickled), pickle_encode, pickle_decode))
+    print('%-28s %-7s %8d %12.1f %12.1f %12.1f' % (
+        '', 'codec', len(encoded), codec_encode, codec_decode, peek))
+
+
+def main():
+    print('%-28s %-7s %8s %12s %12s %12s' % (
+        'frame', 'format', 'bytes', 'encode (us)', 'decode (us)', 'peek (us)'))
+    _, client_keys = gen_keys(range(4))
+    for num_servers in (4, 10):
+        _, server_keys = gen_keys(range(num_servers))
+        if num_servers == 4:
+            measure('AppendEntries (%d entries)' % NUM_ENTRIES,
+                    build_append_entries(server_keys, client_keys[0]))
+        measure('CCert (n=%d)' % num_servers, build_c_cert(server_keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+'''Compares the all-to-all commit path with the collector one
+(ServerConfig.collector_commit) on clusters of 4, 7 and 10 servers: messages
+delivered per committed request, in total and to the busiest server, the
+signatures checked to verify them, and committed requests per second.'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.config import ServerConfig
+from bft_raft.tests.helpers.cluster import MemoryQueueCluster
+from bft_raft.tests.helpers.gen_keys import gen_keys
+
+NUM_CLIENTS = 4
+NUM_REQUESTS = 40
+
+client_public_keys, client_private_keys = gen_keys(range(NUM_CLIENTS))
+
+
+def run(num_servers: int, server_keys: tuple, collector_commit: bool) -> tuple:
+    server_public_keys, server_private_keys = server_keys
+    configs = []
+    for i in range(num_servers):
+        config = ServerConfig(i, client_public_keys, server_public_keys,
+                              server_private_keys[i])
+        config.enable_logging = False
+        config.collector_commit = collector_commit
+        configs.append(config)
+    cluster = MemoryQueueCluster(configs)
+    cluster.pump()  # run the initial election
+
+    # Count messages by recipient
+    received = [0] * num_servers
+
+    def count(server, envelope) -> bool:
+        received[cluster.servers.index(server)] += 1
+        return False
+    cluster.drop = count
+    misses = sum(c.signature_cache.misses for c in configs)
+
+    # One request at a time, so every request is its own batch
+    start = time.perf_counter()
+    for seqno in range(NUM_REQUESTS):
+        client = seqno % NUM_CLIENTS
+        cluster.submit(client, client_private_keys[client],
+                       seqno // NUM_CLIENTS, b'operation')
+        cluster.pump()
+    elapsed = time.perf_counter() - start
+
+    assert cluster.servers[0].state.applied_c_cert.slot == NUM_REQUESTS - 1
+    misses = sum(c.signature_cache.misses for c in configs) - misses
+    return (sum(received) / NUM_REQUESTS, max(received) / NUM_REQUESTS,
+            misses / NUM_REQUESTS, NUM_REQUESTS / elapsed)
+
+
+def main():
+    print('%-4s %-12s %12s %14s %12s %10s' % (
+        'n', 'commit', 'msgs/req', 'busiest/req', 'verifs/req', 'req/s'))
+    for num_servers in (4, 7, 10):
+        server_keys = gen_keys(range(num_servers))
+        for collector_commit, name in ((False, 'all-to-all'),
+                                       (True, 'collector')):
+            messages, busiest, verifications, rate = run(
+                num_servers, server_keys, collector_commit)
+            print('%-4d %-12s %12.1f %14.1f %12.1f %10.0f' % (
+                num_servers, name, messages, busiest, verifications, rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+'''Measures how well each compression codec AsyncIoMessenger can use shrinks
+catch-up frames (a CatchupResponse, and an AppendEntries carrying a whole log
+suffix as sent in reply to a LogResend), and how long compressing and
+decompressing them takes.'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.messages import (AppendEntriesRequest, CatchupResponse,
+                               ClientRequest, LogEntry, SignedMessage)
+from bft_raft.messages.compression import CODECS, compress, decompress
+from bft_raft.tests.helpers.gen_keys import gen_keys
+
+NUM_ITERATIONS = 20
+NUM_ENTRIES = 200
+
+
+def build_entries(client_keys: dict) -> list:
+    entries = []
+    prev_ihash = b'0'
+    for i in range(NUM_ENTRIES):
+        operation = b'SET user:%d {"name": "user %d", "visits": %d}' % (
+            i % 50, i % 50, i)
+        req = SignedMessage(ClientRequest(i % 4, i, operation),
+                            client_keys[i % 4])
+        entries.append(LogEntry(1, prev_ihash, req))
+        prev_ihash = entries[-1].incremental_hash()
+    return entries
+
+
+def time_us(func) -> float:
+    return timeit.timeit(func, number=NUM_ITERATIONS) / NUM_ITERATIONS * 1e6
+
+
+def measure(name: str, envelope: SignedMessage) -> None:
+    encoded = envelope.encode()
+    print('%-30s %-6s %8d %8s %14s %16s' % (name, 'none', len(encoded), '',
+                                            '', ''))
+    for codec, (codec_name, _, _) in sorted(CODECS.items()):
+        compressed = compress(codec, encoded)
+        compress_time = time_us(lambda: compress(codec, encoded))
+        decompress_time = time_us(
+            lambda: decompress(codec, compressed, len(encoded)))
+        print('%-30s %-6s %8d %8.2f %14.1f %16.1f' % (
+            '', codec_name, len(compressed), len(encoded) / len(compressed),
+            compress_time, decompress_time))
+
+
+def main():
+    print('%-30s %-6s %8s %8s %14s %16s' % (
+        'frame', 'codec', 'bytes', 'ratio', 'compress (us)',
+        'decompress (us)'))
+    _, server_keys = gen_keys(range(4))
+    _, client_keys = gen_keys(range(4))
+    entries = build_entries(client_keys)
+    measure('CatchupResponse (%d entries)' % NUM_ENTRIES, SignedMessage(
+        CatchupResponse(0, 1, 0, entries), server_keys[0]))
+    measure('AppendEntries (%d entries)' % NUM_ENTRIES, SignedMessage(
+        AppendEntriesRequest(0, 1, entries, 0, None), server_keys[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''Compares the cost of signing and verifying each message type with the
+available crypto backends.'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.config import ServerConfig
+from bft_raft.crypto.ecdsa import ECDSABackend
+from bft_raft.crypto.hmac import HMACBackend, NullBackend
+from bft_raft.crypto.rsa import RSABackend
+from bft_raft.messages import (AppendEntriesRequest, AppendEntriesSuccess,
+                               ClientRequest, ClientResponse, LogEntry,
+                               SignedMessage, VoteMessage)
+from bft_raft.tests.helpers.gen_keys import gen_keys
+
+NUM_ITERATIONS = 200
+NUM_ENTRIES = 10
+
+
+def build_backends() -> list:
+    backends = [('RSA-1024', RSABackend(1024)), ('RSA-2048', RSABackend(2048))]
+    try:
+        backends.append(('ECDSA-P256', ECDSABackend()))
+    except ImportError:
+        print('(skipping ECDSA: the cryptography package is not installed)')
+    backends += [('HMAC-SHA256', HMACBackend()), ('null', NullBackend())]
+    return backends
+
+
+def build_messages(config: ServerConfig, client_key) -> list:
+    '''Returns (name, factory) pairs; each factory builds a new message.'''
+    backend = config.crypto_backend
+    entries = []
+    prev_ihash = b'0'
+    for i in range(NUM_ENTRIES):
+        req = SignedMessage(ClientRequest(0, i, b'x' * 64), client_key, backend)
+        entries.append(LogEntry(0, prev_ihash, req))
+        prev_ihash = entries[-1].incremental_hash()
+    success = SignedMessage(AppendEntriesSuccess(0, 0, NUM_ENTRIES - 1, prev_ihash),
+                            config.private_key, backend)
+    return [
+        ('ClientRequest', lambda: ClientRequest(0, 0, b'x' * 64)),
+        ('ClientResponse', lambda: ClientResponse(0, 0, 0, b'x' * 64)),
+        ('AppendEntriesSuccess', lambda: AppendEntriesSuccess(0, 0, 0, b'h' * 32)),
+        ('AppendEntriesRequest (heartbeat)',
+         lambda: AppendEntriesRequest(0, 0, [], 0, None)),
+        ('AppendEntriesRequest (%d entries)' % NUM_ENTRIES,
+         lambda: AppendEntriesRequest(0, 0, list(entries), 0, success)),
+        ('VoteMessage', lambda: VoteMessage(0, 1, None)),
+    ]
+
+
+def main():
+    backends = build_backends()
+    print('%-12s %-36s %10s %10s' % ('backend', 'message', 'sign (us)', 'verify (us)'))
+    for backend_name, backend in backends:
+        client_pubkeys, client_privkeys = gen_keys(range(4), backend=backend)
+        server_pubkeys, server_privkeys = gen_keys(range(4), backend=backend)
+        config = ServerConfig(0, client_pubkeys, server_pubkeys,
+                              server_privkeys[0], backend)
+        config.signature_cache.capacity = 0  # measure every verification
+        for msg_name, factory in build_messages(config, client_privkeys[0]):
+            message = factory()
+            key = client_privkeys[0] if message.from_client else config.private_key
+            signed = SignedMessage(message, key, backend)
+            sign_time = timeit.timeit(
+                lambda: SignedMessage(factory(), key, backend),  # pylint:disable=W0640
+                number=NUM_ITERATIONS)
+            verify_time = timeit.timeit(
+                lambda: signed.verify_signature(config), number=NUM_ITERATIONS)
+            assert signed.verify_signature(config)
+            print('%-12s %-36s %10.1f %10.1f' % (
+                backend_name, msg_name,
+                sign_time / NUM_ITERATIONS * 1e6,
+                verify_time / NUM_ITERATIONS * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+'''Measures the bytes the leader of a four server cluster sends to the other
+servers per committed request, for several operation sizes, with log entries
+that carry whole client requests and with ones that only carry their digests
+(ServerConfig.digest_entries).'''
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.tests.configs.four_servers_four_clients import (
+    NUM_CLIENTS, build_server_config, client_private_keys)
+from bft_raft.tests.helpers.cluster import MemoryQueueCluster
+
+NUM_REQUESTS = 64
+BURST = 16
+
+
+def run(digest_entries: bool, operation_size: int) -> tuple:
+    configs = [build_server_config(i) for i in range(4)]
+    for config in configs:
+        config.enable_logging = False
+        config.digest_entries = digest_entries
+    cluster = MemoryQueueCluster(configs)
+    cluster.pump()  # run the initial election
+
+    # Count what server 0, the leader, sends to the other servers
+    sent = [0]
+
+    def count(server, envelope) -> bool:
+        message = envelope.message
+        if not message.from_client and message.sender_id == 0:
+            sent[0] += len(envelope.encode())
+        return False
+    cluster.drop = count
+
+    seqnos = [0] * NUM_CLIENTS
+    for i in range(NUM_REQUESTS):
+        client = i % NUM_CLIENTS
+        cluster.submit(client, client_private_keys[client], seqnos[client],
+                       b'x' * operation_size)
+        seqnos[client] += 1
+        if (i + 1) % BURST == 0:
+            cluster.pump()
+    assert cluster.servers[0].state.applied_c_cert.slot == NUM_REQUESTS - 1
+    return sent[0] / NUM_REQUESTS
+
+
+def main():
+    print('%-10s %14s %14s %8s' % (
+        'op bytes', 'full B/req', 'digest B/req', 'ratio'))
+    for operation_size in (16, 256, 4096, 65536):
+        full = run(False, operation_size)
+        digest = run(True, operation_size)
+        print('%-10d %14.0f %14.0f %8.2f' % (
+            operation_size, full, digest, digest / full))
+
+
+if __name__ == "__main__":
+    main()
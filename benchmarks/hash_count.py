@@ -0,0 +1,62 @@
+'''Counts SHA256 invocations per committed slot on a four server cluster,
+with and without cached message digests.'''
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.messages import hashable
+from bft_raft.messages.hashable import Hashable
+from bft_raft.tests.configs.four_servers_four_clients import (
+    client_private_keys, server_configs)
+from bft_raft.tests.helpers.cluster import MemoryQueueCluster
+
+NUM_REQUESTS = 50
+
+
+class CountingSHA256(object):
+    '''Wraps Crypto.Hash.SHA256 and counts calls to new().'''
+
+    def __init__(self, wrapped) -> None:
+        self.wrapped = wrapped
+        self.count = 0
+
+    def new(self, *args):
+        self.count += 1
+        return self.wrapped.new(*args)
+
+
+def run(cache_digests: bool) -> float:
+    Hashable.cache_digests = cache_digests
+    for config in server_configs:
+        config.enable_logging = False
+        config.signature_cache.clear()
+    cluster = MemoryQueueCluster(server_configs)
+    cluster.pump()  # run the initial election
+
+    counter = CountingSHA256(hashable.SHA256)
+    hashable.SHA256 = counter
+    try:
+        for seqno in range(NUM_REQUESTS):
+            cluster.submit(0, client_private_keys[0], seqno,
+                           b'operation %d' % seqno)
+            cluster.pump()
+    finally:
+        hashable.SHA256 = counter.wrapped
+        Hashable.cache_digests = True
+    assert len(cluster.client_messages) == NUM_REQUESTS * len(server_configs)
+    return counter.count / NUM_REQUESTS
+
+
+def main():
+    uncached = run(cache_digests=False)
+    cached = run(cache_digests=True)
+    print('SHA256 invocations per committed slot (n=%d)' % len(server_configs))
+    print('  without digest cache: %8.1f' % uncached)
+    print('  with digest cache:    %8.1f' % cached)
+    print('  reduction:            %7.1fx' % (uncached / cached))
+
+
+if __name__ == "__main__":
+    main()
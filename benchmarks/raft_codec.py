@@ -0,0 +1,51 @@
+'''Compares the encoding and decoding throughput of raft.messages.codec with
+pickle, which the raft AsyncIoMessenger used before, on AppendEntriesRequests
+with different numbers of entries.'''
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from raft.messages import (AppendEntriesRequest, AppendEntriesResponse,
+                           ClientRequest, LogEntry)
+from raft.messages import codec
+
+NUM_ITERATIONS = 2000
+OPERATION_SIZE = 128
+
+
+def build_messages() -> list:
+    messages = [('AppendEntriesResponse', AppendEntriesResponse(1, 3, 41, True)),
+                ('heartbeat', AppendEntriesRequest(0, 3, 41, 3, [], 40))]
+    for num_entries in (1, 10, 100):
+        entries = [LogEntry(3, ClientRequest(i % 4, i, b'x' * OPERATION_SIZE))
+                   for i in range(num_entries)]
+        messages.append(('%d entries' % num_entries,
+                         AppendEntriesRequest(0, 3, 41, 3, entries, 40)))
+    return messages
+
+
+def messages_per_second(func) -> float:
+    return NUM_ITERATIONS / timeit.timeit(func, number=NUM_ITERATIONS)
+
+
+def main():
+    print('%-22s %-7s %8s %14s %14s' % (
+        'message', 'format', 'bytes', 'encode (msg/s)', 'decode (msg/s)'))
+    for name, msg in build_messages():
+        pickled = pickle.dumps(msg)
+        encoded = codec.encode(msg)
+        for fmt, data, dumps, loads in (
+                ('pickle', pickled, pickle.dumps, pickle.loads),
+                ('codec', encoded, codec.encode, codec.decode)):
+            print('%-22s %-7s %8d %14.0f %14.0f' % (
+                name if fmt == 'pickle' else '', fmt, len(data),
+                messages_per_second(lambda: dumps(msg)),
+                messages_per_second(lambda: loads(data))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+'''Compares the throughput of the raft AsyncIoMessenger over loopback TCP,
+Unix domain sockets and shared memory, with each of the two ways it can
+receive frames: asyncio streams and FrameProtocol. One messenger sends a burst
+of messages to another, and the time until the receiver has delivered all of
+them is measured.'''
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from raft.config import ServerConfig
+from raft.messages import (AppendEntriesRequest, AppendEntriesResponse,
+                           ClientRequest, LogEntry)
+from raft.messengers.asyncio import AsyncIoMessenger
+
+NUM_MESSAGES = 50000
+BASE_PORT = 19500
+SOCKET_DIR = tempfile.mkdtemp()
+
+
+class Counter(object):
+    def __init__(self, loop: asyncio.AbstractEventLoop, target: int) -> None:
+        self.count = 0
+        self.target = target
+        self.done = loop.create_future()
+
+    def on_message(self, msg) -> None:
+        self.count += 1
+        if self.count == self.target:
+            self.done.set_result(None)
+
+
+def build_messages() -> list:
+    entries = [LogEntry(3, ClientRequest(i % 4, i, b'x' * 128))
+               for i in range(10)]
+    return [('AppendEntriesResponse', AppendEntriesResponse(1, 3, 41, True)),
+            ('AppendEntries (10 entries)',
+             AppendEntriesRequest(0, 3, 41, 3, entries, 40))]
+
+
+def build_addresses(kind: str, index: int) -> dict:
+    if kind == 'tcp':
+        return {i: ('127.0.0.1', BASE_PORT + 2 * index + i) for i in (0, 1)}
+    return {i: '%s:%s' % (kind, os.path.join(SOCKET_DIR, '%d-%d.sock' % (
+        index, i))) for i in (0, 1)}
+
+
+async def measure(loop: asyncio.AbstractEventLoop, transport: str,
+                  servers: dict, msg) -> float:
+    messengers = []
+    for i in (0, 1):
+        config = ServerConfig(i, 3)
+        config.enable_logging = False
+        config.transport = transport
+        config.send_queue_size = NUM_MESSAGES
+        messengers.append(AsyncIoMessenger(config, {}, servers, i, False, loop))
+    counter = Counter(loop, NUM_MESSAGES)
+    messengers[1].add_listener(counter)
+    messengers[1].start_server()
+    await asyncio.sleep(0.1)
+
+    start = time.perf_counter()
+    for _ in range(NUM_MESSAGES):
+        messengers[0].send_server_message(1, msg)
+    await counter.done
+    elapsed = time.perf_counter() - start
+    messengers[0].connections.close()
+    return NUM_MESSAGES / elapsed
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    print('%-28s %-5s %-9s %12s' % ('message', 'link', 'transport', 'msg/s'))
+    index = 0
+    for name, msg in build_messages():
+        for kind in ('tcp', 'unix', 'shm'):
+            for transport in ('stream', 'protocol'):
+                servers = build_addresses(kind, index)
+                index += 1
+                rate = loop.run_until_complete(
+                    measure(loop, transport, servers, msg))
+                print('%-28s %-5s %-9s %12.0f' % (
+                    name if index % 6 == 1 else '',
+                    kind if transport == 'stream' else '', transport, rate))
+    shutil.rmtree(SOCKET_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+'''Measures how many AppendEntries frames per second a server can verify and
+deliver: on the event loop, and with VerificationPool and increasing numbers
+of worker processes. Each frame carries freshly signed client requests, so
+every signature has to be checked. Throughput should grow with the number of
+workers up to the number of cores.'''
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..')))
+
+from bft_raft.config import ServerConfig
+from bft_raft.crypto.rsa import RSABackend
+from bft_raft.messages import (AppendEntriesRequest, AppendEntriesSuccess,
+                               ClientRequest, LogEntry, SignedMessage)
+from bft_raft.messages.encoding import decode
+from bft_raft.messengers.verification import VerificationPool
+from bft_raft.tests.helpers.gen_keys import gen_keys
+
+NUM_FRAMES = 200
+NUM_ENTRIES = 10
+NUM_SENDERS = 3
+
+
+def build_frames(server_keys: dict, client_keys: dict) -> list:
+    frames = []
+    for i in range(NUM_FRAMES):
+        sender = 1 + i % NUM_SENDERS
+        entries = []
+        prev_ihash = b'0'
+        for j in range(NUM_ENTRIES):
+            req = SignedMessage(ClientRequest(0, i * NUM_ENTRIES + j, b'op'),
+                                client_keys[0])
+            entries.append(LogEntry(sender, prev_ihash, req))
+            prev_ihash = entries[-1].incremental_hash()
+        success = SignedMessage(AppendEntriesSuccess(
+            sender, sender, NUM_ENTRIES - 1, prev_ihash), server_keys[sender])
+        frames.append((sender, SignedMessage(
+            AppendEntriesRequest(sender, sender, entries, 0, success),
+            server_keys[sender]).encode()))
+    return frames
+
+
+def deliver(config: ServerConfig, encoding: bytes) -> None:
+    assert decode(encoding).verify(config)
+
+
+def measure_inline(config: ServerConfig, frames: list) -> float:
+    config.signature_cache.clear()
+    start = time.perf_counter()
+    for _, encoding in frames:
+        deliver(config, encoding)
+    return len(frames) / (time.perf_counter() - start)
+
+
+async def measure_pool(loop: asyncio.AbstractEventLoop, config: ServerConfig,
+                       frames: list, num_workers: int) -> float:
+    config.signature_cache.clear()
+    pool = VerificationPool(config, loop, num_workers)
+    done = loop.create_future()
+    delivered = [0]
+
+    def on_verified(encoding, keys):
+        assert keys is not None
+        for key in keys:
+            config.signature_cache.add(key)
+        deliver(config, encoding)
+        delivered[0] += 1
+        if delivered[0] == len(frames) and not done.done():
+            done.set_result(None)
+
+    # Start the workers before timing
+    warmup = loop.create_future()
+    for _ in range(num_workers):
+        pool.submit(None, frames[0][1], lambda keys: None)
+    pool.submit(None, frames[0][1], warmup.set_result)
+    await warmup
+    config.signature_cache.clear()
+
+    start = time.perf_counter()
+    for sender, encoding in frames:
+        pool.submit(sender, encoding,
+                    lambda keys, encoding=encoding: on_verified(encoding, keys))
+    await done
+    rate = len(frames) / (time.perf_counter() - start)
+    pool.close()
+    return rate
+
+
+def main():
+    backend = RSABackend(2048)
+    server_public, server_keys = gen_keys(range(4), backend=backend)
+    client_public, client_keys = gen_keys(range(4), backend=backend)
+    config = ServerConfig(0, client_public, server_public, server_keys[0],
+                          backend)
+    config.enable_logging = False
+    frames = build_frames(server_keys, client_keys)
+
+    print('%d frames of %d RSA-2048 signed entries, %d cores' % (
+        NUM_FRAMES, NUM_ENTRIES, os.cpu_count()))
+    print('%-20s %12s' % ('verification', 'frames/s'))
+    print('%-20s %12.0f' % ('event loop', measure_inline(config, frames)))
+    loop = asyncio.new_event_loop()
+    num_workers = 1
+    while num_workers <= max(2, os.cpu_count()):
+        rate = loop.run_until_complete(
+            measure_pool(loop, config, frames, num_workers))
+        print('%-20s %12.0f' % ('%d worker(s)' % num_workers, rate))
+        num_workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -5,3 +5,14 @@ class Application(object):
         '''Handles an operation requested by a client, which is given as
         bytes, and returns the result to send back to the client as bytes.'''
         raise NotImplementedError
+
+    def checkpoint(self) -> object:
+        '''Returns a snapshot of the application's state that rollback can
+        restore. Only needed with tentative execution (see
+        ServerConfig.tentative_execution).'''
+        raise NotImplementedError
+
+    def rollback(self, checkpoint: object) -> None:
+        '''Restores a snapshot returned by checkpoint, undoing the operations
+        handled since it was taken.'''
+        raise NotImplementedError
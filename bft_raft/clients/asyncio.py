@@ -3,8 +3,9 @@ import typing
 from collections import defaultdict
 
 from ..config import ClientConfig
-from ..messages import (ClientRequest, ClientRequestFailure, ClientResponse,
-                        ClientViewChangeRequest, Message, SignedMessage)
+from ..messages import (ClientBusy, ClientRequest, ClientRequestFailure,
+                        ClientResponse, ClientViewChangeRequest, Message,
+                        SignedMessage, TentativeClientResponse)
 from ..messengers.asyncio import AsyncIoMessenger
 from ..messengers.listener import MessengerListener
 from ..timeout_managers.asyncio import AsyncIoTimeoutManager
@@ -34,11 +35,17 @@ class AsyncIoClient(MessengerListener, TimeoutListener):
         # Number of times we have timed out on the current request
         self.num_request_timeouts = None  # type: int
 
+        # Whether we are waiting to send the current request again after a
+        # ClientBusy
+        self.busy_retry_pending = False
+
         # Used to wait until we get f + 1 matching responses.
         self.responses_sem = None  # type: asyncio.Semaphore
 
-        # map from response -> set of server ids
+        # map from response -> set of server ids, counting only final
+        # responses, and counting tentative ones as well
         self.responses = None  # type: typing.Dict[bytes, typing.Set[int]]
+        self.any_responses = None  # type: typing.Dict[bytes, typing.Set[int]]
 
         # map from server id -> seqno
         self.failures = None  # type: typing.Dict[int, int]
@@ -60,13 +67,16 @@ class AsyncIoClient(MessengerListener, TimeoutListener):
             self.on_response(msg)
         elif isinstance(msg, ClientRequestFailure):
             self.on_failure(msg)
+        elif isinstance(msg, ClientBusy):
+            self.on_busy(msg)
 
     def on_response(self, msg: ClientResponse) -> None:
         if self.active_request is None:
             return
         if msg.seqno != self.seqno or msg.requester != self.config.client_id:
             return
-        self._add_result(msg.sender_id, msg.result)
+        self._add_result(msg.sender_id, msg.result,
+                         isinstance(msg, TentativeClientResponse))
 
     def on_failure(self, msg: ClientRequestFailure) -> None:
         if self.active_request is None:
@@ -91,9 +101,26 @@ class AsyncIoClient(MessengerListener, TimeoutListener):
                 self.seqno = new_seqno
                 self._resend_request()
 
+    def on_busy(self, msg: ClientBusy) -> None:
+        if self.active_request is None or self.busy_retry_pending:
+            return
+        if msg.seqno != self.seqno or msg.requester != self.config.client_id:
+            return
+
+        # Send the request again shortly rather than waiting for it to time
+        # out. The request timeout keeps running, so a leader that keeps
+        # saying it is busy is still replaced like one that doesn't answer.
+        self.busy_retry_pending = True
+        self.timeout_manager.set_timeout(self.config.busy_retry_delay,
+                                         BusyRetryTimeout(self.seqno))
+
     def on_timeout(self, context: object) -> None:
         if isinstance(context, RequestTimeout):
             self.on_request_timeout(context)
+        elif isinstance(context, BusyRetryTimeout):
+            self.busy_retry_pending = False
+            if self.active_request is not None and context.seqno == self.seqno:
+                self._broadcast_request()
         else:
             super(AsyncIoClient, self).on_timeout(context)
 
@@ -114,13 +141,18 @@ class AsyncIoClient(MessengerListener, TimeoutListener):
         self.loop.run_until_complete(shutdown(self.loop))
         self.loop.close()
 
-    def _add_result(self, server_id: int, result: bytes) -> None:
+    def _add_result(self, server_id: int, result: bytes,
+                    tentative: bool = False) -> None:
         assert self.responses_sem is not None
-        self.responses[result].add(server_id)
-
-        # If we have f + 1 responses, increment the semaphore so we can stop
-        # blocking in send_request and return the result
-        if len(self.responses[result]) >= self.config.f + 1:
+        if not tentative:
+            self.responses[result].add(server_id)
+        self.any_responses[result].add(server_id)
+
+        # If we have f + 1 responses, or 2f + 1 counting tentative ones,
+        # increment the semaphore so we can stop blocking in send_request and
+        # return the result
+        if len(self.responses[result]) >= self.config.f + 1 or \
+                len(self.any_responses[result]) >= self.config.quorum_size:
             self.result = result
             self.responses_sem.release()
 
@@ -140,18 +172,27 @@ class AsyncIoClient(MessengerListener, TimeoutListener):
 
     def _resend_request(self):
         self.responses = defaultdict(set)
+        self.any_responses = defaultdict(set)
         self.failures = {}
         self.result = None
         self._send_request_msg()
 
     def _send_request_msg(self):
+        self._broadcast_request()
+        self.timeout_manager.set_timeout(self.config.timeout,
+                                         RequestTimeout(self.seqno))
+
+    def _broadcast_request(self):
         req = ClientRequest(self.config.client_id, self.seqno,
                             self.active_request)
         self.messenger.broadcast_server_message(req)
-        self.timeout_manager.set_timeout(self.config.timeout,
-                                         RequestTimeout(self.seqno))
 
 
 class RequestTimeout(object):
     def __init__(self, seqno: int) -> None:
         self.seqno = seqno
+
+
+class BusyRetryTimeout(object):
+    def __init__(self, seqno: int) -> None:
+        self.seqno = seqno
@@ -1,18 +1,121 @@
+from typing import Dict, Tuple  # pylint:disable=W0611
+
+from .crypto.backend import CryptoBackend
+from .crypto.rsa import RSABackend
+from .util.signature_cache import SignatureCache
+
+DEFAULT_BACKEND = RSABackend()
 
 
 class BaseConfig(object):
     def __init__(self,
                  client_public_keys: dict,
                  server_public_keys: dict,
-                 private_key) -> None:
+                 private_key,
+                 crypto_backend: CryptoBackend = None) -> None:
         self.client_public_keys = client_public_keys
         self.server_public_keys = server_public_keys
         self.private_key = private_key
+
+        # Used to sign and verify messages. The keys above must have been
+        # generated by the same backend.
+        self.crypto_backend = crypto_backend or DEFAULT_BACKEND
         assert ((self.num_clients - 1) % 3) == 0
 
         self._timeout = 3  # type: float
         self.enable_logging = True
 
+        # Signatures this node has already verified, so that messages nested
+        # in certificates and vote lists are only checked once.
+        self.signature_cache = SignatureCache()
+
+        # Optional concurrent.futures.Executor used to verify the client
+        # signatures in large batches of log entries in parallel.
+        self.verify_executor = None
+
+        # Number of worker processes AsyncIoMessenger verifies received
+        # messages in, or 0 to verify them on the event loop. Messages from
+        # each sender are still delivered in the order they arrived.
+        self.verify_workers = 0
+
+        # Number of worker processes AsyncIoMessenger signs outgoing messages
+        # in, or 0 to sign them on the event loop. Messages to each node are
+        # still sent in the order they were sent from the event loop.
+        self.sign_workers = 0
+
+        # If set, AsyncIoMessenger (and AsyncIoServer) handle received
+        # messages in stages with queues between them instead of one at a
+        # time as they arrive: 'decode', 'authenticate', 'protocol',
+        # 'execute' and 'reply' (see util.pipeline). Maps stage names to
+        # where they run: 'loop', 'thread' or 'process'; stages not listed,
+        # and always 'protocol', run on the event loop. In processes,
+        # 'authenticate' uses max(1, verify_workers) of them, and 'execute'
+        # needs a picklable application, whose state then lives there.
+        self.pipeline = None  # type: Dict[str, str]
+
+        # Number of items each pipeline stage queues before the stages
+        # feeding it wait; frames received while 'decode' is full are dropped.
+        self.pipeline_capacity = 1000
+
+        # Map from (is_client, node id) to the session key this node shares
+        # with that node. If set, messages that never end up in certificates
+        # are authenticated with MACs instead of signatures.
+        self.session_keys = None  # type: Dict[Tuple[bool, int], bytes]
+
+        # Frames larger than this many bytes are rejected without being read.
+        self.max_frame_size = 16 * 1024 * 1024
+
+        # Limits on the envelope size of specific message types, by class
+        # name, in bytes; other types are only limited by max_frame_size.
+        self.max_message_sizes = dict(
+            (name, 64 * 1024) for name in (
+                'Hello', 'VoteMessage', 'CommitMessage', 'AppendEntriesSuccess',
+                'LogResend', 'ElectionProofRequest', 'CatchupRequest',
+                'CertRequest', 'ClientViewChangeRequest', 'RequestFetch'))
+        self.max_message_sizes['ClientRequest'] = 1024 * 1024
+
+        # (frames per second, burst) each client or server may send us, or
+        # None for no limit. Hellos opening connections count against a
+        # bucket per remote host with the client limit.
+        self.client_rate_limit = None  # type: Tuple[float, int]
+        self.server_rate_limit = None  # type: Tuple[float, int]
+
+        # Server message types that are dropped unverified when their term is
+        # older than ours (every state ignores them), and types whose
+        # duplicates are dropped unverified if the original was among the
+        # last dedup_window such messages delivered (handling them again
+        # would change nothing).
+        self.stale_term_types = {
+            'AppendEntriesRequest', 'AppendEntriesSuccess', 'CommitMessage',
+            'VoteMessage', 'VoteRequest', 'ElectedMessage', 'CertMessage',
+            'RequestFetch', 'FetchedRequests'}
+        self.dedup_types = {'AppendEntriesSuccess', 'CommitMessage',
+                            'VoteMessage', 'VoteRequest', 'ElectedMessage'}
+        self.dedup_window = 10000
+
+        # Maximum number of frames queued for each peer; further frames are
+        # dropped until the queue drains.
+        self.send_queue_size = 1024
+
+        # Which frame is dropped when a peer's send queue is full: the new one
+        # ('newest') or the oldest queued one ('oldest')
+        self.send_drop_policy = 'newest'
+
+        # Seconds to wait before reconnecting to a peer after a failed attempt;
+        # doubled after each further failure, up to max_reconnect_delay
+        self.reconnect_delay = 0.1
+        self.max_reconnect_delay = 5.0
+
+        # Codec AsyncIoMessenger compresses frames of at least
+        # compression_threshold bytes with: None, 'zlib', 'bz2' or 'lzma'.
+        # Frames are only compressed for nodes that support the codec.
+        self.compression = None  # type: str
+        self.compression_threshold = 4096
+
+        # How AsyncIoMessenger receives frames: 'stream' (asyncio streams) or
+        # 'protocol' (FrameProtocol, which parses frames in place)
+        self.transport = 'stream'
+
     def double_timeout(self) -> None:
         self._timeout *= 2
 
@@ -49,11 +152,53 @@ class ServerConfig(BaseConfig):
                  server_id: int,
                  client_public_keys: dict,
                  server_public_keys: dict,
-                 private_key) -> None:
+                 private_key,
+                 crypto_backend: CryptoBackend = None) -> None:
         super(ServerConfig, self).__init__(
-            client_public_keys, server_public_keys, private_key)
+            client_public_keys, server_public_keys, private_key, crypto_backend)
         self.server_id = server_id
 
+        # Limits on the client requests the leader appends to its log in one
+        # AppendEntriesRequest: number of requests (the most the batch size
+        # grows to under load, see util.batching), bytes of operations and
+        # signatures, and seconds the first request of a batch waits while
+        # earlier batches are being committed.
+        self.max_batch_size = 64
+        self.max_batch_bytes = 256 * 1024
+        self.batch_window = 0.01
+
+        # Number of slots past our latest A-cert (the low watermark) that we
+        # keep AppendEntriesSuccess and commit messages for, and that the
+        # leader appends entries to before waiting for A-certs; the leader
+        # then holds up to max_queued_requests requests and answers further
+        # ones with ClientBusy.
+        self.log_window = 256
+        self.max_queued_requests = 1024
+
+        # If set, the leader sends log entries with only the digests of their
+        # requests (DigestLogEntry), which the other servers look up among
+        # the last request_pool_size requests clients sent them, fetching
+        # the ones they missed from the leader.
+        self.digest_entries = False
+        self.request_pool_size = 16 * 1024
+
+        # If set, servers send their AppendEntriesSuccess and commit messages
+        # only to the leader, which broadcasts each A-cert and C-cert it
+        # forms in a CertMessage, instead of to every server: O(n) messages
+        # per batch instead of O(n^2), for an extra message delay per phase.
+        self.collector_commit = False
+
+        # If set, servers execute requests and reply to clients (with
+        # TentativeClientResponses) once they have an A-cert for them rather
+        # than a C-cert, saving a round of messages. The application must
+        # support checkpoint and rollback, which undo operations whose
+        # entries an election replaces.
+        self.tentative_execution = False
+
+    @property
+    def node_id(self):
+        return self.server_id
+
 
 class ClientConfig(BaseConfig):
     '''Configuration settings for BFTRaft clients.'''
@@ -62,7 +207,16 @@ class ClientConfig(BaseConfig):
                  client_id: int,
                  server_public_keys: dict,
                  public_key,
-                 private_key) -> None:
+                 private_key,
+                 crypto_backend: CryptoBackend = None) -> None:
         super(ClientConfig, self).__init__(
-            {client_id: public_key}, server_public_keys, private_key)
+            {client_id: public_key}, server_public_keys, private_key,
+            crypto_backend)
         self.client_id = client_id
+
+        # Seconds to wait before sending a request again after a ClientBusy
+        self.busy_retry_delay = 0.05
+
+    @property
+    def node_id(self):
+        return self.client_id
@@ -0,0 +1,18 @@
+from typing import Tuple
+
+
+class CryptoBackend(object):
+    '''Signs and verifies message digests. Implementations decide what keys
+    look like; signatures are always bytes.'''
+
+    def generate_keys(self) -> Tuple[object, object]:
+        '''Returns a new (public key, private key) pair.'''
+        raise NotImplementedError
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        '''Returns the signature of a message digest.'''
+        raise NotImplementedError
+
+    def verify(self, public_key, digest: bytes, signature: bytes) -> bool:
+        '''Returns whether signature is a valid signature of digest.'''
+        raise NotImplementedError
@@ -0,0 +1,43 @@
+from typing import Tuple
+
+from .backend import CryptoBackend
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, utils
+except ImportError:  # (optional dependency)
+    ec = None
+
+
+class ECDSABackend(CryptoBackend):
+    '''ECDSA signatures over NIST P-256, which are much cheaper to produce than
+    RSA signatures of comparable strength. Requires the cryptography package.'''
+
+    def __init__(self) -> None:
+        if ec is None:
+            raise ImportError('ECDSABackend requires the cryptography package')
+        self._algorithm = ec.ECDSA(utils.Prehashed(hashes.SHA256()))
+
+    def generate_keys(self) -> Tuple[object, object]:
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        return key.public_key(), key
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        return private_key.sign(digest, self._algorithm)
+
+    def verify(self, public_key, digest: bytes, signature: bytes) -> bool:
+        try:
+            public_key.verify(signature, digest, self._algorithm)
+        except (InvalidSignature, ValueError):
+            return False
+        return True
+
+    def __getstate__(self) -> dict:
+        # (the algorithm object can't be pickled, e.g. to send the backend to
+        # a process pool, so it is rebuilt on the other side)
+        return {}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()  # type: ignore
@@ -0,0 +1,37 @@
+import hashlib
+import hmac
+import os
+from typing import Tuple
+
+from .backend import CryptoBackend
+
+
+class HMACBackend(CryptoBackend):
+    '''HMAC-SHA256 "signatures". Each node's key doubles as its public key, so
+    anyone who can verify a node's messages can also forge them.
+    This is NOT Byzantine fault tolerant and is only meant for benchmarking.'''
+
+    def generate_keys(self) -> Tuple[object, object]:
+        key = os.urandom(32)
+        return key, key
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        return hmac.new(private_key, digest, hashlib.sha256).digest()
+
+    def verify(self, public_key, digest: bytes, signature: bytes) -> bool:
+        expected = hmac.new(public_key, digest, hashlib.sha256).digest()
+        return hmac.compare_digest(expected, signature)
+
+
+class NullBackend(CryptoBackend):
+    '''Produces empty signatures that always verify. Only meant for
+    benchmarking, to measure everything except the cost of cryptography.'''
+
+    def generate_keys(self) -> Tuple[object, object]:
+        return b'', b''
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        return b''
+
+    def verify(self, public_key, digest: bytes, signature: bytes) -> bool:
+        return signature == b''
@@ -0,0 +1,27 @@
+from typing import Tuple
+
+from Crypto.PublicKey import RSA
+
+from .backend import CryptoBackend
+
+
+class RSABackend(CryptoBackend):
+    '''Textbook RSA signatures using pycrypto keys (the default backend).'''
+
+    def __init__(self, bits: int = 1024) -> None:
+        self.bits = bits
+
+    def generate_keys(self) -> Tuple[object, object]:
+        key = RSA.generate(self.bits)
+        return key.publickey(), key
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        signature = private_key.sign(digest, '')[0]
+        length = (private_key.size() + 8) // 8
+        return signature.to_bytes(length, byteorder='big')
+
+    def verify(self, public_key, digest: bytes, signature: bytes) -> bool:
+        if len(signature) != (public_key.size() + 8) // 8:
+            return False
+        return bool(public_key.verify(
+            digest, (int.from_bytes(signature, byteorder='big'),)))
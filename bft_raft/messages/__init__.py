@@ -1,8 +1,11 @@
-from .append_entries import AppendEntriesRequest, AppendEntriesSuccess, LogResend
-from .base import Message, ServerMessage, SignedMessage
+from .append_entries import AppendEntriesRequest, AppendEntriesSuccess, \
+    FetchedRequests, LogResend, RequestFetch
+from .base import AuthenticatedMessage, CertifiedMessage, Message, ServerMessage, \
+    SignedMessage
 from .client_request import ClientRequest, ClientResponse, ClientRequestFailure, \
-    ClientViewChangeRequest
-from .commit import CommitMessage, ACert, CCert
+    ClientBusy, ClientViewChangeRequest, TentativeClientResponse
+from .commit import CommitMessage, ACert, CCert, CertMessage, CertRequest
 from .election import VoteMessage, VoteRequest, ElectedMessage, \
     ElectionProofRequest, CatchupRequest, CatchupResponse
-from .log_entry import LogEntry
+from .hello import Hello
+from .log_entry import DigestLogEntry, LogEntry
@@ -2,30 +2,26 @@ from typing import List
 
 from ..config import BaseConfig
 from .log_entry import LogEntry, verify_entries
-from .base import ServerMessage, SignedMessage
+from .base import (CertifiedMessage, ServerMessage, SignedMessage,
+                   verify_signatures)
+from .client_request import ClientRequest
+from .encoding import BYTES_LIST, INT, OBJECT_LIST, OPTIONAL
 
 
-class AppendEntriesSuccess(ServerMessage):
-    def __init__(self, sender_id: int, term: int,
-                 slot: int, incremental_hash: bytes) -> None:
-        super(AppendEntriesSuccess, self).__init__(sender_id, term)
-        self.incremental_hash = incremental_hash
-        self.slot = slot
-
-    def verify(self, config: BaseConfig) -> bool:
-        if not isinstance(self.incremental_hash, bytes):
-            return False
-        if not isinstance(self.slot, int) or self.slot < 0:
-            return False
-        return super(AppendEntriesSuccess, self).verify(config)
+class AppendEntriesSuccess(CertifiedMessage):
+    '''Sent by a replica once its log up to slot matches incremental_hash.
+    2f + 1 of these form an A-certificate.'''
 
-    def update_hash(self, h) -> None:
-        h.update(self.incremental_hash)
-        h.update(self.int_to_bytes(self.slot))
-        super(AppendEntriesSuccess, self).update_hash(h)
+    type_tag = 11
+    schema = CertifiedMessage.schema
 
 
 class AppendEntriesRequest(ServerMessage):
+    type_tag = 10
+    schema = ServerMessage.schema + (('first_slot', INT),
+                                     ('entries', OBJECT_LIST),
+                                     ('leader_success', OPTIONAL))
+
     def __init__(self, sender_id: int, term: int,
                  entries: List[LogEntry], first_slot: int,
                  leader_success: SignedMessage[AppendEntriesSuccess]) -> None:
@@ -43,30 +39,27 @@ class AppendEntriesRequest(ServerMessage):
             return False
         if self.first_slot < 0:
             return False
-        if not verify_entries(self.entries, config):
-            return False
         # if there is no success message enclosed (i.e. this message is a heartbeat)
         # the entries list should be empty
         if self.leader_success is None and self.entries:
             return False
+        if not super(AppendEntriesRequest, self).verify(config):
+            return False
         # if there is a success message encloesd, verify it
-        elif self.leader_success is not None:
-            if not isinstance(self.leader_success, AppendEntriesSuccess):
+        if self.leader_success is not None:
+            if not isinstance(self.leader_success, SignedMessage) \
+                    or not isinstance(self.leader_success.message, AppendEntriesSuccess):
                 return False
             if not self.leader_success.verify(config):
                 return False
-        return super(AppendEntriesRequest, self).verify(config)
-
-    def update_hash(self, h) -> None:
-        for entry in self.entries:
-            h.update(entry.incremental_hash())
-        h.update(self.int_to_bytes(self.first_slot))
-        if self.leader_success is not None:
-            h.update(self.leader_success.hash())
-        super(AppendEntriesRequest, self).update_hash(h)
+        # (checked last since it is the most expensive part)
+        return verify_entries(self.entries, config)
 
 
 class LogResend(ServerMessage):
+    type_tag = 12
+    schema = ServerMessage.schema + (('log_len', INT),)
+
     def __init__(self, sender_id: int, term: int, log_len: int) -> None:
         super(LogResend, self).__init__(sender_id, term)
         self.log_len = log_len
@@ -76,6 +69,47 @@ class LogResend(ServerMessage):
             return False
         return super(LogResend, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.log_len))
-        super(LogResend, self).update_hash(h)
+
+class RequestFetch(ServerMessage):
+    '''Sent to the leader for the requests behind DigestLogEntries that we
+    haven't received from their clients, by digest.'''
+
+    type_tag = 13
+    schema = ServerMessage.schema + (('digests', BYTES_LIST),)
+
+    def __init__(self, sender_id: int, term: int,
+                 digests: List[bytes]) -> None:
+        super(RequestFetch, self).__init__(sender_id, term)
+        self.digests = digests
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.digests, list):
+            return False
+        if not all(isinstance(digest, bytes) for digest in self.digests):
+            return False
+        return super(RequestFetch, self).verify(config)
+
+
+class FetchedRequests(ServerMessage):
+    '''Sent by the leader in reply to a RequestFetch, with the signed client
+    requests it has among those asked for.'''
+
+    type_tag = 14
+    schema = ServerMessage.schema + (('requests', OBJECT_LIST),)
+
+    def __init__(self, sender_id: int, term: int,
+                 requests: List[SignedMessage[ClientRequest]]) -> None:
+        super(FetchedRequests, self).__init__(sender_id, term)
+        self.requests = requests
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.requests, list):
+            return False
+        for request in self.requests:
+            if not isinstance(request, SignedMessage) \
+                    or not isinstance(request.message, ClientRequest) \
+                    or not request.message.verify(config):
+                return False
+        if not super(FetchedRequests, self).verify(config):
+            return False
+        return verify_signatures(self.requests, config, config.verify_executor)
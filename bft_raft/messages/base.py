@@ -1,7 +1,15 @@
-from typing import Generic, TypeVar
+import hashlib
+import hmac
+from concurrent.futures import Executor
+from itertools import repeat
+from typing import Dict, Generic, List, Tuple, TypeVar
 
+from Crypto.Hash import SHA256
+
+from .encoding import BOOL, BYTES, BYTES_MAP, INT, OBJECT
 from .hashable import Hashable
-from ..config import BaseConfig
+from ..config import BaseConfig, DEFAULT_BACKEND
+from ..crypto.backend import CryptoBackend
 
 T = TypeVar('T', bound='Message')
 
@@ -9,6 +17,13 @@ T = TypeVar('T', bound='Message')
 class Message(Hashable):
     '''Base class for all messages.'''
 
+    schema = (('sender_id', INT), ('from_client', BOOL))
+
+    # Whether the message can end up in a certificate or vote list and so be
+    # shown to third parties. Such messages must always be signed; others may
+    # be sent with MAC authenticators instead (see AuthenticatedMessage).
+    transferable = False
+
     def __init__(self, sender_id: int, from_client: bool) -> None:
         self.sender_id = sender_id
         self.from_client = from_client
@@ -23,14 +38,17 @@ class Message(Hashable):
             return self.sender_id >= 0 and self.sender_id <= config.num_clients
         return self.sender_id >= 0 and self.sender_id <= config.num_servers
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.sender_id))
-        h.update(bytes([self.from_client]))
+    def signing_digest(self) -> bytes:
+        '''Returns the digest that is signed when the message is sent as a
+        SignedMessage.'''
+        return self.hash()
 
 
 class ServerMessage(Message):
     '''Base class for all messages sent between servers.'''
 
+    schema = Message.schema + (('term', INT),)
+
     def __init__(self, sender_id: int, term: int) -> None:
         super(ServerMessage, self).__init__(sender_id, False)
         self.term = term
@@ -40,17 +58,66 @@ class ServerMessage(Message):
             return False
         return self.term >= 0 and super(ServerMessage, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.term))
-        super(ServerMessage, self).update_hash(h)
+
+class CertifiedMessage(ServerMessage):
+    '''Base class for the messages that are collected into certificates
+    (AppendEntriesSuccess and CommitMessage). Every server signs the same
+    digest, which leaves out the sender, so that a certificate only needs to
+    carry a bitmap of signers and their signatures (see Cert).'''
+
+    schema = ServerMessage.schema + (('slot', INT),
+                                     ('incremental_hash', BYTES))
+
+    transferable = True
+
+    def __init__(self, sender_id: int, term: int,
+                 slot: int, incremental_hash: bytes) -> None:
+        super(CertifiedMessage, self).__init__(sender_id, term)
+        self.incremental_hash = incremental_hash
+        self.slot = slot
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.incremental_hash, bytes):
+            return False
+        if not isinstance(self.slot, int) or self.slot < 0:
+            return False
+        return super(CertifiedMessage, self).verify(config)
+
+    def signing_digest(self) -> bytes:
+        return self.shared_digest(self.term, self.slot, self.incremental_hash)
+
+    @classmethod
+    def shared_digest(cls, term: int, slot: int,
+                      incremental_hash: bytes) -> bytes:
+        '''Returns the digest signed by every server that sends this type of
+        message for the given term, slot and incremental hash.'''
+        h = SHA256.new()
+        h.update(('%s:%d:%d:' % (cls.__name__, term, slot)).encode())
+        h.update(incremental_hash)
+        return h.digest()
 
 
 class SignedMessage(Generic[T], Hashable):
     '''A signed Message.'''
 
-    def __init__(self, message: T, private_key) -> None:
+    type_tag = 100
+    schema = (('message', OBJECT), ('signature', BYTES))
+
+    def __init__(self, message: T, private_key,
+                 backend: CryptoBackend = None) -> None:
+        if backend is None:
+            backend = DEFAULT_BACKEND
         self.message = message
-        self.signature = private_key.sign(message.hash(), '')
+        self.signature = backend.sign(private_key, message.signing_digest())
+
+    @classmethod
+    def with_signature(cls, message: T, signature: bytes) -> 'SignedMessage[T]':
+        '''Returns message with a signature computed elsewhere (see
+        messengers.signing).'''
+        signed = cls.__new__(cls)
+        signed.__dict__.update(message=message, signature=signature,
+                               _frozen=True)
+        return signed
 
     def verify(self, config: BaseConfig) -> bool:
         '''Verifies the signature, deserializes the enclosed message, and
@@ -58,24 +125,69 @@ class SignedMessage(Generic[T], Hashable):
         if not isinstance(self.message, Message) \
                 or not self.message.verify(config):
             return False
-        try:
-            if self.from_client:
-                public_key = config.client_public_keys[self.sender_id]
-            else:
-                public_key = config.server_public_keys[self.sender_id]
-        except KeyError:
+        return self.verify_signature(config)
+
+    def verify_signature(self, config: BaseConfig) -> bool:
+        '''Verifies only the signature. Signatures that have been verified
+        before are looked up in config.signature_cache instead of being
+        checked again.'''
+        return verify_signatures([self], config)
+
+    def signature_cache_key(self) -> tuple:
+        '''Returns the key identifying this signature in a SignatureCache.
+        Raises TypeError if the signature is malformed.'''
+        if not isinstance(self.signature, bytes):
+            raise TypeError('signature must be bytes')
+        return (self.from_client, self.sender_id,
+                self.message.signing_digest(), self.signature)
+
+    def public_key(self, config: BaseConfig):
+        '''Returns the public key of the sender. Raises KeyError if the
+        sender is unknown.'''
+        return _public_key(config, self.from_client, self.sender_id)
+
+    @property
+    def from_client(self):
+        return self.message.from_client
+
+    @property
+    def sender_id(self):
+        return self.message.sender_id
+
+
+class AuthenticatedMessage(Generic[T], Hashable):
+    '''A Message authenticated with a vector of MACs, one per recipient,
+    computed with the session keys the sender shares with each recipient (as in
+    PBFT). Much cheaper than a signature, but only convinces the recipients
+    themselves, so it can't be used for transferable messages.'''
+
+    type_tag = 101
+    schema = (('message', OBJECT), ('macs', BYTES_MAP))
+
+    def __init__(self, message: T, to_client: bool, recipients: List[int],
+                 session_keys: Dict[Tuple[bool, int], bytes]) -> None:
+        self.message = message
+        digest = message.hash()
+        self.macs = {i: compute_mac(session_keys[(to_client, i)], digest)
+                     for i in recipients}
+
+    def verify(self, config: BaseConfig) -> bool:
+        '''Verifies that the message is valid and not transferable, and that
+        the MAC for this node is correct.'''
+        if not isinstance(self.message, Message) or self.message.transferable:
             return False
-        try:
-            if not public_key.verify(self.message.hash(), self.signature):
-                return False
-        except TypeError:
+        if not self.message.verify(config):
             return False
-        return True
+        return self.verify_mac(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.message.hash())
-        for x in self.signature:
-            h.update(self.int_to_bytes(x))
+    def verify_mac(self, config: BaseConfig) -> bool:
+        if config.session_keys is None or not isinstance(self.macs, dict):
+            return False
+        key = config.session_keys.get((self.from_client, self.sender_id))
+        mac = self.macs.get(config.node_id)
+        if key is None or not isinstance(mac, bytes):
+            return False
+        return hmac.compare_digest(compute_mac(key, self.message.hash()), mac)
 
     @property
     def from_client(self):
@@ -84,3 +196,71 @@ class SignedMessage(Generic[T], Hashable):
     @property
     def sender_id(self):
         return self.message.sender_id
+
+
+def compute_mac(session_key: bytes, digest: bytes) -> bytes:
+    '''Returns the MAC of a message digest under a session key.'''
+    return hmac.new(session_key, digest, hashlib.sha256).digest()
+
+
+def verify_signatures(signed_msgs: List[SignedMessage], config: BaseConfig,
+                      executor: Executor = None) -> bool:
+    '''Verifies the signatures (but not the contents) of a list of signed
+    messages, returning true if all of them are valid. Signatures that are not
+    in config.signature_cache are checked in bulk, on executor if one is given.'''
+    try:
+        keys = [signed.signature_cache_key() for signed in signed_msgs]
+    except TypeError:
+        return False
+    return verify_signature_keys(keys, config, executor)
+
+
+def verify_signature_keys(keys: List[tuple], config: BaseConfig,
+                          executor: Executor = None) -> bool:
+    '''Like verify_signatures, but takes (from_client, sender_id, digest,
+    signature) tuples, as returned by SignedMessage.signature_cache_key, so that
+    certificates can check signatures without rebuilding the signed messages.'''
+    pending = []  # type: List[tuple]
+    seen = set()  # type: set
+    for key in keys:
+        if not isinstance(key[3], bytes):
+            return False
+        if key not in seen and not config.signature_cache.contains(key):
+            pending.append(key)
+        seen.add(key)
+    if not pending:
+        return True
+
+    try:
+        public_keys = [_public_key(config, key[0], key[1]) for key in pending]
+    except (KeyError, IndexError):
+        return False
+    backends = repeat(config.crypto_backend, len(pending))
+    digests = [key[2] for key in pending]
+    signatures = [key[3] for key in pending]
+    if executor is not None and len(pending) > 1:
+        results = list(executor.map(_check_signature, backends, public_keys,
+                                    digests, signatures))
+    else:
+        results = list(map(_check_signature, backends, public_keys,
+                           digests, signatures))
+    if not all(results):
+        return False
+    for key in pending:
+        config.signature_cache.add(key)
+    return True
+
+
+def _public_key(config: BaseConfig, from_client: bool, sender_id: int):
+    if from_client:
+        return config.client_public_keys[sender_id]
+    return config.server_public_keys[sender_id]
+
+
+def _check_signature(backend: CryptoBackend, public_key,
+                     digest: bytes, signature: bytes) -> bool:
+    # (module level so that it can be sent to a process pool)
+    try:
+        return backend.verify(public_key, digest, signature)
+    except (TypeError, ValueError):
+        return False
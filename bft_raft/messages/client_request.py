@@ -1,10 +1,16 @@
 from .base import Message
+from .encoding import BYTES, INT
 from ..config import BaseConfig
 
 
 class ClientRequest(Message):
     '''Sent by clients to request an operation be performed.'''
 
+    type_tag = 1
+    schema = Message.schema + (('seqno', INT), ('operation', BYTES))
+
+    transferable = True
+
     def __init__(self, sender_id: int, seqno: int,
                  operation: bytes) -> None:
         super(ClientRequest, self).__init__(sender_id, True)
@@ -18,15 +24,14 @@ class ClientRequest(Message):
             return False
         return super(ClientRequest, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.seqno))
-        h.update(self.operation)
-        super(ClientRequest, self).update_hash(h)
-
 
 class ClientResponse(Message):
     '''Sent to the client after an operation is executed.'''
 
+    type_tag = 2
+    schema = Message.schema + (('requester', INT), ('seqno', INT),
+                               ('result', BYTES))
+
     def __init__(self, sender_id: int, requester: int,
                  seqno: int, result: bytes) -> None:
         super(ClientResponse, self).__init__(sender_id, False)
@@ -43,17 +48,24 @@ class ClientResponse(Message):
             return False
         return super(ClientResponse, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.requester))
-        h.update(self.int_to_bytes(self.seqno))
-        h.update(self.result)
-        super(ClientResponse, self).update_hash(h)
+
+class TentativeClientResponse(ClientResponse):
+    '''Sent to the client after an operation is executed tentatively, on an
+    A-cert rather than a C-cert (see ServerConfig.tentative_execution). The
+    client needs 2f + 1 matching ones instead of f + 1.'''
+
+    type_tag = 6
+    schema = ClientResponse.schema
 
 
 class ClientRequestFailure(Message):
     '''Sent to the client when a request fails due to an
     outdated sequence number.'''
 
+    type_tag = 3
+    schema = Message.schema + (('requester', INT), ('max_seqno', INT),
+                               ('result', BYTES))
+
     def __init__(self, sender_id: int, requester: int,
                  max_seqno: int, result: bytes) -> None:
         super(ClientRequestFailure, self).__init__(sender_id, False)
@@ -70,16 +82,34 @@ class ClientRequestFailure(Message):
             return False
         return super(ClientRequestFailure, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.requester))
-        h.update(self.int_to_bytes(self.max_seqno))
-        h.update(self.result)
-        super(ClientRequestFailure, self).update_hash(h)
+
+class ClientBusy(Message):
+    '''Sent by the leader instead of accepting a request when its log window
+    is full and too many requests are already waiting for room in it. The
+    client sends the request again shortly.'''
+
+    type_tag = 5
+    schema = Message.schema + (('requester', INT), ('seqno', INT))
+
+    def __init__(self, sender_id: int, requester: int, seqno: int) -> None:
+        super(ClientBusy, self).__init__(sender_id, False)
+        self.requester = requester
+        self.seqno = seqno
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.requester, int) or self.requester < 0:
+            return False
+        if not isinstance(self.seqno, int) or self.seqno < 0:
+            return False
+        return super(ClientBusy, self).verify(config)
 
 
 class ClientViewChangeRequest(Message):
     '''Sent by clients to request a view change when they suspect the primary
     is faulty.'''
 
+    type_tag = 4
+    schema = Message.schema
+
     def __init__(self, sender_id: int) -> None:
         super(ClientViewChangeRequest, self).__init__(sender_id, True)
@@ -1,114 +1,135 @@
 from typing import List
 
 from ..config import BaseConfig
+from .encoding import BIGINT, BYTES, BYTES_LIST, INT, OBJECT
 from .append_entries import AppendEntriesSuccess
-from .base import ServerMessage, SignedMessage
+from .base import CertifiedMessage, ServerMessage, SignedMessage, \
+    verify_signature_keys
 from .hashable import Hashable
 
 
 class Cert(Hashable):
-    '''Certificate base class.'''
+    '''Certificate base class: signatures from 2f + 1 distinct servers over the
+    shared digest of a message_class message for (term, slot, incremental_hash).
+
+    Rather than embedding each signed message, a certificate stores a bitmap of
+    the servers that signed it and their signatures in server id order, since
+    the rest of every message is the same.'''
+
+    schema = (('slot', INT), ('term', INT), ('incremental_hash', BYTES),
+              ('signers', BIGINT), ('signatures', BYTES_LIST))
+
+    # The type of message whose signatures are collected
+    message_class = CertifiedMessage
 
     def __init__(self, slot: int, incremental_hash: bytes, term: int,
-                 msgs: List[SignedMessage[ServerMessage]]) -> None:
+                 msgs: List[SignedMessage[CertifiedMessage]]) -> None:
         self.slot = slot
         self.term = term
         self.incremental_hash = incremental_hash
-        self.msgs = msgs
+        msgs = sorted(msgs, key=lambda signed: signed.sender_id)
+        self.signers = sum(1 << signed.sender_id for signed in msgs)
+        self.signatures = [signed.signature for signed in msgs]
+
+    def signer_ids(self) -> List[int]:
+        '''Returns the ids of the servers that signed the certificate, in
+        increasing order.'''
+        return [i for i in range(self.signers.bit_length())
+                if self.signers >> i & 1]
+
+    def digest(self) -> bytes:
+        '''Returns the digest signed by every signer.'''
+        return self.message_class.shared_digest(self.term, self.slot,
+                                                self.incremental_hash)
 
     def verify(self, config: BaseConfig) -> bool:
+        '''
+        Verifies that the certificate is valid by checking for an acceptable
+        number of distinct known signers, and that every signature is a valid
+        signature of the shared digest.'''
         if not isinstance(self.slot, int) or self.slot < 0:
             return False
         if not isinstance(self.incremental_hash, bytes):
             return False
-        if not isinstance(self.msgs, list):
-            return False
         if not isinstance(self.term, int) or self.term < 0:
             return False
-        if len(self.msgs) < config.quorum_size:
+        if not isinstance(self.signers, int) or self.signers < 0 \
+                or self.signers.bit_length() > config.num_servers:
+            return False
+        if not isinstance(self.signatures, list):
             return False
-        senders_seen = set()  # type: set
-        for signed in self.msgs:
-            if not isinstance(signed, SignedMessage):
-                return False
-
-            # Check that messages come from distinct servers
-            sender_id = signed.sender_id
-            if sender_id in senders_seen:
-                return False
-            senders_seen.add(sender_id)
-
-            # Check that message is valid (signature, etc.)
-            if not signed.verify(config):
-                return False
-        return True
-
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.slot))
-        h.update(self.int_to_bytes(self.term))
-        h.update(self.incremental_hash)
-        for msg in self.msgs:
-            h.update(msg.hash())
+        signer_ids = self.signer_ids()
+        if len(signer_ids) < config.quorum_size \
+                or len(signer_ids) != len(self.signatures):
+            return False
+
+        # Checked last so that malformed certificates are rejected before any
+        # signature work
+        digest = self.digest()
+        keys = [(False, signer_id, digest, signature)
+                for signer_id, signature in zip(signer_ids, self.signatures)]
+        return verify_signature_keys(keys, config)
 
 
 class ACert(Cert):
-    '''A-certificate: contains 2f + 1 AppendEntriesSuccess messages.'''
+    '''A-certificate: 2f + 1 signed AppendEntriesSuccess messages.'''
 
-    def verify(self, config: BaseConfig) -> bool:
-        '''
-        Verifies that the A-Certificate is valid by checking for an acceptable
-        number of messages, that all messages are signed correctly,
-        that messages come from distinct servers,
-        and that the AppendEntriesSuccess messages all match.'''
-        if not super(ACert, self).verify(config):
-            return False
-        for signed in self.msgs:
-            if not isinstance(signed.message, AppendEntriesSuccess):
-                return False
-            if not signed.message.incremental_hash == self.incremental_hash:
-                return False
-            if not signed.message.slot == self.slot:
-                return False
-        return True
+    type_tag = 103
+    schema = Cert.schema
 
+    message_class = AppendEntriesSuccess
 
-class CommitMessage(ServerMessage):
-    '''Sent by a replica after assembling an A-certificate.'''
 
-    def __init__(self, sender_id: int, term: int, a_cert: ACert) -> None:
-        super(CommitMessage, self).__init__(sender_id, term)
-        self.a_cert = a_cert
+class CommitMessage(CertifiedMessage):
+    '''Sent by a replica after assembling (or fetching) an A-certificate. Refers
+    to the A-certificate by its slot and incremental hash; a replica that has
+    not seen it can ask for it with a CertRequest.'''
 
-    def update_hash(self, h) -> None:
-        h.update(self.a_cert.hash())
-        h.update(self.incremental_hash)
-        super(CommitMessage, self).update_hash(h)
+    type_tag = 20
+    schema = CertifiedMessage.schema
 
-    @property
-    def incremental_hash(self) -> bytes:
-        return self.a_cert.incremental_hash
 
-    @property
-    def slot(self) -> int:
-        return self.a_cert.slot
+class CCert(Cert):
+    '''C-certificate: 2f + 1 signed commit messages.'''
 
+    type_tag = 104
+    schema = Cert.schema
 
-class CCert(Cert):
-    '''C-certificate: contains 2f + 1 commit messages.'''
+    message_class = CommitMessage
+
+
+class CertRequest(ServerMessage):
+    '''Asks a server for its A-certificate for slot, when commits for the slot
+    have arrived but we haven't seen enough AppendEntriesSuccess messages to
+    form the certificate ourselves.'''
+
+    type_tag = 21
+    schema = ServerMessage.schema + (('slot', INT),)
+
+    def __init__(self, sender_id: int, term: int, slot: int) -> None:
+        super(CertRequest, self).__init__(sender_id, term)
+        self.slot = slot
 
     def verify(self, config: BaseConfig) -> bool:
-        '''
-        Verifies that the C-Certificate is valid by checking for an acceptable
-        number of messages, that all messages are signed correctly,
-        that messages come from distinct servers,
-        and that all A-certificates are valid and match.'''
-        if not super(CCert, self).verify(config):
+        if not isinstance(self.slot, int) or self.slot < 0:
+            return False
+        return super(CertRequest, self).verify(config)
+
+
+class CertMessage(ServerMessage):
+    '''Carries a certificate to another server, e.g. in response to a
+    CertRequest. Certificates verify themselves, so this message doesn't need
+    to be transferable.'''
+
+    type_tag = 22
+    schema = ServerMessage.schema + (('cert', OBJECT),)
+
+    def __init__(self, sender_id: int, term: int, cert: Cert) -> None:
+        super(CertMessage, self).__init__(sender_id, term)
+        self.cert = cert
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.cert, (ACert, CCert)):
             return False
-        for signed in self.msgs:
-            if not isinstance(signed.message, CommitMessage):
-                return False
-            if not signed.message.incremental_hash == self.incremental_hash:
-                return False
-            if not signed.message.a_cert.slot == self.slot:
-                return False
-        return True
+        return super(CertMessage, self).verify(config) \
+            and self.cert.verify(config)
@@ -0,0 +1,127 @@
+'''Compression of frame payloads with the codecs in the standard library.
+
+Each codec has a one-byte id, which is carried by every frame (see frame).
+Nodes list the ids they can decompress in their Hello messages, and only
+compress frames to nodes that listed the codec they use.'''
+
+import time
+import typing
+import zlib
+
+try:
+    import bz2
+except ImportError:  # (Python built without libbz2)
+    bz2 = None
+try:
+    import lzma
+except ImportError:  # (Python built without liblzma)
+    lzma = None
+
+from .encoding import DecodeError
+
+NONE = 0
+ZLIB = 1
+BZ2 = 2
+LZMA = 3
+
+# Codecs this Python supports: id -> (name, compress, decompressor factory).
+# Codecs are used at fast settings, since frames are compressed on the
+# critical path.
+CODECS = {
+    ZLIB: ('zlib', lambda data: zlib.compress(data, 1), zlib.decompressobj),
+}  # type: typing.Dict[int, typing.Tuple[str, typing.Callable, typing.Callable]]
+if bz2 is not None:
+    CODECS[BZ2] = ('bz2', lambda data: bz2.compress(data, 1),
+                   bz2.BZ2Decompressor)
+if lzma is not None:
+    CODECS[LZMA] = ('lzma', lambda data: lzma.compress(data, preset=0),
+                    lzma.LZMADecompressor)
+
+# Exceptions raised by the decompressors on invalid data
+_ERRORS = (OSError, EOFError, ValueError, zlib.error) + \
+    ((lzma.LZMAError,) if lzma is not None else ())
+
+# Ids of the codecs we can decompress, as listed in Hello messages
+SUPPORTED = bytes(sorted(CODECS))
+
+
+def codec_id(name: str) -> int:
+    '''Returns the id of a codec given its name, or NONE for None.'''
+    if name is None:
+        return NONE
+    for codec, (codec_name, _, _) in CODECS.items():
+        if codec_name == name:
+            return codec
+    raise ValueError('unsupported compression codec %r' % name)
+
+
+def compress(codec: int, data: bytes) -> bytes:
+    return CODECS[codec][1](data)
+
+
+def decompress(codec: int, data: bytes, max_size: int) -> bytes:
+    '''Decompresses data. Raises DecodeError if it is invalid or would
+    decompress to more than max_size bytes.'''
+    if codec not in CODECS:
+        raise DecodeError('unsupported compression codec %d' % codec)
+    decompressor = CODECS[codec][2]()
+    try:
+        result = decompressor.decompress(data, max_size + 1)
+    except _ERRORS as e:
+        raise DecodeError('invalid compressed data: %s' % e)
+    if len(result) > max_size:
+        raise DecodeError('compressed frame exceeds limit')
+    if not decompressor.eof:
+        raise DecodeError('truncated compressed data')
+    return result
+
+
+class CompressionStats(object):
+    '''Compression ratio and time of the frames a node sent and received,
+    per message type.'''
+
+    def __init__(self) -> None:
+        # Message type name -> [frames compressed, bytes before compression,
+        # bytes after, seconds spent compressing, frames decompressed,
+        # seconds spent decompressing]
+        self._types = {}  # type: typing.Dict[str, list]
+
+    def _counters(self, message_type: str) -> list:
+        counters = self._types.get(message_type)
+        if counters is None:
+            counters = self._types[message_type] = [0, 0, 0, 0.0, 0, 0.0]
+        return counters
+
+    def compressed(self, message_type: str, raw_size: int,
+                   compressed_size: int, start: float) -> None:
+        '''Records a frame compressed since time.perf_counter() was start.'''
+        counters = self._counters(message_type)
+        counters[0] += 1
+        counters[1] += raw_size
+        counters[2] += compressed_size
+        counters[3] += time.perf_counter() - start
+
+    def decompressed(self, message_type: str, start: float) -> None:
+        '''Records a frame decompressed since time.perf_counter() was
+        start.'''
+        counters = self._counters(message_type)
+        counters[4] += 1
+        counters[5] += time.perf_counter() - start
+
+    def summary(self) -> typing.Dict[str, dict]:
+        '''Returns, for each message type, the number of frames compressed,
+        the ratio of their total size before and after compression, and the
+        mean time to compress one, and the number of frames decompressed and
+        the mean time to decompress one, in seconds.'''
+        result = {}
+        for message_type, counters in self._types.items():
+            sent, raw, compressed, compress_time, received, decompress_time = \
+                counters
+            result[message_type] = {
+                'compressed': sent,
+                'ratio': raw / compressed if compressed else None,
+                'compress_time': compress_time / sent if sent else None,
+                'decompressed': received,
+                'decompress_time':
+                    decompress_time / received if received else None}
+        return result
@@ -1,32 +1,37 @@
 from typing import List, Tuple
 from .base import ServerMessage, SignedMessage
 from .commit import ACert
+from .encoding import INT, OBJECT_LIST, OPTIONAL
 from ..config import BaseConfig
 from .log_entry import LogEntry, verify_entries
 
 
 class VoteMessage(ServerMessage):
+    type_tag = 30
+    schema = ServerMessage.schema + (('a_cert', OPTIONAL),)
+
+    transferable = True
+
     def __init__(self, sender_id: int, term: int,
                  a_cert: ACert) -> None:
         super(VoteMessage, self).__init__(sender_id, term)
         self.a_cert = a_cert
 
     def verify(self, config: BaseConfig) -> bool:
-        if not isinstance(self.a_cert, ACert):
-            return False
-        if not self.a_cert.verify(config):
-            return False
-        return super(VoteMessage, self).verify(config)
-
-    def update_hash(self, h) -> None:
+        # (a_cert is None if the voter has not seen any A-certificates yet)
         if self.a_cert is not None:
-            h.update(self.a_cert.hash())
-        super(VoteMessage, self).update_hash(h)
+            if not isinstance(self.a_cert, ACert):
+                return False
+            if not self.a_cert.verify(config):
+                return False
+        return super(VoteMessage, self).verify(config)
 
 
 class VotesListMessage(ServerMessage):
     '''Base class for a message containing a list of votes.'''
 
+    schema = ServerMessage.schema + (('votes', OBJECT_LIST),)
+
     def __init__(self, sender_id: int, term: int,
                  votes: List[SignedMessage[VoteMessage]]) -> None:
         super(VotesListMessage, self).__init__(sender_id, term)
@@ -35,29 +40,33 @@ class VotesListMessage(ServerMessage):
     def verify(self, config: BaseConfig) -> bool:
         if not super(VotesListMessage, self).verify(config):
             return False
+        if not isinstance(self.votes, list):
+            return False
         seen_servers = set()  # type: ignore
         for v in self.votes:
             if not isinstance(v, SignedMessage):
                 return False
             if not isinstance(v.message, VoteMessage):
                 return False
-            if not v.verify(config):
-                return False
             if v.sender_id in seen_servers:
                 return False  # votes should be from distinct servers
             seen_servers.add(v.sender_id)
-        return True
 
-    def update_hash(self, h) -> None:
+        # Signatures (including those in each vote's A-certificate) are checked
+        # last; any seen before are found in config.signature_cache.
         for v in self.votes:
-            h.update(v.hash())
-        super(VotesListMessage, self).update_hash(h)
+            if not v.verify(config):
+                return False
+        return True
 
 
 class VoteRequest(VotesListMessage):
     '''Sent by a candidate to clients after receiving f + 1
     votes (i.e. at least 1 vote from a correct server).'''
 
+    type_tag = 31
+    schema = VotesListMessage.schema
+
     def verify(self, config: BaseConfig) -> bool:
         if not super(VoteRequest, self).verify(config):
             return False
@@ -70,6 +79,9 @@ class ElectedMessage(VotesListMessage):
     '''Sent by a new leader to prove its election. The votes
     list must contain >= 2f + 1 votes.'''
 
+    type_tag = 32
+    schema = VotesListMessage.schema
+
     def verify(self, config: BaseConfig) -> bool:
         if not super(ElectedMessage, self).verify(config):
             return False
@@ -92,13 +104,19 @@ class ElectedMessage(VotesListMessage):
 
 class ElectionProofRequest(ServerMessage):
     '''Sent by a server to the primary to request proof of its election.'''
-    pass  # (nothing needs to be added here)
+
+    type_tag = 33
+    schema = ServerMessage.schema
 
 
 class CatchupRequest(ServerMessage):
     '''Sent by a new leader to a servers to request log entries at slots
     <= the commit index that it does not have.'''
 
+    type_tag = 34
+    schema = ServerMessage.schema + (('first_slot', INT),
+                                     ('last_slot', INT))
+
     def __init__(self, sender_id: int, term: int,
                  first_slot: int, last_slot: int) -> None:
         super(CatchupRequest, self).__init__(sender_id, term)
@@ -112,13 +130,12 @@ class CatchupRequest(ServerMessage):
             return False
         return super(CatchupRequest, self).verify(config)
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.first_slot))
-        h.update(self.int_to_bytes(self.last_slot))
-        super(CatchupRequest, self).update_hash(h)
-
 
 class CatchupResponse(ServerMessage):
+    type_tag = 35
+    schema = ServerMessage.schema + (('first_slot', INT),
+                                     ('entries', OBJECT_LIST))
+
     def __init__(self, sender_id: int, term: int,
                  first_slot: int, entries: List[LogEntry]) -> None:
         super(CatchupResponse, self).__init__(sender_id, term)
@@ -132,12 +149,6 @@ class CatchupResponse(ServerMessage):
     def verify(self, config: BaseConfig) -> bool:
         if not isinstance(self.first_slot, int) or self.first_slot < 0:
             return False
-        if not verify_entries(self.entries, config):
+        if not super(CatchupResponse, self).verify(config):
             return False
-        return super(CatchupResponse, self).verify(config)
-
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.first_slot))
-        for entry in self.entries:
-            h.update(entry.hash())
-        super(CatchupResponse, self).update_hash(h)
+        return verify_entries(self.entries, config)
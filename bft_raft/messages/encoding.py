@@ -0,0 +1,330 @@
+'''Canonical binary encoding of messages.
+
+Every Hashable with a type_tag is encoded as
+
+    type tag (uint16) | body length (uint32) | body
+
+where the body is the concatenation of the object's schema fields, in order:
+
+    INT          int64
+    BOOL         one byte, 0 or 1
+    BIGINT       uint32 length | unsigned big-endian bytes, without leading zeros
+    BYTES        uint32 length | bytes
+    OBJECT       nested encoding
+    OPTIONAL     one byte, 0 (None) or 1 followed by the nested encoding
+    OBJECT_LIST  uint32 count | nested encodings
+    BYTES_LIST   uint32 count | BYTES values
+    BYTES_MAP    uint32 count | (int64 key | BYTES value) pairs, keys increasing
+
+All integers are big-endian. Each value has exactly one encoding, and decode
+rejects anything else, so an encoding is both the network payload and the
+preimage of the object's hash. decode also rejects objects nested more than
+MAX_DEPTH deep, which no message is.'''
+
+import struct
+from typing import Dict, Tuple  # pylint:disable=W0611
+
+INT = 'int'
+BOOL = 'bool'
+BIGINT = 'bigint'
+BYTES = 'bytes'
+OBJECT = 'object'
+OPTIONAL = 'optional'
+OBJECT_LIST = 'object_list'
+BYTES_LIST = 'bytes_list'
+BYTES_MAP = 'bytes_map'
+
+# Deepest nesting of objects decode accepts; deeper input would otherwise
+# exhaust the stack
+MAX_DEPTH = 32
+
+_HEADER = struct.Struct('!HI')
+_INT = struct.Struct('!q')
+_LENGTH = struct.Struct('!I')
+
+# Map from type tag to (class, decoding plan); see _compile
+_registry = {}  # type: Dict[int, Tuple[type, list]]
+
+
+class DecodeError(ValueError):
+    '''Raised when decoding malformed or non-canonical input.'''
+
+
+def register(cls: type) -> None:
+    '''Registers cls under its type_tag, so that decode can construct it.'''
+    existing = registered_class(cls.type_tag)  # type: ignore
+    if existing is not None and existing is not cls:
+        raise ValueError('type tag %d is used by both %s and %s' % (
+            cls.type_tag, existing.__name__, cls.__name__))  # type: ignore
+    _registry[cls.type_tag] = (cls, _compile(cls.schema))  # type: ignore
+
+
+def encode(obj) -> bytes:
+    '''Returns the encoding of obj, which must have a type tag and a schema.
+    Nested objects are encoded with their (cached) encode method.'''
+    tag = type(obj).__dict__.get('type_tag')
+    if tag is None:
+        raise TypeError('%s has no type tag' % type(obj).__name__)
+    parts = [b'']
+    for name, kind in obj.schema:
+        _encode_value(getattr(obj, name), kind, parts)
+    body = b''.join(parts)
+    return _HEADER.pack(tag, len(body)) + body
+
+
+def _encode_value(value, kind: str, parts: list) -> None:
+    if kind == INT:
+        parts.append(_INT.pack(value))
+    elif kind == BOOL:
+        parts.append(b'\x01' if value else b'\x00')
+    elif kind == BIGINT:
+        if value < 0:
+            raise ValueError('BIGINT fields must be non-negative')
+        raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        parts.append(_LENGTH.pack(len(raw)))
+        parts.append(raw)
+    elif kind == BYTES:
+        parts.append(_LENGTH.pack(len(value)))
+        parts.append(value)
+    elif kind == OBJECT:
+        parts.append(value.encode())
+    elif kind == OPTIONAL:
+        if value is None:
+            parts.append(b'\x00')
+        else:
+            parts.append(b'\x01')
+            parts.append(value.encode())
+    elif kind == OBJECT_LIST:
+        parts.append(_LENGTH.pack(len(value)))
+        parts.extend(item.encode() for item in value)
+    elif kind == BYTES_LIST:
+        parts.append(_LENGTH.pack(len(value)))
+        for item in value:
+            parts.append(_LENGTH.pack(len(item)))
+            parts.append(item)
+    elif kind == BYTES_MAP:
+        parts.append(_LENGTH.pack(len(value)))
+        for key in sorted(value):
+            parts.append(_INT.pack(key))
+            parts.append(_LENGTH.pack(len(value[key])))
+            parts.append(value[key])
+    else:
+        raise ValueError('unknown field kind %r' % kind)
+
+
+def decode(data: bytes):
+    '''Decodes an object encoded with encode. Raises DecodeError if data is
+    not exactly one canonical encoding of a registered type.
+
+    Decoding doesn't copy the encodings of nested objects: each object keeps
+    a reference to its span of data, and only slices it out if its encoding is
+    asked for (e.g. to hash it).'''
+    data = bytes(data)
+    obj, end = decode_object(data, 0, len(data))
+    if end != len(data):
+        raise DecodeError('trailing data')
+    return obj
+
+
+def decode_object(data: bytes, pos: int, end: int,
+                  depth: int = 0) -> Tuple[object, int]:
+    '''Decodes the object encoded at data[pos:], which must end by end and is
+    nested depth objects deep. Returns the object and the position just past
+    its encoding.'''
+    # (the hot loop of decode, so helpers are inlined)
+    if depth > MAX_DEPTH:
+        raise DecodeError('objects nested too deeply')
+    start = pos
+    pos += _HEADER.size
+    if pos > end:
+        raise DecodeError('truncated data')
+    tag, length = _HEADER.unpack_from(data, start)
+    obj_end = pos + length
+    if obj_end > end:
+        raise DecodeError('truncated data')
+    entry = _registry.get(tag)
+    if entry is None:
+        raise DecodeError('unknown type tag %d' % tag)
+    cls, plan = entry
+
+    fields = {}
+    for step, names, decoder, bools in plan:
+        if step == _STEP_BYTES:
+            value_pos = pos + _LENGTH.size
+            if value_pos > obj_end:
+                raise DecodeError('truncated data')
+            pos = value_pos + _LENGTH.unpack_from(data, pos)[0]
+            if pos > obj_end:
+                raise DecodeError('truncated data')
+            fields[names] = data[value_pos:pos]
+        elif step == _STEP_FIXED:
+            # a run of INT and BOOL fields
+            if pos + decoder.size > obj_end:
+                raise DecodeError('truncated data')
+            values = decoder.unpack_from(data, pos)
+            pos += decoder.size
+            if bools:
+                values = list(values)
+                for i in bools:
+                    if values[i] > 1:
+                        raise DecodeError('invalid bool')
+                    values[i] = values[i] == 1
+            fields.update(zip(names, values))
+        elif step == _STEP_NESTED:
+            fields[names], pos = decoder(data, pos, obj_end, depth + 1)
+        else:
+            fields[names], pos = decoder(data, pos, obj_end)
+    if pos != obj_end:
+        raise DecodeError('%s has trailing data' % cls.__name__)
+
+    obj = cls.__new__(cls)
+    fields['_span'] = (data, start, obj_end)
+    fields['_frozen'] = True
+    obj.__dict__.update(fields)
+    return obj, obj_end
+
+
+def decode_header(data: bytes, pos: int, end: int) -> Tuple[int, int, int]:
+    '''Reads the header of the object encoded at data[pos:end]. Returns its
+    type tag, the length of its body and the position of the body.'''
+    _check(pos + _HEADER.size, end)
+    tag, length = _HEADER.unpack_from(data, pos)
+    pos += _HEADER.size
+    _check(pos + length, end)
+    return tag, length, pos
+
+
+def decode_value(data: bytes, pos: int, end: int,
+                 kind: str) -> Tuple[object, int]:
+    '''Reads a single field of the given kind at data[pos:end]. Returns the
+    value and the position just past it.'''
+    return _DECODERS[kind](data, pos, end)
+
+
+def registered_class(tag: int) -> type:
+    '''Returns the class registered under tag, or None.'''
+    entry = _registry.get(tag)
+    return entry[0] if entry is not None else None
+
+
+# Kinds of decoding plan steps
+_STEP_FIXED = 0
+_STEP_BYTES = 1
+_STEP_NESTED = 2  # nested objects, decoded one level deeper
+_STEP_OTHER = 3
+
+
+def _compile(schema: tuple) -> list:
+    '''Returns the plan used to decode objects with the given schema: a list
+    of (step kind, field name(s), decoder, indices of BOOL fields) steps. Runs
+    of consecutive INT and BOOL fields are merged into a single step decoded
+    with one struct.'''
+    plan = []
+    run = []  # type: list
+    for name, kind in schema + ((None, None),):
+        if kind in (INT, BOOL):
+            run.append((name, kind))
+            continue
+        if run:
+            fmt = struct.Struct(
+                '!' + ''.join('q' if k == INT else 'B' for _, k in run))
+            bools = tuple(i for i, (_, k) in enumerate(run) if k == BOOL)
+            plan.append((_STEP_FIXED, tuple(n for n, _ in run), fmt, bools))
+            run = []
+        if kind == BYTES:
+            plan.append((_STEP_BYTES, name, None, None))
+        elif kind in (OBJECT, OPTIONAL, OBJECT_LIST):
+            plan.append((_STEP_NESTED, name, _DECODERS[kind], None))
+        elif kind is not None:
+            plan.append((_STEP_OTHER, name, _DECODERS[kind], None))
+    return plan
+
+
+def _decode_int(data: bytes, pos: int, end: int) -> Tuple[int, int]:
+    _check(pos + _INT.size, end)
+    return _INT.unpack_from(data, pos)[0], pos + _INT.size
+
+
+def _decode_bool(data: bytes, pos: int, end: int) -> Tuple[bool, int]:
+    _check(pos + 1, end)
+    if data[pos] > 1:
+        raise DecodeError('invalid bool')
+    return data[pos] == 1, pos + 1
+
+
+def _decode_bigint(data: bytes, pos: int, end: int) -> Tuple[int, int]:
+    raw, pos = _decode_bytes(data, pos, end)
+    if raw[:1] == b'\x00':
+        raise DecodeError('non-canonical BIGINT')
+    return int.from_bytes(raw, 'big'), pos
+
+
+def _decode_bytes(data: bytes, pos: int, end: int) -> Tuple[bytes, int]:
+    length, pos = _decode_length(data, pos, end)
+    _check(pos + length, end)
+    return data[pos:pos + length], pos + length
+
+
+def _decode_optional(data: bytes, pos: int, end: int,
+                     depth: int = 0) -> Tuple[object, int]:
+    _check(pos + 1, end)
+    if data[pos] == 0:
+        return None, pos + 1
+    elif data[pos] == 1:
+        return decode_object(data, pos + 1, end, depth)
+    raise DecodeError('invalid OPTIONAL flag')
+
+
+def _decode_object_list(data: bytes, pos: int, end: int,
+                        depth: int = 0) -> Tuple[list, int]:
+    count, pos = _decode_length(data, pos, end)
+    items = []
+    for _ in range(count):
+        item, pos = decode_object(data, pos, end, depth)
+        items.append(item)
+    return items, pos
+
+
+def _decode_bytes_list(data: bytes, pos: int, end: int) -> Tuple[list, int]:
+    count, pos = _decode_length(data, pos, end)
+    values = []
+    for _ in range(count):
+        value, pos = _decode_bytes(data, pos, end)
+        values.append(value)
+    return values, pos
+
+
+def _decode_bytes_map(data: bytes, pos: int, end: int) -> Tuple[dict, int]:
+    count, pos = _decode_length(data, pos, end)
+    mapping = {}
+    prev = None
+    for _ in range(count):
+        key, pos = _decode_int(data, pos, end)
+        if prev is not None and key <= prev:
+            raise DecodeError('BYTES_MAP keys out of order')
+        mapping[key], pos = _decode_bytes(data, pos, end)
+        prev = key
+    return mapping, pos
+
+
+def _decode_length(data: bytes, pos: int, end: int) -> Tuple[int, int]:
+    _check(pos + _LENGTH.size, end)
+    return _LENGTH.unpack_from(data, pos)[0], pos + _LENGTH.size
+
+
+def _check(pos: int, end: int) -> None:
+    if pos > end:
+        raise DecodeError('truncated data')
+
+
+_DECODERS = {
+    INT: _decode_int,
+    BOOL: _decode_bool,
+    BIGINT: _decode_bigint,
+    BYTES: _decode_bytes,
+    OBJECT: decode_object,
+    OPTIONAL: _decode_optional,
+    OBJECT_LIST: _decode_object_list,
+    BYTES_LIST: _decode_bytes_list,
+    BYTES_MAP: _decode_bytes_map,
+}
@@ -0,0 +1,134 @@
+'''Network frames carrying encoded SignedMessages and AuthenticatedMessages.
+
+A frame is
+
+    wire version (uint8) | payload length (uint32) | payload
+
+where the payload is a compression codec id (uint8, see compression) followed
+by the canonical encoding of the envelope (see encoding), compressed with that
+codec.
+EnvelopeView reads the sender and the signature or MACs of a payload without
+decoding the enclosed message, so that frames from unknown senders or with bad
+authenticators can be dropped before any objects are built.'''
+
+import struct
+from typing import Dict, Tuple  # pylint:disable=W0611
+
+from Crypto.Hash import SHA256
+
+from .base import AuthenticatedMessage, Message, ServerMessage, SignedMessage
+from .compression import NONE, decompress
+from .encoding import (BOOL, BYTES, BYTES_MAP, INT, DecodeError,
+                       decode_header, decode_object, decode_value,
+                       registered_class)
+
+# Bumped whenever the encoding of any message changes incompatibly
+WIRE_VERSION = 2
+
+FRAME_HEADER = struct.Struct('!BI')
+
+
+def encode_frame(envelope) -> bytes:
+    '''Returns the uncompressed frame carrying a signed or authenticated
+    message.'''
+    return build_frame(envelope.encode())
+
+
+def build_frame(body: bytes, codec: int = NONE) -> bytes:
+    '''Returns the frame carrying an envelope encoding compressed with
+    codec.'''
+    return b''.join((FRAME_HEADER.pack(WIRE_VERSION, len(body) + 1),
+                     bytes((codec,)), body))
+
+
+def decode_frame_header(header: bytes, max_size: int) -> int:
+    '''Returns the payload length given by a frame header. Raises DecodeError
+    if the frame is from a different wire version or larger than max_size.'''
+    version, length = FRAME_HEADER.unpack(header)
+    if version != WIRE_VERSION:
+        raise DecodeError('unsupported wire version %d' % version)
+    if length > max_size:
+        raise DecodeError('frame of %d bytes exceeds limit' % length)
+    return length
+
+
+def decode_frame_payload(payload: bytes, codecs: bytes,
+                         max_size: int) -> Tuple[bytes, int]:
+    '''Returns the envelope encoding carried by a frame payload, decompressed,
+    and the codec it was compressed with. Raises DecodeError if the codec
+    isn't NONE or one of codecs, or if the encoding is invalid or larger than
+    max_size.'''
+    if not payload:
+        raise DecodeError('empty frame')
+    codec = payload[0]
+    if codec == NONE:
+        return bytes(payload[1:]), codec
+    if codec not in codecs:
+        raise DecodeError('unexpected compression codec %d' % codec)
+    return decompress(codec, payload[1:], max_size), codec
+
+
+class EnvelopeView(object):
+    '''Lazily decoded frame payload. Construction only parses the envelope
+    header, the type, sender and from_client fields (and the term, for server
+    messages) of the enclosed message, and the signature or MACs; decode
+    builds the full envelope.
+
+    Relies on every Message schema starting with Message.schema.'''
+
+    def __init__(self, payload: bytes) -> None:
+        self.payload = bytes(payload)
+        end = len(self.payload)
+        tag, length, pos = decode_header(self.payload, 0, end)
+        if pos + length != end:
+            raise DecodeError('trailing data')
+        self.envelope_class = registered_class(tag)
+        if self.envelope_class not in (SignedMessage, AuthenticatedMessage):
+            raise DecodeError('payload is not an envelope')
+
+        # The enclosed message
+        self._message_start = pos
+        tag, length, pos = decode_header(self.payload, pos, end)
+        self.message_class = registered_class(tag)
+        if self.message_class is None \
+                or not issubclass(self.message_class, Message):
+            raise DecodeError('unknown message type %d' % tag)
+        self._message_end = pos + length
+        self.sender_id, pos = decode_value(self.payload, pos,
+                                           self._message_end, INT)
+        self.from_client, pos = decode_value(self.payload, pos,
+                                             self._message_end, BOOL)
+        self.term = None  # type: int
+        if issubclass(self.message_class, ServerMessage):
+            self.term, pos = decode_value(self.payload, pos,
+                                          self._message_end, INT)
+
+        # The authenticator
+        pos = self._message_end
+        self.signature = None  # type: bytes
+        self.macs = None  # type: Dict[int, bytes]
+        if self.envelope_class is SignedMessage:
+            self.signature, pos = decode_value(self.payload, pos, end, BYTES)
+        else:
+            self.macs, pos = decode_value(self.payload, pos, end, BYTES_MAP)
+        if pos != end:
+            raise DecodeError('trailing data')
+        self._message_encoding = None  # type: bytes
+        self._digest = None  # type: bytes
+
+    def message_digest(self) -> bytes:
+        '''Returns the hash of the enclosed message, without decoding it.'''
+        if self._digest is None:
+            self._message_encoding = \
+                self.payload[self._message_start:self._message_end]
+            self._digest = SHA256.new(self._message_encoding).digest()
+        return self._digest
+
+    def decode(self):
+        '''Decodes and returns the whole envelope.'''
+        envelope, _ = decode_object(self.payload, 0, len(self.payload))
+        if self._digest is not None:
+            # (computed from exactly the bytes the message was decoded from)
+            envelope.message.__dict__['_encoding'] = self._message_encoding
+            envelope.message.__dict__['_digest'] = self._digest
+        return envelope
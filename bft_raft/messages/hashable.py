@@ -1,18 +1,92 @@
-from math import ceil
 from Crypto.Hash import SHA256
 
+from . import encoding
+
 
 class Hashable(object):
+    '''Base class for messages and other objects that are hashed and signed.
+
+    Each concrete subclass declares a type_tag and a schema listing its fields
+    and their kinds (see encoding). Instances are frozen once their
+    constructor returns, so the canonical encoding, which is both what is sent
+    over the network and what is hashed, is computed once and cached; parents
+    reuse the cached encodings of their children.'''
+
+    # Whether encodings and digests are cached. Only meant to be disabled for
+    # benchmarking.
+    cache_digests = True
+
+    # Identifies the class in encodings; None for abstract base classes
+    type_tag = None  # type: int
+
+    # (field name, field kind) pairs, in encoding order
+    schema = ()  # type: tuple
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+        if cls.__dict__.get('type_tag') is not None:
+            encoding.register(cls)
+        init = cls.__dict__.get('__init__')
+        if init is None:
+            return
+
+        def frozen_init(self, *args, **kwargs):
+            init(self, *args, **kwargs)
+            # Only the outermost constructor freezes the object, after all
+            # subclass constructors have finished setting fields.
+            if type(self).__init__ is frozen_init:
+                self.__dict__['_frozen'] = True
+        frozen_init.__doc__ = init.__doc__
+        cls.__init__ = frozen_init  # type: ignore
+
+    def __setattr__(self, name: str, value) -> None:
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('%s is immutable' % self.__class__.__name__)
+        super(Hashable, self).__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        if self.__dict__.get('_frozen'):
+            raise AttributeError('%s is immutable' % self.__class__.__name__)
+        super(Hashable, self).__delattr__(name)
+
+    def __getstate__(self) -> dict:
+        # Never send a cached digest or encoding; the receiver must compute
+        # them from the fields.
+        state = dict(self.__dict__)
+        state.pop('_digest', None)
+        state.pop('_encoding', None)
+        state.pop('_span', None)
+        state.pop('_frozen', None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        state.pop('_digest', None)
+        state.pop('_encoding', None)
+        state.pop('_span', None)
+        state['_frozen'] = True
+        self.__dict__.update(state)
+
+    def encode(self) -> bytes:
+        '''Returns the canonical encoding of the object.'''
+        data = self.__dict__.get('_encoding')
+        if data is None:
+            span = self.__dict__.get('_span')
+            if span is not None:
+                # decoded object: slice the encoding out of the received data
+                source, start, end = span
+                data = source[start:end]
+            else:
+                data = encoding.encode(self)
+            if self.cache_digests and self.__dict__.get('_frozen'):
+                self.__dict__['_encoding'] = data
+        return data
+
     def hash(self) -> bytes:
-        '''Returns the SHA256 hash of the object.'''
-        h = SHA256.new()
-        self.update_hash(h)
-        return h.digest()
-
-    def update_hash(self, h) -> None:
-        '''Updates the hash with each field of the object.'''
-        raise NotImplementedError
-
-    def int_to_bytes(self, x: int) -> bytes:
-        length = ceil(x.bit_length() / 8)
-        return x.to_bytes(length, byteorder='big')
+        '''Returns the SHA256 hash of the object's encoding.'''
+        digest = self.__dict__.get('_digest')
+        if digest is None:
+            digest = SHA256.new(self.encode()).digest()
+            if self.cache_digests and self.__dict__.get('_frozen'):
+                self.__dict__['_digest'] = digest
+        return digest
@@ -0,0 +1,38 @@
+from .base import Message
+from .encoding import BOOL, BYTES, INT
+from ..config import BaseConfig
+
+
+class Hello(Message):
+    '''First message sent on every connection a node opens, identifying the
+    node so that the other end can also send to it over the connection.
+
+    The recipient fields stop the message being replayed to another node, and
+    timestamp, which increases with every connection the sender opens, stops
+    it being replayed to the same node.
+
+    The node at the other end answers with a Hello of its own over the same
+    connection. codecs lists the compression codecs the sender can decompress
+    (see compression).'''
+
+    type_tag = 40
+    schema = Message.schema + (('recipient', INT), ('to_client', BOOL),
+                               ('timestamp', INT), ('codecs', BYTES))
+
+    def __init__(self, sender_id: int, from_client: bool, recipient: int,
+                 to_client: bool, timestamp: int, codecs: bytes = b'') -> None:
+        super(Hello, self).__init__(sender_id, from_client)
+        self.recipient = recipient
+        self.to_client = to_client
+        self.timestamp = timestamp
+        self.codecs = codecs
+
+    def verify(self, config: BaseConfig) -> bool:
+        if not isinstance(self.recipient, int) \
+                or not isinstance(self.to_client, bool):
+            return False
+        if not isinstance(self.timestamp, int) or self.timestamp < 0:
+            return False
+        if not isinstance(self.codecs, bytes):
+            return False
+        return super(Hello, self).verify(config)
@@ -1,12 +1,17 @@
 from typing import List
 
 from ..config import BaseConfig
-from .base import SignedMessage
+from .base import SignedMessage, verify_signatures
 from .client_request import ClientRequest
+from .encoding import BYTES, INT, OBJECT
 from .hashable import Hashable
 
 
 class LogEntry(Hashable):
+    type_tag = 102
+    schema = (('term', INT), ('prev_incremental_hash', BYTES),
+              ('request', OBJECT))
+
     def __init__(self, term: int, prev_incremental_hash: bytes,
                  client_request: SignedMessage[ClientRequest]) -> None:
         self.term = term
@@ -14,7 +19,29 @@ class LogEntry(Hashable):
         self.request = client_request
 
     def incremental_hash(self) -> bytes:
-        return self.hash()
+        '''Chains the entry to the ones before it. Only covers the digest of
+        the request, so it is the same for the entry's DigestLogEntry.'''
+        return self.digest_entry().hash()
+
+    def digest_entry(self) -> 'DigestLogEntry':
+        '''Returns the entry with its request replaced by its digest.'''
+        entry = self.__dict__.get('_digest_entry')
+        if entry is None:
+            entry = DigestLogEntry(self.term, self.prev_incremental_hash,
+                                   self.request.hash())
+            if self.cache_digests and self.__dict__.get('_frozen'):
+                self.__dict__['_digest_entry'] = entry
+        return entry
+
+    def __getstate__(self) -> dict:
+        state = super(LogEntry, self).__getstate__()
+        state.pop('_digest_entry', None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        state.pop('_digest_entry', None)
+        super(LogEntry, self).__setstate__(state)
 
     @property
     def client_id(self):
@@ -28,12 +55,13 @@ class LogEntry(Hashable):
     def operation(self):
         return self.request.message.operation
 
-    def update_hash(self, h) -> None:
-        h.update(self.int_to_bytes(self.term))
-        h.update(self.prev_incremental_hash)
-        h.update(self.request.hash())
-
     def verify(self, config: BaseConfig) -> bool:
+        if not self.verify_fields(config):
+            return False
+        return self.request.verify_signature(config)
+
+    def verify_fields(self, config: BaseConfig) -> bool:
+        '''Verifies everything except the client's signature.'''
         if not isinstance(self.term, int) or self.term < 0:
             return False
         if not isinstance(self.prev_incremental_hash, bytes):
@@ -42,22 +70,57 @@ class LogEntry(Hashable):
             return False
         if not isinstance(self.request.message, ClientRequest):
             return False
-        if not self.request.verify(config):
+        return self.request.message.verify(config)
+
+
+class DigestLogEntry(Hashable):
+    '''A LogEntry that only carries the digest of its request (the hash of
+    the signed ClientRequest), which the receiver looks up among the
+    requests clients sent it (see util.request_pool).'''
+
+    type_tag = 105
+    schema = (('term', INT), ('prev_incremental_hash', BYTES),
+              ('request_digest', BYTES))
+
+    def __init__(self, term: int, prev_incremental_hash: bytes,
+                 request_digest: bytes) -> None:
+        self.term = term
+        self.prev_incremental_hash = prev_incremental_hash
+        self.request_digest = request_digest
+
+    def incremental_hash(self) -> bytes:
+        return self.hash()
+
+    def verify(self, config: BaseConfig) -> bool:
+        return self.verify_fields(config)
+
+    def verify_fields(self, config: BaseConfig) -> bool:
+        if not isinstance(self.term, int) or self.term < 0:
+            return False
+        if not isinstance(self.prev_incremental_hash, bytes):
             return False
-        return True
+        return isinstance(self.request_digest, bytes) \
+            and len(self.request_digest) == 32
 
 
 def verify_entries(entries: List[LogEntry], config: BaseConfig) -> bool:
-    '''Verifies that a list of log entries have matching incremental hashes
-    and contain requests signed by clients.'''
+    '''Verifies that a list of log entries (or DigestLogEntries) have
+    matching incremental hashes and contain requests signed by clients.
+
+    The hash chain is checked in a single pass, and only then are the client
+    signatures verified, in bulk (on config.verify_executor if it is set).'''
+    if not isinstance(entries, list):
+        return False
+    prev = None
     for entry in entries:
-        if not isinstance(entry, LogEntry):
+        if not isinstance(entry, (LogEntry, DigestLogEntry)):
+            return False
+        if not entry.verify_fields(config):
             return False
-        if not entry.verify(config):
+        if prev is not None \
+                and prev.incremental_hash() != entry.prev_incremental_hash:
             return False
-        for i in range(1, len(entries)):
-            a = entries[i - 1]
-            b = entries[i]
-            if a.incremental_hash() != b.prev_incremental_hash:
-                return False
-    return True
+        prev = entry
+    return verify_signatures([entry.request for entry in entries
+                              if isinstance(entry, LogEntry)], config,
+                             config.verify_executor)
@@ -0,0 +1,121 @@
+import time
+import typing
+from collections import OrderedDict, defaultdict
+
+from ..config import BaseConfig
+from ..messages.frame import EnvelopeView
+
+# Reasons a frame can be rejected for
+TOO_LARGE = 'too_large'
+RATE_LIMITED = 'rate_limited'
+STALE_TERM = 'stale_term'
+DUPLICATE = 'duplicate'
+
+# Marks the token buckets of Hellos, which are kept per remote host
+HELLO = 'hello'
+
+
+class AdmissionFilter(object):
+    '''Cheap checks made on a received frame before its signature or MACs are
+    checked and before the message is decoded, using only its EnvelopeView.
+
+    A frame is rejected if
+      - its envelope is larger than the limit for its message type
+        (config.max_message_sizes, or config.max_frame_size);
+      - its sender has used up its token bucket (config.client_rate_limit and
+        config.server_rate_limit);
+      - it is a server message from a term older than current_term, of a type
+        every state ignores in that case (config.stale_term_types);
+      - it is identical to a recently delivered message of a type whose
+        handlers are idempotent (config.dedup_types).
+
+    Senders are the ones claimed by the frames. AsyncIoMessenger only accepts
+    frames from the node whose Hello opened the connection, so a node can't
+    use up another's tokens. Hellos themselves claim senders that haven't
+    been verified yet, so they take from a bucket per remote host instead
+    (with the client limit): a peer sending Hellos can only lock out
+    connections from its own host.
+
+    The number of frames rejected is kept per reason and message type.'''
+
+    def __init__(self, config: BaseConfig) -> None:
+        self.config = config
+
+        # Map from sender, or (HELLO, remote host), to [tokens left, time
+        # they were last topped up]
+        self._buckets = {}  # type: typing.Dict[typing.Any, list]
+
+        # Digests of recently delivered messages of config.dedup_types
+        self._delivered = OrderedDict()  # type: OrderedDict
+
+        # Map from (reason, message type name) to number of frames rejected
+        self.rejected = defaultdict(int)  # type: typing.Dict[typing.Tuple[str, str], int]
+
+    def admit(self, view: EnvelopeView, size: int, hello: bool,
+              current_term: int = None, remote_host: str = None) -> str:
+        '''Returns the reason to reject a frame whose envelope is size bytes
+        long, or None if it may be verified. hello tells whether it is the
+        Hello opening a connection, and remote_host is the host it came from,
+        if known.'''
+        name = view.message_class.__name__
+        reason = self._check(view, name, size, hello, current_term,
+                             remote_host)
+        if reason is not None:
+            self.rejected[(reason, name)] += 1
+        return reason
+
+    def _check(self, view: EnvelopeView, name: str, size: int, hello: bool,
+               current_term: int, remote_host: str) -> str:
+        if size > self.config.max_message_sizes.get(
+                name, self.config.max_frame_size):
+            return TOO_LARGE
+        if hello:
+            bucket = (HELLO, remote_host)
+            limit = self.config.client_rate_limit
+        else:
+            bucket = (view.from_client, view.sender_id)
+            limit = self.config.client_rate_limit if view.from_client \
+                else self.config.server_rate_limit
+        if not self._take_token(bucket, limit):
+            return RATE_LIMITED
+        if current_term is not None and view.term is not None \
+                and view.term < current_term \
+                and name in self.config.stale_term_types:
+            return STALE_TERM
+        if name in self.config.dedup_types \
+                and view.message_digest() in self._delivered:
+            return DUPLICATE
+        return None
+
+    def delivered(self, view: EnvelopeView) -> None:
+        '''Records that the message in a frame was verified and delivered, so
+        that copies of it can be rejected.'''
+        if view.message_class.__name__ not in self.config.dedup_types:
+            return
+        self._delivered[view.message_digest()] = None
+        while len(self._delivered) > self.config.dedup_window:
+            self._delivered.popitem(last=False)
+
+    def rejection_counts(self) -> typing.Dict[str, typing.Dict[str, int]]:
+        '''Returns the number of frames rejected, per reason and message
+        type.'''
+        result = defaultdict(dict)  # type: typing.Dict[str, typing.Dict[str, int]]
+        for (reason, name), count in self.rejected.items():
+            result[reason][name] = count
+        return dict(result)
+
+    def _take_token(self, key, limit: typing.Tuple[float, int]) -> bool:
+        if limit is None:
+            return True
+        rate, burst = limit
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
@@ -1,130 +1,520 @@
 import asyncio
-import pickle
-import struct
+import functools
+import time
 import typing
-from collections import defaultdict
+
+from messaging.connection_manager import ConnectionManager
+from messaging.frame_protocol import FrameProtocol
+from messaging.transports import Address, create_connection, create_server
 
 from ..config import BaseConfig
-from ..messages import Message, ServerMessage, SignedMessage
-from .messenger import Messenger
+from ..messages import Hello, Message, ServerMessage, SignedMessage
+from ..messages.compression import (NONE, SUPPORTED, CompressionStats,
+                                    codec_id, compress)
+from ..messages.encoding import DecodeError
+from ..messages.frame import (FRAME_HEADER, EnvelopeView, build_frame,
+                              decode_frame_header, decode_frame_payload)
+from ..util.pipeline import Pipeline, Stage, create_executor
+from . import signing, verification
+from .admission import TOO_LARGE
+from .messenger import Envelope, Messenger
+from .signing import SigningService
+from .verification import VerificationPool
+
+# Identifies a node: (whether it is a client, client or server id)
+NodeKey = typing.Tuple[bool, int]
+
+
+class Link(object):
+    '''One connection between this node and another, in either direction.'''
+
+    def __init__(self, peer: NodeKey = None) -> None:
+        # The node at the other end: known from the start for connections we
+        # open, and from its Hello message for connections it opens
+        self.peer = peer
+
+        # asyncio.StreamWriter or FrameProtocol used to send over the connection
+        self.writer = None  # type: typing.Any
+
+        # Whether the other end's Hello has been received
+        self.greeted = False
 
 
 class AsyncIoMessenger(Messenger):
-    '''asyncio implementation of Messenger.'''
+    '''asyncio implementation of Messenger, over TCP, Unix domain sockets or
+    shared memory depending on the addresses of the nodes.
+
+    Connections carry messages in both directions. A node that opens a
+    connection first sends a Hello identifying itself; the other end answers
+    with its own Hello and then sends to that node over the same connection
+    instead of opening its own. In particular, servers reply to clients over
+    the connections their requests arrived on, and only connect to a client's
+    address if it has no open connection.
+
+    If config.compression is set, frames of at least
+    config.compression_threshold bytes are compressed with that codec when
+    sent to nodes whose Hello listed it.
+
+    If config.pipeline is set, received messages go through the stages of
+    pipeline instead of being handled as they arrive, and messages signed for
+    clients through its reply stage.'''
 
     def __init__(self,
                  config: BaseConfig,
-                 clients: typing.Dict[int, typing.Tuple[str, int]],
-                 servers: typing.Dict[int, typing.Tuple[str, int]],
+                 clients: typing.Dict[int, Address],
+                 servers: typing.Dict[int, Address],
                  node_id: int,
                  is_client: bool,
                  loop: asyncio.AbstractEventLoop) -> None:
         super(AsyncIoMessenger, self).__init__(config)
-        self._clients = clients  # map from client id to (ip, port)
-        self._servers = servers  # map from server id to (ip, port)
+        # Maps from client and server ids to addresses: (ip, port) pairs, or
+        # Unix domain socket or shared-memory addresses (see messaging.transports)
+        self._clients = clients
+        self._servers = servers
         self._node_id = node_id
         self._is_client = is_client
         self._loop = loop
         self._started_server = False  # Whether start_server has been called
-        self._writers = defaultdict(list)  # type: ignore
-        self._opening_queues = defaultdict(lambda: None)  # type: ignore
+        # Send queues and health of the nodes we talk to, keyed by NodeKey
+        self.connections = ConnectionManager(
+            config, loop, self._address,
+            lambda peer: functools.partial(self._connect, peer))
+
+        # Timestamp of the last Hello sent, and of the last Hello accepted
+        # from each node
+        self._hello_timestamp = 0
+        self._peer_hello_timestamps = {}  # type: typing.Dict[NodeKey, int]
+
+        # Compression codec we send with, and the codecs each node can
+        # decompress, from its Hello
+        self._codec = codec_id(config.compression)
+        self._peer_codecs = {}  # type: typing.Dict[NodeKey, bytes]
+        self.compression_stats = CompressionStats()
+
+        # Worker processes verifying received messages, if any
+        self.verification = None  # type: VerificationPool
+        if config.verify_workers > 0:
+            self.verification = VerificationPool(config, loop,
+                                                 config.verify_workers)
+
+        # Worker processes signing outgoing messages, if any
+        self.signing = None  # type: SigningService
+        if config.sign_workers > 0:
+            self.signing = SigningService(config, loop, config.sign_workers)
+
+        # Stages received messages are handled in, if any
+        self.pipeline = None  # type: Pipeline
+        if config.pipeline is not None:
+            self.pipeline = self._create_pipeline()
 
     def start_server(self) -> None:
         '''Start listening for incoming messages.'''
         assert not self._started_server
         self._started_server = True
-        if self._is_client:
-            my_addr = self._clients[self._node_id][0]
-            my_port = self._clients[self._node_id][1]
-        else:
-            my_addr = self._servers[self._node_id][0]
-            my_port = self._servers[self._node_id][1]
-        self._loop.create_task(
-            asyncio.start_server(
-                lambda r, w: self._loop.create_task(
-                    self._handle_connection(r, w)),
-                my_addr,
-                my_port,
-                loop=self._loop))
-
-    def send_server_message(self, server_id: int, message: ServerMessage) -> None:
-        addr = self._servers[server_id][0]
-        port = self._servers[server_id][1]
-        self._loop.create_task(self._send_message(addr, port, message))
+        address = self._address((self._is_client, self._node_id))
+        self._loop.create_task(create_server(
+            self._loop, lambda: self._new_protocol(Link()), address))
+
+    def send_server_message(self, server_id: int, message: ServerMessage,
+                            signed: SignedMessage = None) -> None:
+        self._when_authenticated(
+            message, False, [server_id], signed,
+            lambda envelope: self._send((False, server_id), envelope))
 
     def send_client_message(self, client_id: int, message: Message) -> None:
-        addr = self._clients[client_id][0]
-        port = self._clients[client_id][1]
-        self._loop.create_task(self._send_message(addr, port, message))
-
-    def broadcast_server_message(self, message) -> None:
-        for i in range(0, len(self._servers)):
-            if not self._is_client and i == self._node_id:
-                continue
-            self.send_server_message(i, message)
-
-    async def _send_message(self, addr: str, port: int, message: Message) -> None:
-        # Remove any closed StreamWriters from this node's writers list
-        self._writers[(addr, port)] = [
-            w for w in self._writers[(addr, port)] if not w.transport.is_closing()]
-        signed = SignedMessage(message, self.config.private_key)
-
-        # If there are any left in the writers list, send the message
-        if self._writers[(addr, port)]:
-            msg_raw = pickle.dumps(signed)
-            writer = self._writers[(addr, port)][0]
-            writer.write(struct.pack('I', len(msg_raw)))  # send message size
-            writer.write(msg_raw)
+        if self.pipeline is not None and self.signs(message):
+            self.pipeline['reply'].add((client_id, message),
+                                       message.signing_digest())
             return
+        self._when_authenticated(
+            message, True, [client_id], None,
+            lambda envelope: self._send((True, client_id), envelope))
+
+    def broadcast_server_message(self, message, signed: SignedMessage = None) -> None:
+        # Sign (or compute the MAC vector for) and serialize the message once,
+        # then send the same frame to every server (or one of two frames, if
+        # only some of them can decompress it).
+        self.num_broadcasts += 1
+        recipients = [i for i in range(0, len(self._servers))
+                      if self._is_client or i != self._node_id]
+        self._when_authenticated(
+            message, False, recipients, signed,
+            lambda envelope: self._broadcast(recipients, envelope))
 
-        # Otherwise, we wait until we open a new connection to send the message.
-        # If we are currently trying to open a connection, add the message to the
-        # appropriate opening queue.
-        if self._opening_queues[(addr, port)] is not None:
-            self._opening_queues[(addr, port)].append(message)
+    def sign_async(self, message: Message) -> asyncio.Future:
+        if self.signing is None:
+            return super(AsyncIoMessenger, self).sign_async(message)
+        self.num_signed += 1
+        return self.signing.sign(message)
 
-        # If we are not currently trying to open the connection, we try to open
-        # the connection ourself.
+    def _when_authenticated(self, message: Message, to_client: bool,
+                            recipients: typing.List[int], signed: Envelope,
+                            callback: typing.Callable[[Envelope], None]) -> None:
+        '''Calls callback with message signed or authenticated for
+        recipients (or with signed, if given). With a signing service, the
+        callback runs once every signature requested before is ready, so
+        that messages are still sent in order.'''
+        if self.signing is None:
+            callback(signed or self.authenticate(message, to_client, recipients))
+            return
+        if signed is None and not self.signs(message):
+            # (MACs are cheap enough to compute right away)
+            signed = self.authenticate(message, to_client, recipients)
+        if signed is not None:
+            future = self.signing.ready(signed)
         else:
-            # Create the opening queue and add the message to it.
-            self._opening_queues[(addr, port)] = [signed]
+            future = self.sign_async(message)
+        future.add_done_callback(
+            lambda future: future.cancelled() or callback(future.result()))
 
-            # Try to open the connection.
-            try:
-                _, writer = await asyncio.open_connection(addr, port)
-                self._writers[(addr, port)].append(writer)
-                self.config.log('Opened connection with %s:%d' % (addr, port))
+    def _broadcast(self, recipients: typing.List[int],
+                   envelope: Envelope) -> None:
+        frames = {}  # type: typing.Dict[int, bytes]
+        for i in recipients:
+            codec = self._send_codec((False, i))
+            if codec not in frames:
+                frames[codec] = self._frame(envelope, codec)
+            self.connections.send((False, i), frames[codec])
+
+    def _send(self, peer: NodeKey, envelope: Envelope) -> None:
+        self.connections.send(peer, self._frame(envelope,
+                                                self._send_codec(peer)))
+
+    def _send_codec(self, peer: NodeKey) -> int:
+        '''Returns the codec to compress frames to a node with.'''
+        if self._codec != NONE and self._codec in self._peer_codecs.get(peer, b''):
+            return self._codec
+        return NONE
+
+    def _frame(self, envelope: Envelope, codec: int = NONE) -> bytes:
+        '''Encodes a signed or authenticated message as a frame, compressed
+        with codec if it is large enough and compression makes it smaller.'''
+        body = envelope.encode()
+        if codec == NONE or len(body) < self.config.compression_threshold:
+            return build_frame(body)
+        start = time.perf_counter()
+        compressed = compress(codec, body)
+        self.compression_stats.compressed(
+            envelope.message.__class__.__name__, len(body), len(compressed),
+            start)
+        if len(compressed) >= len(body):
+            return build_frame(body)
+        return build_frame(compressed, codec)
+
+    def _address(self, peer: NodeKey) -> typing.Tuple[str, int]:
+        is_client, node_id = peer
+        return (self._clients if is_client else self._servers).get(node_id)
 
-                # Send queued messages to the node if the connection was successful.
-                if self._opening_queues[(addr, port)] is not None:
-                    for m in self._opening_queues[(addr, port)]:
-                        m_raw = pickle.dumps(m)
-                        # send message size
-                        writer.write(struct.pack('I', len(m_raw)))
-                        writer.write(m_raw)
-                    self._opening_queues[(addr, port)] = None
+    async def _connect(self, peer: NodeKey):
+        '''Opens a connection to a node, introduces ourselves with a Hello,
+        and starts receiving from it. Returns the connection's writer.'''
+        address = self._address(peer)
+        if address is None:
+            raise ConnectionRefusedError('no address for %s' % (peer,))
+        link = Link(peer)
+        await create_connection(self._loop, lambda: self._new_protocol(link),
+                                address)
 
-            except ConnectionError:
-                self.config.log('Failed to open connection with %s:%d' % (addr, port))
+        # (the writer isn't shared yet, so the Hello goes first)
+        self._send_hello(link)
+        return link.writer
 
-            # Erase the opening queue
-            self._opening_queues[(addr, port)] = None
+    def _send_hello(self, link: Link) -> None:
+        '''Introduces ourselves to the node at the other end of link.'''
+        self._hello_timestamp = max(self._hello_timestamp + 1,
+                                    int(time.time() * 1000000))
+        is_client, node_id = link.peer
+        hello = Hello(self._node_id, self._is_client, node_id, is_client,
+                      self._hello_timestamp, SUPPORTED)
+        link.writer.transport.write(
+            self._frame(self.authenticate(hello, is_client, [node_id])))
+
+    def is_server_up(self, server_id: int) -> bool:
+        return self.connections.is_up((False, server_id))
+
+    def send_queue_stats(self) -> typing.Dict[NodeKey, dict]:
+        '''Returns the health and send queue statistics of each node this
+        node has sent messages to (see ConnectionManager.stats).'''
+        return self.connections.stats()
+
+    def compression_summary(self) -> typing.Dict[str, dict]:
+        '''Returns the compression ratio and time of each message type (see
+        CompressionStats.summary).'''
+        return self.compression_stats.summary()
+
+    def _new_protocol(self, link: Link) -> asyncio.BaseProtocol:
+        '''Returns the protocol that receives frames over a new connection:
+        FrameProtocol or a stream reader, depending on config.transport.'''
+        if self.config.transport == 'protocol':
+            link.writer = FrameProtocol(FRAME_HEADER, self._payload_size,
+                                        functools.partial(self._receive, link))
+            return link.writer
+        assert self.config.transport == 'stream'
+
+        def connected(reader, writer):
+            link.writer = writer
+            return self._handle_connection(reader, writer, link)
+        return asyncio.StreamReaderProtocol(asyncio.StreamReader(), connected)
 
     async def _handle_connection(self, reader: asyncio.StreamReader,
-                                 writer: asyncio.StreamWriter) -> None:
+                                 writer: asyncio.StreamWriter,
+                                 link: Link = None) -> None:
+        if link is None:
+            link = Link()
+            link.writer = writer
+
         # Recv message and pass to callback
         while True:
             try:
-                msg_size_raw = await reader.readexactly(struct.calcsize('I'))
-                msg_size = struct.unpack('I', msg_size_raw)[0]
-                msg_raw = await reader.readexactly(msg_size)
-                signed = pickle.loads(msg_raw)
-            except asyncio.IncompleteReadError:
-                break
-            if not isinstance(signed, SignedMessage):
+                header = await reader.readexactly(FRAME_HEADER.size)
+                payload = await reader.readexactly(self._payload_size(header))
+            except (asyncio.IncompleteReadError, DecodeError):
                 break
-
-            # Verify signature / message validity and invoke callback
-            if not self.verify_and_deliver(signed):
+            if not self._receive(link, payload):
                 break
         writer.close()
+
+    def _payload_size(self, header: bytes) -> int:
+        return decode_frame_header(header, self.config.max_frame_size)
+
+    def _receive(self, link: Link, payload: bytes) -> bool:
+        '''Decodes, verifies and delivers a frame payload received over link.
+        Returns false if the connection should be closed.'''
+        if self.pipeline is not None:
+            # (FrameProtocol payloads are views into a buffer that is reused
+            # once this returns, and views can't be sent to other processes)
+            self.pipeline['decode'].offer((link, None), bytes(payload))
+            return True
+        try:
+            start = time.perf_counter()
+            encoding, codec = decode_frame_payload(
+                payload, SUPPORTED, self.config.max_frame_size)
+            view = EnvelopeView(encoding)
+            if codec != NONE:
+                self.compression_stats.decompressed(
+                    view.message_class.__name__, start)
+            keep_open = self._check_frame(link, view)
+            if keep_open is not None:
+                return keep_open
+
+            if self.verification is not None and link.greeted:
+                self.verification.submit(
+                    link.peer, encoding,
+                    functools.partial(self._on_verified, link, view))
+                return True
+
+            # Check the sender and authenticator before decoding the rest
+            if not self.check_envelope_view(view):
+                return False
+            signed = view.decode()
+        except DecodeError:
+            return False
+
+        if not link.greeted:
+            return self._on_hello(link, signed)
+        return self._deliver(link, view, signed)
+
+    def _check_frame(self, link: Link, view: EnvelopeView) -> bool:
+        '''Checks a received message before any signature work. Returns None
+        if it should go on to be verified, and otherwise whether to keep the
+        connection open after dropping it.'''
+        # Only the node at the other end may send over the connection,
+        # starting with a Hello
+        if (view.message_class is Hello) == link.greeted:
+            return False
+        if link.peer is not None \
+                and (view.from_client, view.sender_id) != link.peer:
+            return False
+
+        # Drop what we can without any signature work; only oversized
+        # frames close the connection
+        reason = self.admission.admit(
+            view, len(view.payload), not link.greeted, self.current_term(),
+            None if link.greeted else _remote_host(link))
+        if reason is not None:
+            return reason != TOO_LARGE
+        return None
+
+    def _deliver(self, link: Link, view: EnvelopeView,
+                 signed: Envelope) -> bool:
+        '''Verifies and delivers a message (see verify_and_deliver). Returns
+        false if it is invalid.'''
+        if not self.verify_and_deliver(signed):
+            return False
+        self.admission.delivered(view)
+        return True
+
+    def _on_verified(self, link: Link, view: EnvelopeView,
+                     signature_keys: typing.List[tuple]) -> None:
+        '''Delivers a message verified by a worker process (see
+        VerificationPool), closing the connection if it is invalid.'''
+        signed = self._verified_envelope(link, view, signature_keys)
+        if signed is not None and not self._deliver(link, view, signed):
+            link.writer.transport.close()
+
+    def _verified_envelope(self, link: Link, view: EnvelopeView,
+                           signature_keys: typing.List[tuple]) -> Envelope:
+        '''Adds the signature cache keys a message was verified with
+        elsewhere (see verification.verify_encoding) and decodes it. Returns
+        None, closing the connection, if it is invalid.'''
+        if signature_keys is not None:
+            for key in signature_keys:
+                self.config.signature_cache.add(key)
+            try:
+                return view.decode()
+            except DecodeError:
+                pass
+        link.writer.transport.close()
+        return None
+
+    def _create_pipeline(self) -> Pipeline:
+        '''Returns the decode, authenticate, protocol and reply stages of
+        handling messages, run where config.pipeline says.'''
+        placements = self.config.pipeline
+        if placements.get('protocol', 'loop') != 'loop':
+            raise ValueError('the protocol stage runs on the event loop')
+        capacity = self.config.pipeline_capacity
+        pipeline = Pipeline()
+
+        def close_link(context, exception) -> None:
+            context[0].writer.transport.close()
+
+        # Decompress and parse received frames, and check them against the
+        # connection and admission filter
+        pipeline.add(Stage(
+            'decode', self._loop, capacity,
+            functools.partial(_decode_payload,
+                              max_size=self.config.max_frame_size),
+            self._on_decoded, close_link,
+            create_executor(placements.get('decode', 'loop'))))
+
+        # Verify signatures and MACs, including nested ones, keeping the
+        # signature cache keys for the protocol stage
+        placement = placements.get('authenticate', 'loop')
+        num_workers = 1
+        if placement == 'process':
+            num_workers = max(1, self.config.verify_workers)
+            executor = verification.create_worker_pool(self.config,
+                                                       num_workers)
+            work = verification.verify_in_worker
+        else:
+            executor = create_executor(placement)
+            work = functools.partial(verification.verify_encoding,
+                                     verification.worker_config(self.config))
+        pipeline.add(Stage(
+            'authenticate', self._loop, capacity, work,
+            self._on_authenticated, close_link, executor, num_workers))
+
+        # Deliver messages to the listeners: for servers, the state machine
+        pipeline.add(Stage('protocol', self._loop, capacity,
+                           finish=self._on_checked))
+        pipeline.link('decode', 'authenticate', 'protocol')
+
+        # Sign messages to clients (those authenticated with MACs are sent
+        # right away); servers execute requests in a stage between protocol
+        # and reply (see AsyncIoServer)
+        placement = placements.get('reply', 'loop')
+        if placement == 'process':
+            executor = signing.create_worker_pool(self.config, 1)
+            work = signing.sign_in_worker
+        else:
+            executor = create_executor(placement)
+            work = functools.partial(self.config.crypto_backend.sign,
+                                     self.config.private_key)
+        pipeline.add(Stage('reply', self._loop, capacity, work,
+                           self._on_reply_signed, self._on_reply_failed,
+                           executor))
+        pipeline['protocol'].blocked_by.append(pipeline['reply'])
+        return pipeline
+
+    def _on_decoded(self, context: tuple,
+                    decoded: typing.Tuple[bytes, int, float]) -> tuple:
+        link = context[0]
+        if link.writer.transport.is_closing():
+            return None
+        encoding, codec, seconds = decoded
+        try:
+            view = EnvelopeView(encoding)
+            if codec != NONE:
+                self.compression_stats.decompressed(
+                    view.message_class.__name__, time.perf_counter() - seconds)
+            keep_open = self._check_frame(link, view)
+            if keep_open is None and link.greeted:
+                return (link, view), encoding
+
+            # (Hellos are handled here, so that the frames after one are
+            # checked against it)
+            if keep_open is None:
+                keep_open = self._on_hello(link, view.decode())
+        except DecodeError:
+            keep_open = False
+        if not keep_open:
+            link.writer.transport.close()
+        return None
+
+    def _on_authenticated(self, context: tuple,
+                          signature_keys: typing.List[tuple]) -> tuple:
+        link, view = context
+        if link.writer.transport.is_closing():
+            return None
+        signed = self._verified_envelope(link, view, signature_keys)
+        if signed is None:
+            return None
+        return context, signed
+
+    def _on_checked(self, context: tuple, signed: Envelope) -> None:
+        link, view = context
+        if not link.writer.transport.is_closing() \
+                and not self._deliver(link, view, signed):
+            link.writer.transport.close()
+
+    def _on_reply_signed(self, context: tuple, signature: bytes) -> None:
+        client_id, message = context
+        self.num_signed += 1
+        self._send((True, client_id),
+                   SignedMessage.with_signature(message, signature))
+
+    def _on_reply_failed(self, context: tuple, exception: Exception) -> None:
+        self.config.log('Failed to sign %s: %r' % (
+            context[1].__class__.__name__, exception))
+
+    def _on_hello(self, link: Link, signed: Envelope) -> bool:
+        if not signed.verify(self.config):
+            return False
+        hello = signed.message
+        if hello.recipient != self._node_id or hello.to_client != self._is_client:
+            return False
+        peer = (hello.from_client, hello.sender_id)
+        if hello.timestamp <= self._peer_hello_timestamps.get(peer, -1):
+            return False  # replayed
+        self._peer_hello_timestamps[peer] = hello.timestamp
+        self._peer_codecs[peer] = hello.codecs
+        link.greeted = True
+        if link.peer is None:
+            # (the other end opened the connection)
+            link.peer = peer
+            self._send_hello(link)
+            self.connections.queue(peer).attach(link.writer)
+        return True
+
+
+def _remote_host(link: Link) -> str:
+    '''Returns the host at the other end of a TCP connection, or None for
+    other transports.'''
+    transport = getattr(link.writer, 'transport', None)
+    peername = None
+    if transport is not None and hasattr(transport, 'get_extra_info'):
+        peername = transport.get_extra_info('peername')
+    if isinstance(peername, tuple):
+        return peername[0]
+    return None
+
+
+def _decode_payload(payload: bytes,
+                    max_size: int) -> typing.Tuple[bytes, int, float]:
+    '''Decompresses a frame payload (see decode_frame_payload), also
+    returning the seconds it took. (Module level so that it can run in a
+    worker process.)'''
+    start = time.perf_counter()
+    encoding, codec = decode_frame_payload(payload, SUPPORTED, max_size)
+    return encoding, codec, time.perf_counter() - start
@@ -4,5 +4,12 @@ from ..messages import Message, SignedMessage
 class MessengerListener(object):
     def on_message(self, msg: Message, signed: SignedMessage) -> None:
         '''Called when a message is received.
-        The signature is verified before this function is called.'''
+        The signature is verified before this function is called.
+        Messages that are not transferable may be wrapped in an
+        AuthenticatedMessage instead of a SignedMessage.'''
         raise NotImplementedError
+
+    def current_term(self) -> int:
+        '''Returns the listener's current term, or None if it has none.
+        Messages from older terms may be dropped before on_message.'''
+        return None
@@ -1,6 +1,6 @@
-from ..config import BaseConfig
+from ..config import BaseConfig, ServerConfig
 from ..messages import Message, ServerMessage, SignedMessage
-from .messenger import Messenger
+from .messenger import Envelope, Messenger
 
 
 class SentMessage(object):
@@ -10,7 +10,7 @@ class SentMessage(object):
         TO_ALL_SERVERS = 2
 
     def __init__(self, send_type: int, recipient: int,
-                 message: Message, signed: SignedMessage) -> None:
+                 message: Message, signed: Envelope) -> None:
         self.send_type = send_type
         self.recipient = recipient
         self.message = message
@@ -33,17 +33,22 @@ class MemoryQueueMessenger(Messenger):
         self.sent = self.sent[1:]
         return rval
 
-    def send_server_message(self, server_id: int, message: ServerMessage) -> None:
+    def send_server_message(self, server_id: int, message: ServerMessage,
+                            signed: SignedMessage = None) -> None:
         self.sent.append(SentMessage(
-            SentMessage.Type.TO_SERVER, server_id, message, self._sign(message)))
+            SentMessage.Type.TO_SERVER, server_id, message,
+            signed or self.authenticate(message, False, [server_id])))
 
     def send_client_message(self, client_id: int, message: Message) -> None:
         self.sent.append(SentMessage(
-            SentMessage.Type.TO_CLIENT, client_id, message, self._sign(message)))
-
-    def broadcast_server_message(self, message) -> None:
+            SentMessage.Type.TO_CLIENT, client_id, message,
+            self.authenticate(message, True, [client_id])))
+
+    def broadcast_server_message(self, message, signed: SignedMessage = None) -> None:
+        self.num_broadcasts += 1
+        recipients = [i for i in range(self.config.num_servers)
+                      if not isinstance(self.config, ServerConfig)
+                      or i != self.config.server_id]
         self.sent.append(SentMessage(
-            SentMessage.Type.TO_ALL_SERVERS, None, message, self._sign(message)))
-
-    def _sign(self, message: Message) -> SignedMessage:
-        return SignedMessage(message, self.config.private_key)
+            SentMessage.Type.TO_ALL_SERVERS, None, message,
+            signed or self.authenticate(message, False, recipients)))
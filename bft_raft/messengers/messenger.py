@@ -1,51 +1,139 @@
+import hmac
 import traceback
-from typing import List  # pylint:disable=W0611
+from concurrent.futures import Future
+from typing import List, Union  # pylint:disable=W0611
 
 from ..config import BaseConfig
-from ..messages import Message, ServerMessage, SignedMessage
+from ..messages import AuthenticatedMessage, Message, ServerMessage, SignedMessage
+from ..messages.base import compute_mac, verify_signature_keys
+from ..messages.frame import EnvelopeView
+from .admission import AdmissionFilter
 from .listener import MessengerListener
 
+Envelope = Union[SignedMessage, AuthenticatedMessage]
+
 
 class Messenger(object):
     '''Manages sending and receiving messages to/from clients and other replicas.
 
-    When a message is received, the validity of its signature is checked
-    and then on_message is called on all attached listeners.'''
+    Messages are signed, or, if config.session_keys is set and the message is
+    not transferable, authenticated with MACs. When a message is received, it
+    goes through the admission filter, its signature or MAC is checked and
+    then on_message is called on all attached listeners.'''
 
     def __init__(self, config: BaseConfig) -> None:
         self.listeners = []  # type: List[MessengerListener]
         self.config = config
 
+        # Number of messages signed, number of messages authenticated with
+        # MACs, and number of broadcasts sent
+        self.num_signed = 0
+        self.num_authenticated = 0
+        self.num_broadcasts = 0
+
+        # Cheap checks on received frames before they are verified
+        self.admission = AdmissionFilter(config)
+
     def add_listener(self, listener: MessengerListener):
         '''Add a new MessengerListener to the list of subscribers.'''
         self.listeners.append(listener)
 
-    def send_server_message(self, server_id: int, message: ServerMessage) -> None:
-        '''Signs a message and sends it to a server.'''
+    def send_server_message(self, server_id: int, message: ServerMessage,
+                            signed: SignedMessage = None) -> None:
+        '''Signs a message and sends it to a server. If signed is given, it
+        is sent instead of signing message again.'''
         raise NotImplementedError
 
     def send_client_message(self, client_id: int, message: Message) -> None:
         '''Signs a message and sends it to a client.'''
         raise NotImplementedError
 
-    def broadcast_server_message(self, message) -> None:
-        '''Signs a message and sends it to all other servers.'''
+    def broadcast_server_message(self, message, signed: SignedMessage = None) -> None:
+        '''Signs a message and sends it to all other servers. If signed is
+        given, it is sent instead of signing message again.'''
         raise NotImplementedError
 
-    def verify_and_deliver(self, signed: SignedMessage) -> bool:
-        '''Verifies the validity of a signed message and then invokes on_message
-        on all attached listeners. Returns true on success, false, on failure.'''
+    def is_server_up(self, server_id: int) -> bool:
+        '''Returns false if a server is known to be unreachable, so that
+        messages to it can be skipped. By default, servers are assumed up.'''
+        return True
+
+    def current_term(self) -> int:
+        '''Returns the latest term of the attached listeners, or None.'''
+        terms = [t for t in (l.current_term() for l in self.listeners)
+                 if t is not None]
+        return max(terms) if terms else None
+
+    def sign(self, message: Message) -> SignedMessage:
+        '''Signs a message with this node's private key.'''
+        self.num_signed += 1
+        return SignedMessage(message, self.config.private_key,
+                             self.config.crypto_backend)
+
+    def sign_async(self, message: Message) -> Future:
+        '''Returns a future for message signed with this node's private key.
+        Callbacks added to the futures run in the order the signatures were
+        requested, and before messages sent after the request go out. By
+        default, messages are signed right away.'''
+        future = Future()  # type: Future
+        future.set_result(self.sign(message))
+        return future
+
+    def signs(self, message: Message) -> bool:
+        '''Whether authenticate signs message rather than computing MACs.'''
+        return self.config.session_keys is None or message.transferable
 
-        # Verify signature
-        if signed.verify(self.config) is None:
+    def authenticate(self, message: Message, to_client: bool,
+                     recipients: List[int]) -> Envelope:
+        '''Returns message authenticated for the given servers (or client, if
+        to_client is set): with MACs if possible, otherwise with a signature.'''
+        if self.signs(message):
+            return self.sign(message)
+        self.num_authenticated += 1
+        return AuthenticatedMessage(message, to_client, recipients,
+                                    self.config.session_keys)
+
+    def check_envelope_view(self, view: EnvelopeView) -> bool:
+        '''Checks the sender and the MAC or signature of a received message
+        before it is decoded. Signatures over digests other than the hash of
+        the message (see Message.signing_digest) are left to
+        verify_and_deliver. Returns false if the message should be dropped.'''
+        key = (view.from_client, view.sender_id)
+        if view.envelope_class is AuthenticatedMessage:
+            if self.config.session_keys is None \
+                    or view.message_class.transferable:
+                return False
+            session_key = self.config.session_keys.get(key)
+            mac = view.macs.get(self.config.node_id)
+            if session_key is None or mac is None:
+                return False
+            return hmac.compare_digest(
+                compute_mac(session_key, view.message_digest()), mac)
+
+        if view.message_class.signing_digest is not Message.signing_digest:
+            return True
+        # (a valid signature is added to config.signature_cache, so it isn't
+        # checked again once the message is decoded)
+        return verify_signature_keys(
+            [key + (view.message_digest(), view.signature)], self.config)
+
+    def verify_and_deliver(self, envelope: Envelope) -> bool:
+        '''Verifies the validity of a signed or authenticated message and then
+        invokes on_message on all attached listeners. Returns true on success,
+        false, on failure.'''
+
+        # Verify signature or MAC, depending on how the message was sent
+        if not isinstance(envelope, (SignedMessage, AuthenticatedMessage)):
+            return False
+        if not envelope.verify(self.config):
             return False
-        msg = signed.message
+        msg = envelope.message
         self.config.log('Received %s from %d' % (msg.__class__.__name__, msg.sender_id))
 
         # dispatch to listeners
         for l in self.listeners:
             try:
-                l.on_message(msg, signed)
+                l.on_message(msg, envelope)
             except Exception as e:  # pylint:disable=W0703
                 if isinstance(e, KeyboardInterrupt):
                     raise e
@@ -0,0 +1,109 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..config import BaseConfig
+from ..messages import Message, SignedMessage
+
+
+class SigningService(object):
+    '''Signs messages in worker processes, so that the event loop can keep
+    handling messages while signatures are computed.
+
+    sign returns an asyncio future for the signed message. Futures are
+    resolved in the order they were requested, whatever order the workers
+    finish in, and so are their callbacks; ready queues a value that is
+    already available behind the pending signatures. Sends made from the
+    callbacks therefore go out in the order they were requested.'''
+
+    def __init__(self, config: BaseConfig, loop: asyncio.AbstractEventLoop,
+                 num_workers: int) -> None:
+        self._loop = loop
+        self._executor = create_worker_pool(config, num_workers)
+
+        # (future of the worker's result or None, message, future returned to
+        # the caller) triples, in the order they were requested
+        self._pending = deque()  # type: deque
+
+        # Worker futures not done yet
+        self._work = set()  # type: set
+
+    @property
+    def depth(self) -> int:
+        '''Number of futures not resolved yet.'''
+        return len(self._pending)
+
+    def sign(self, message: Message) -> asyncio.Future:
+        '''Returns a future for message signed with this node's key.'''
+        work = self._executor.submit(sign_in_worker, message.signing_digest())
+        self._work.add(work)
+        work.add_done_callback(self._work.discard)
+        signature = asyncio.wrap_future(work, loop=self._loop)
+        signature.add_done_callback(lambda _: self._complete())
+        return self._queue(signature, message)
+
+    def ready(self, value) -> asyncio.Future:
+        '''Returns a future for value, resolved once the futures requested
+        before it are.'''
+        future = self._queue(None, value)
+        self._complete()
+        return future
+
+    def close(self) -> None:
+        '''Stops the workers. Pending futures are cancelled.'''
+        for signature, _, future in self._pending:
+            if signature is not None:
+                signature.cancel()
+            future.cancel()
+        self._pending.clear()
+        # (see VerificationPool.close)
+        for work in list(self._work):
+            work.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _queue(self, signature: asyncio.Future, value) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._pending.append((signature, value, future))
+        return future
+
+    def _complete(self) -> None:
+        while self._pending:
+            signature, value, future = self._pending[0]
+            if signature is not None and not signature.done():
+                break
+            self._pending.popleft()
+            if future.cancelled():
+                continue
+            if signature is None:
+                future.set_result(value)
+            elif signature.cancelled():
+                future.cancel()
+            elif signature.exception() is not None:
+                future.set_exception(signature.exception())
+            else:
+                future.set_result(SignedMessage.with_signature(
+                    value, signature.result()))
+
+
+# Crypto backend and private key of the worker process
+_backend = None
+_private_key = None
+
+
+def create_worker_pool(config: BaseConfig,
+                       num_workers: int) -> ProcessPoolExecutor:
+    '''Returns worker processes that can run sign_in_worker.'''
+    return ProcessPoolExecutor(
+        num_workers, initializer=_init_worker,
+        initargs=(config.crypto_backend, config.private_key))
+
+
+def _init_worker(backend, private_key) -> None:
+    global _backend, _private_key  # pylint:disable=W0603
+    _backend = backend
+    _private_key = private_key
+
+
+def sign_in_worker(digest: bytes) -> bytes:
+    '''Signs a digest with the key of the worker process.'''
+    return _backend.sign(_private_key, digest)
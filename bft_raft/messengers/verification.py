@@ -0,0 +1,148 @@
+import asyncio
+import copy
+import typing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..config import BaseConfig
+from ..messages import AuthenticatedMessage, SignedMessage
+from ..messages.encoding import DecodeError, decode
+from ..util.signature_cache import SignatureCache
+
+
+class VerificationPool(object):
+    '''Verifies received envelopes in worker processes, so that signature
+    checks aren't limited to the event loop's core.
+
+    A worker decodes the envelope's encoding and verifies it completely,
+    including nested signatures, with its own copy of the config. It returns
+    the signature cache keys of every signature the envelope relies on, which
+    the caller adds to config.signature_cache before decoding and verifying
+    the envelope again on the event loop, where no signature then needs
+    checking.
+
+    Results are passed to the callbacks in the order the envelopes were
+    submitted for each sender, whatever order the workers finish in.'''
+
+    def __init__(self, config: BaseConfig, loop: asyncio.AbstractEventLoop,
+                 num_workers: int) -> None:
+        self._loop = loop
+        self._executor = create_worker_pool(config, num_workers)
+
+        # Map from sender to the (future, callback) pairs of its envelopes,
+        # in the order they were submitted
+        self._pending = {}  # type: typing.Dict[typing.Any, deque]
+
+        # Worker futures not done yet
+        self._work = set()  # type: set
+
+    def submit(self, sender, encoding: bytes,
+               callback: typing.Callable[[typing.List[tuple]], None]) -> None:
+        '''Verifies an envelope encoding from sender, then calls callback
+        with the signature cache keys it relies on, or None if it is
+        invalid.'''
+        work = self._executor.submit(verify_in_worker, encoding)
+        self._work.add(work)
+        work.add_done_callback(self._work.discard)
+        future = asyncio.wrap_future(work, loop=self._loop)
+        queue = self._pending.get(sender)
+        if queue is None:
+            queue = self._pending[sender] = deque()
+        queue.append((future, callback))
+        future.add_done_callback(lambda _: self._complete(sender))
+
+    @property
+    def depth(self) -> int:
+        '''Number of envelopes submitted but not yet passed to callbacks.'''
+        return sum(len(queue) for queue in self._pending.values())
+
+    def close(self) -> None:
+        '''Stops the workers, dropping envelopes that haven't been
+        verified.'''
+        for queue in self._pending.values():
+            for future, _ in queue:
+                future.cancel()
+        self._pending.clear()
+        # Drop the work not started yet and wait for the rest: exiting
+        # while workers are still running can hang the interpreter
+        for work in list(self._work):
+            work.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _complete(self, sender) -> None:
+        queue = self._pending.get(sender)
+        while queue and queue[0][0].done():
+            future, callback = queue.popleft()
+            if future.cancelled() or future.exception() is not None:
+                callback(None)
+            else:
+                callback(future.result())
+        if queue is not None and not queue:
+            del self._pending[sender]
+
+
+class _RecordingCache(SignatureCache):
+    '''Signature cache that also records the keys looked up or added since
+    recorded was last reset.'''
+
+    def __init__(self, capacity: int) -> None:
+        super(_RecordingCache, self).__init__(capacity)
+        self.recorded = []  # type: typing.List[tuple]
+
+    def contains(self, key) -> bool:
+        if super(_RecordingCache, self).contains(key):
+            self.recorded.append(key)
+            return True
+        return False
+
+    def add(self, key) -> None:
+        super(_RecordingCache, self).add(key)
+        self.recorded.append(key)
+
+
+# Config used by the worker process
+_config = None  # type: BaseConfig
+
+
+def create_worker_pool(config: BaseConfig,
+                       num_workers: int) -> ProcessPoolExecutor:
+    '''Returns worker processes that can run verify_in_worker.'''
+    return ProcessPoolExecutor(num_workers, initializer=_init_worker,
+                               initargs=(worker_config(config),))
+
+
+def worker_config(config: BaseConfig) -> BaseConfig:
+    '''Returns a copy of config for verify_encoding, with its own signature
+    cache.'''
+    copied = copy.copy(config)
+    copied.signature_cache = _RecordingCache(
+        config.signature_cache.capacity)
+    copied.verify_executor = None
+    copied.enable_logging = False
+    return copied
+
+
+def _init_worker(config: BaseConfig) -> None:
+    global _config  # pylint:disable=W0603
+    _config = config
+
+
+def verify_in_worker(encoding: bytes) -> typing.List[tuple]:
+    '''Runs verify_encoding in a worker process.'''
+    return verify_encoding(_config, encoding)
+
+
+def verify_encoding(config: BaseConfig,
+                    encoding: bytes) -> typing.List[tuple]:
+    '''Decodes and verifies an envelope encoding with a config from
+    worker_config. Returns the signature cache keys the envelope relies on,
+    or None if it is invalid.'''
+    config.signature_cache.recorded = []
+    try:
+        envelope = decode(encoding)
+    except DecodeError:
+        return None
+    if not isinstance(envelope, (SignedMessage, AuthenticatedMessage)) \
+            or not envelope.verify(config):
+        return None
+    return config.signature_cache.recorded
@@ -14,7 +14,7 @@ class Candidate(State):
         # Add a vote from ourself
         self.votes_for_term = votes_for_term
         my_vote = VoteMessage(self.config.server_id, self.term, self.latest_a_cert)
-        signed_my_vote = SignedMessage(my_vote, self.config.private_key)
+        signed_my_vote = self.server.messenger.sign(my_vote)
         self.votes_for_term[self.config.server_id] = signed_my_vote
 
         # Should always transition here before having a quorum of votes
@@ -1,6 +1,9 @@
 import time
+from typing import List, Set, Tuple  # pylint:disable=W0611
+
 from ..messages import (ACert, AppendEntriesRequest, AppendEntriesSuccess,
-                        SignedMessage, ClientViewChangeRequest)
+                        DigestLogEntry, FetchedRequests, LogEntry,
+                        RequestFetch, SignedMessage, ClientViewChangeRequest)
 from .normal_operation_base import NormalOperationBase
 from .state import State
 
@@ -16,6 +19,13 @@ class Follower(NormalOperationBase):
         self.server.timeout_manager.set_timeout(
             self.config.timeout, FollowerHeartbeatTimeout())
 
+        # AppendEntriesRequests with DigestLogEntries we don't have all the
+        # requests for, in the order they arrived, the time the first one
+        # started waiting, and the digests we have asked the leader for
+        self.waiting_requests = []  # type: List[Tuple[AppendEntriesRequest, SignedMessage]]
+        self.waiting_since = None  # type: float
+        self.fetching = set()  # type: Set[bytes]
+
     def on_append_entries_request(self, msg: AppendEntriesRequest,
                                   signed: SignedMessage[AppendEntriesRequest]) -> State:
 
@@ -27,27 +37,95 @@ class Follower(NormalOperationBase):
         if msg.term % self.config.num_servers != msg.sender_id:
             return self
 
-        # If no entries sent, this is a heartbeat
+        # If no entries sent, this is a heartbeat. (If requests we fetched
+        # are taking long, get the entries with their requests instead.)
         if not msg.entries:
             self.last_append_entries_time = time.time()
-            if len(self.log) < msg.first_slot:
+            if len(self.log) < msg.first_slot and (
+                    not self.waiting_requests or time.time() -
+                    self.waiting_since > self.config.timeout / 2):
+                self.waiting_requests = []
+                self.fetching = set()
                 self._request_log_resend(len(self.log))
             return self
 
+        # Entries may only carry the digests of their requests (see
+        # ServerConfig.digest_entries): fill in the requests clients sent us,
+        # and fetch the ones we missed from the leader
+        if self.waiting_requests or any(isinstance(entry, DigestLogEntry)
+                                        for entry in msg.entries):
+            if not self.waiting_requests:
+                self.waiting_since = time.time()
+            self.waiting_requests.append((msg, signed))
+            del self.waiting_requests[:-self.config.log_window]
+            self._fetch_requests(msg)
+            self._append_waiting_requests()
+            return self
+
+        self._append_entries(msg)
+        return self
+
+    def on_fetched_requests(self, msg: FetchedRequests,
+                            signed: SignedMessage[FetchedRequests]) -> State:
+        if msg.term != self.term \
+                or msg.term % self.config.num_servers != msg.sender_id:
+            return self
+        for request in msg.requests:
+            digest = request.hash()
+            if digest in self.fetching:
+                self.fetching.discard(digest)
+                self.server.request_pool.add(request)
+        self._append_waiting_requests()
+        return self
+
+    def _fetch_requests(self, msg: AppendEntriesRequest) -> None:
+        '''Asks the leader for the requests of the DigestLogEntries in msg
+        that we don't have and haven't asked for yet.'''
+        missing = [entry.request_digest for entry in msg.entries
+                   if isinstance(entry, DigestLogEntry)
+                   and entry.request_digest not in self.fetching
+                   and self.server.request_pool.get(entry.request_digest) is None]
+        if missing:
+            self.fetching.update(missing)
+            req = RequestFetch(self.config.server_id, self.term, missing)
+            self.server.messenger.send_server_message(msg.sender_id, req)
+
+    def _append_waiting_requests(self) -> None:
+        '''Appends the entries of waiting AppendEntriesRequests, in order,
+        until one of them still misses a request.'''
+        while self.waiting_requests:
+            msg, _ = self.waiting_requests[0]
+            entries = []
+            for entry in msg.entries:
+                if isinstance(entry, DigestLogEntry):
+                    request = self.server.request_pool.get(entry.request_digest)
+                    if request is None:
+                        return
+                    entry = LogEntry(entry.term, entry.prev_incremental_hash,
+                                     request)
+                entries.append(entry)
+            del self.waiting_requests[0]
+            self._append_entries(AppendEntriesRequest(
+                msg.sender_id, msg.term, entries, msg.first_slot,
+                msg.leader_success))
+
+    def _append_entries(self, msg: AppendEntriesRequest) -> None:
+        '''Appends entries (with their requests) from the leader of the
+        current term to our log, if they agree with it.'''
         # Check that message's incremental hash matches ours
         first_entry = msg.entries[0]
         first_slot = msg.first_slot
         last_slot = msg.last_slot
         if len(self.log) < first_slot:
             self._request_log_resend(len(self.log))
-            return self
+            return
         if first_slot > 0 and first_entry.prev_incremental_hash != \
                 self.log[first_slot - 1].incremental_hash():
-            return self
+            return
 
         # At least one slot must be greater than leader commit idx
         if self.leader_commit_idx is not None and last_slot <= self.leader_commit_idx:
-            return self
+            return
 
         # If leader commit index is in range [first_slot, last_slot], check
         # that entries conform to the leader a cert
@@ -58,7 +136,7 @@ class Follower(NormalOperationBase):
             entry_idx = self.leader_commit_idx - first_slot
             if msg.entries[entry_idx].incremental_hash != \
                     self.leader_a_cert.incremental_hash:
-                return self
+                return
 
         # Don't re-append at slots where we already have an entry for the
         # current term
@@ -76,17 +154,19 @@ class Follower(NormalOperationBase):
         resp = AppendEntriesSuccess(
             self.config.server_id, self.term,
             last_slot, self.log[-1].incremental_hash())
-        self.server.messenger.broadcast_server_message(resp)
-        self._add_append_entries_success(
-            resp, SignedMessage(resp, self.config.private_key))
         self._add_append_entries_success(
             msg.leader_success.message, msg.leader_success)
 
+        def on_signed(signed_resp: SignedMessage[AppendEntriesSuccess]):
+            # (sign once, and send the same signature we keep)
+            self._send_certified(resp, signed_resp)
+            self._add_append_entries_success(resp, signed_resp)
+        self._when_signed(resp, on_signed)
+
         self.last_append_entries_time = time.time()
 
         if self.log:
             self.latest_slot_for_current_term = len(self.log) - 1
-        return self
 
     def on_client_view_change_request(self, msg: ClientViewChangeRequest,
                                       signed: SignedMessage[ClientViewChangeRequest]) -> 'State':
@@ -1,7 +1,10 @@
-from ..messages import (AppendEntriesRequest, AppendEntriesSuccess,
-                        ClientRequest, ElectedMessage,
-                        ElectionProofRequest, LogEntry, LogResend,
-                        SignedMessage)
+from typing import Dict, List  # pylint:disable=W0611
+
+from ..messages import (ACert, AppendEntriesRequest, AppendEntriesSuccess,
+                        CCert, CertMessage, ClientBusy, ClientRequest,
+                        ElectedMessage, ElectionProofRequest, FetchedRequests,
+                        LogEntry, LogResend, RequestFetch, SignedMessage)
+from ..util.batching import DRAINED, FULL, IDLE, WINDOW, BatchController
 from .normal_operation_base import NormalOperationBase
 from .state import State
 
@@ -17,29 +20,126 @@ class Leader(NormalOperationBase):
             assert commit_idx == len(self.log) - 1
         else:
             assert not self.log  # empty log
+
+        # Client requests not yet appended to the log, their size in bytes,
+        # the number of batches sent so far (which identifies the
+        # BatchTimeout of the current batch), the last slot sent and the
+        # first slot of this term
+        self.batch = []  # type: List[SignedMessage[ClientRequest]]
+        self.batch_bytes = 0
+        self.num_batches = 0
+        self.last_sent_slot = None  # type: int
+        self.first_slot = len(self.log)
+
+        # Why the batch was to be sent when it didn't fit in the log window,
+        # if it is waiting for the window to move (see _send_batch)
+        self.held = None  # type: str
+        self.batching = BatchController(self.config.max_batch_size)
+
+        # Map from digest to the request of each entry in our log, to answer
+        # RequestFetches, and the number of entries indexed so far
+        self.logged_requests = {}  # type: Dict[bytes, SignedMessage[ClientRequest]]
+        self.num_indexed = 0
         self._send_heartbeat()
 
     def on_client_request(self, msg: ClientRequest,
                           signed: SignedMessage[ClientRequest]):
+        # Turn requests away while the log window is full and enough of them
+        # are already waiting for it to move
+        if len(self.batch) >= self.config.max_queued_requests:
+            busy = ClientBusy(self.config.server_id, msg.sender_id, msg.seqno)
+            self.server.messenger.send_client_message(msg.sender_id, busy)
+            return self
 
-        # Add the entry to our own log
-        prev_ihash = b'0'
-        if self.log:  # log not empty
-            prev_ihash = self.log[-1].incremental_hash()
-        entry = LogEntry(self.term, prev_ihash, signed)
-        slot = len(self.log)
-        self.log.append(entry)
-        success = AppendEntriesSuccess(self.config.server_id, self.term, slot,
-                                       entry.incremental_hash())
-        signed_success = SignedMessage(success, self.config.private_key)
-        self._add_append_entries_success(success, signed_success)
-
-        # Build an AppendEntriesRequest to send to other servers
-        request = AppendEntriesRequest(self.config.server_id, self.term,
-                                       [entry], slot, signed_success)
-        self.server.messenger.broadcast_server_message(request)
+        # Send requests right away if nothing else is being committed;
+        # otherwise, wait for more until the batch is full, everything
+        # before it is committed (see _a_cert_formed) or its window is up
+        self.batch.append(signed)
+        self.batch_bytes += _request_size(signed)
+        if self.held is not None:
+            pass  # sent once an A-cert moves the log window
+        elif self._idle():
+            self._send_batch(IDLE)
+        elif len(self.batch) >= self.batching.size \
+                or self.batch_bytes >= self.config.max_batch_bytes:
+            self._send_batch(FULL)
+        elif len(self.batch) == 1:
+            self.server.timeout_manager.set_timeout(
+                self.config.batch_window, BatchTimeout(self.num_batches))
         return self
 
+    @property
+    def high_watermark(self) -> int:
+        # Entries from earlier terms don't count against the window, since
+        # they only get A-certs along with the ones we append after them
+        return max(self.low_watermark, self.first_slot - 1) \
+            + self.config.log_window
+
+    def _idle(self) -> bool:
+        '''Whether every batch we have sent has an A-cert.'''
+        return self.last_sent_slot is None or (
+            self.latest_a_cert is not None
+            and self.latest_a_cert.slot >= self.last_sent_slot)
+
+    def _a_cert_formed(self, a_cert: ACert) -> None:
+        if self.config.collector_commit:
+            self.server.messenger.broadcast_server_message(
+                CertMessage(self.config.server_id, self.term, a_cert))
+        super(Leader, self)._a_cert_formed(a_cert)
+        if self.batch and self.held is not None:
+            self._send_batch(self.held)
+        elif self.batch and self._idle():
+            self._send_batch(DRAINED)
+
+    def _c_cert_formed(self, c_cert: CCert) -> None:
+        if self.config.collector_commit:
+            self.server.messenger.broadcast_server_message(
+                CertMessage(self.config.server_id, self.term, c_cert))
+        super(Leader, self)._c_cert_formed(c_cert)
+
+    def _send_batch(self, reason: str) -> None:
+        '''Appends the batched requests to our log and sends them to the
+        other servers in one AppendEntriesRequest, as far as they fit below
+        the high watermark; the rest are held until an A-cert moves it.'''
+        count = min(len(self.batch), self.config.max_batch_size,
+                    self.high_watermark + 1 - len(self.log))
+        if count <= 0:
+            self.held = reason
+            return
+        requests = self.batch[:count]
+        self.batch = self.batch[count:]
+        self.batch_bytes = sum(_request_size(signed) for signed in self.batch)
+        self.held = reason if self.batch else None
+        self.batching.sent(count, reason)
+        self.num_batches += 1
+
+        # Add the entries to our own log
+        first_slot = len(self.log)
+        for signed in requests:
+            prev_ihash = b'0'
+            if self.log:  # log not empty
+                prev_ihash = self.log[-1].incremental_hash()
+            self.log.append(LogEntry(self.term, prev_ihash, signed))
+        entries = self.log[first_slot:]
+        sent_entries = entries
+        if self.config.digest_entries:
+            sent_entries = [entry.digest_entry() for entry in entries]
+
+        # Our success covers the last slot, and so the whole batch
+        slot = self.last_sent_slot = len(self.log) - 1
+        success = AppendEntriesSuccess(self.config.server_id, self.term, slot,
+                                       entries[-1].incremental_hash())
+
+        def on_signed(signed_success: SignedMessage[AppendEntriesSuccess]):
+            self._add_append_entries_success(success, signed_success)
+
+            # Build an AppendEntriesRequest to send to other servers
+            request = AppendEntriesRequest(self.config.server_id, self.term,
+                                           sent_entries, first_slot,
+                                           signed_success)
+            self.server.messenger.broadcast_server_message(request)
+        self._when_signed(success, on_signed)
+
     def on_election_proof_request(self, msg: ElectionProofRequest,
                                   signed: SignedMessage[ElectionProofRequest]) -> State:
         self.server.messenger.send_server_message(
@@ -54,16 +154,43 @@ class Leader(NormalOperationBase):
         success = AppendEntriesSuccess(
             self.config.server_id, self.term,
             len(self.log) - 1, self.log[-1].incremental_hash())
-        signed_success = SignedMessage(success, self.config.private_key)
+        signed_success = self.server.messenger.sign(success)
         old_request = AppendEntriesRequest(
             self.config.server_id, self.term,
             self.log[msg.log_len:], msg.log_len, signed_success)
         self.server.messenger.send_server_message(msg.sender_id, old_request)
         return self
 
+    def on_request_fetch(self, msg: RequestFetch,
+                         signed: SignedMessage[RequestFetch]) -> State:
+        if msg.term != self.term:
+            return self
+        # (our log has every request a follower can ask for, even once the
+        # pool has evicted it or if we only got it in an earlier term's log)
+        requests = [self._logged_request(digest)
+                    or self.server.request_pool.get(digest)
+                    for digest in msg.digests]
+        resp = FetchedRequests(self.config.server_id, self.term,
+                               [r for r in requests if r is not None])
+        self.server.messenger.send_server_message(msg.sender_id, resp)
+        return self
+
+    def _logged_request(self, digest: bytes) -> SignedMessage[ClientRequest]:
+        '''Returns the request of the entry in our log with the given digest,
+        or None. Indexes the entries added since the last call first.'''
+        while self.num_indexed < len(self.log):
+            request = self.log[self.num_indexed].request
+            self.logged_requests[request.hash()] = request
+            self.num_indexed += 1
+        return self.logged_requests.get(digest)
+
     def on_timeout(self, context: object) -> State:
         if isinstance(context, LeaderHeartbeatTimeout):
             return self.on_heartbeat_timeout()
+        elif isinstance(context, BatchTimeout):
+            if context.batch == self.num_batches and self.batch:
+                self._send_batch(WINDOW)
+            return self
         else:
             return super(Leader, self).on_timeout(context)
 
@@ -79,5 +206,15 @@ class Leader(NormalOperationBase):
         self.server.messenger.broadcast_server_message(msg)
 
 
+def _request_size(signed: SignedMessage[ClientRequest]) -> int:
+    '''Bytes a request counts for against max_batch_bytes.'''
+    return len(signed.message.operation) + len(signed.signature)
+
+
 class LeaderHeartbeatTimeout(object):
     pass
+
+
+class BatchTimeout(object):
+    def __init__(self, batch: int) -> None:
+        self.batch = batch  # Number of batches sent when it was set
@@ -1,7 +1,9 @@
 from collections import defaultdict
 
-from ..messages import (ACert, AppendEntriesSuccess, CCert, ClientResponse,
-                        CommitMessage, SignedMessage, ClientRequestFailure)
+from ..messages import (ACert, AppendEntriesSuccess, CCert, CertifiedMessage,
+                        CertMessage, CertRequest, ClientResponse,
+                        CommitMessage, SignedMessage, ClientRequestFailure,
+                        TentativeClientResponse)
 from .state import State
 
 
@@ -12,7 +14,7 @@ class NormalOperationBase(State):
         super(NormalOperationBase, self).__init__(
             copy_from.server, copy_from, term)
 
-        # Signed commit messages containing self.latest_a_cert.
+        # Signed commit messages referring to self.latest_a_cert.
         # Map from server id to commit message.
         # When we get 2f + 1 matching messages we can form a CCert and apply
         # log entries.
@@ -31,6 +33,27 @@ class NormalOperationBase(State):
         # Map from slot number -> server -> (commit message, signed commit message).
         self.future_commits = defaultdict(dict)  # type: dict
 
+        # Slots > self.latest_a_cert.slot whose A-cert we have asked another
+        # server for (see _request_a_cert).
+        self.requested_a_certs = set()  # type: set
+
+        # The three maps above only hold slots up to self.high_watermark.
+        # Map from server id -> slot beyond it whose A-cert we have asked
+        # that server for, having got its commit.
+        self.distant_cert_requests = {}  # type: dict
+
+    @property
+    def low_watermark(self) -> int:
+        '''Slot of our latest A-cert, or -1: messages about slots up to it
+        are no longer needed.'''
+        return -1 if self.latest_a_cert is None else self.latest_a_cert.slot
+
+    @property
+    def high_watermark(self) -> int:
+        '''Last slot we keep messages for, and the last one the leader
+        appends entries to, until the low watermark moves.'''
+        return self.low_watermark + self.config.log_window
+
     def on_append_entries_success(self, msg: AppendEntriesSuccess,
                                   signed: SignedMessage[AppendEntriesSuccess]) -> State:
         if msg.term != self.term:
@@ -51,20 +74,59 @@ class NormalOperationBase(State):
 
         # If A-cert's slot number is lower than that of our latest a-cert, ignore
         # the message
-        a_cert = msg.a_cert
         if self.latest_a_cert is not None and \
-                a_cert.slot < self.latest_a_cert.slot:
+                msg.slot < self.latest_a_cert.slot:
+            return self
+
+        # If we are more than a window behind the sender, ask it for its
+        # A-cert instead of keeping the message
+        if msg.slot > self.high_watermark:
+            self._request_distant_a_cert(msg)
             return self
 
-        # If the attached A-certificate's slot number is greater than that of our
+        # If the A-certificate's slot number is greater than that of our
         # latest a-cert, save it in self.future_commits
-        if self.latest_a_cert is None or a_cert.slot > self.latest_a_cert.slot:
-            self.future_commits[a_cert.slot][msg.sender_id] = (msg, signed)
+        if self.latest_a_cert is None or msg.slot > self.latest_a_cert.slot:
+            self.future_commits[msg.slot][msg.sender_id] = (msg, signed)
+            self._request_a_cert(msg)
             return self
 
-        # If we make it here the a_cert must have equal slot to our latest a-cert
-        assert self.latest_a_cert.slot == a_cert.slot
-        self._add_commit(msg, signed)
+        # If we make it here the A-cert must have equal slot to our latest
+        # a-cert; ignore commits for a different incremental hash
+        assert self.latest_a_cert.slot == msg.slot
+        if msg.incremental_hash == self.latest_a_cert.incremental_hash:
+            self._add_commit(msg, signed)
+        return self
+
+    def on_cert_request(self, msg: CertRequest,
+                        signed: SignedMessage[CertRequest]) -> State:
+        # Send our latest A-cert if it covers the requested slot
+        if msg.term != self.term or self.latest_a_cert is None \
+                or self.latest_a_cert.slot < msg.slot:
+            return self
+        resp = CertMessage(self.config.server_id, self.term, self.latest_a_cert)
+        self.server.messenger.send_server_message(msg.sender_id, resp)
+        return self
+
+    def on_cert_message(self, msg: CertMessage,
+                        signed: SignedMessage[CertMessage]) -> State:
+        # Adopt an A-cert, or apply a C-cert (see ServerConfig.collector_commit),
+        # from this term for a new slot, as long as our log agrees with it up
+        # to that slot
+        cert = msg.cert
+        if msg.term != self.term or cert.term != self.term:
+            return self
+        latest = self.latest_a_cert if isinstance(cert, ACert) \
+            else self.applied_c_cert
+        if latest is not None and cert.slot <= latest.slot:
+            return self
+        if cert.slot >= len(self.log) or \
+                self.log[cert.slot].incremental_hash() != cert.incremental_hash:
+            return self
+        if isinstance(cert, ACert):
+            self._a_cert_formed(cert)
+        else:
+            self._c_cert_formed(cert)
         return self
 
     def on_timeout(self, context: object) -> State:
@@ -72,21 +134,26 @@ class NormalOperationBase(State):
 
     def _add_append_entries_success(self, msg: AppendEntriesSuccess,
                                     signed: SignedMessage[AppendEntriesSuccess]) -> None:
-        '''Adds msg to append_entries_success if its slot number is greater
-        than the that of our latest a-cert. If possible, forms a A-cert and
-        updates the current commit index.'''
+        '''Adds msg to append_entries_success if its slot number is between
+        the low and high watermarks. If possible, forms a A-cert and updates
+        the current commit index.'''
         slot = msg.slot
-        if self.latest_a_cert is not None \
-                and slot <= self.latest_a_cert.slot:
+        if not self.low_watermark < slot <= self.high_watermark:
             return
 
+        # Keep one success per server for each slot, so that a faulty server
+        # can't fill the map with made up hashes
         inc_hash = msg.incremental_hash
         server_id = msg.sender_id
+        for other_hash, successes in self.append_entries_success[slot].items():
+            if other_hash != inc_hash and server_id in successes:
+                return
         self.append_entries_success[slot][inc_hash][server_id] = signed
 
         # Form an A-cert if possible
         num_successes = len(self.append_entries_success[slot][inc_hash])
-        if num_successes >= self.config.quorum_size \
+        if msg.term == self.term \
+                and num_successes >= self.config.quorum_size \
                 and self.config.server_id in self.append_entries_success[slot][inc_hash]:
             responses = list(
                 self.append_entries_success[slot][inc_hash].values())
@@ -98,7 +165,8 @@ class NormalOperationBase(State):
                     signed: SignedMessage[CommitMessage]) -> None:
         '''Adds a commit message with slot equal to that of our latest A-cert
         to self.commit_messages.'''
-        assert msg.a_cert.slot == self.latest_a_cert.slot
+        assert msg.slot == self.latest_a_cert.slot
+        assert msg.incremental_hash == self.latest_a_cert.incremental_hash
         self.commit_messages[msg.sender_id] = signed
 
         # Check if we now have enough commit messages to form a C-certificate.
@@ -110,14 +178,81 @@ class NormalOperationBase(State):
             assert c_cert.verify(self.config)
             if self.applied_c_cert is None or \
                     c_cert.slot > self.applied_c_cert.slot:
+                self._c_cert_formed(c_cert)
 
-                # Apply operations in log
-                start = 0
-                if self.applied_c_cert is not None:
-                    start = self.applied_c_cert.slot + 1
-                for i in range(start, c_cert.slot + 1):
-                    self._execute_request(i)
-                self.applied_c_cert = c_cert
+    def _c_cert_formed(self, c_cert: CCert) -> None:
+        '''Called with a C-cert for a slot beyond the last one we applied.
+        Executes the operations in the log up to its slot that haven't been
+        executed tentatively, and sends the final replies of those that
+        have.'''
+        self._check_tentative()
+        start = 0
+        if self.applied_c_cert is not None:
+            start = self.applied_c_cert.slot + 1
+        if self.tentative is not None:
+            for i in range(start, min(c_cert.slot, self.tentative[0]) + 1):
+                self._reply_committed(i)
+            start = max(start, self.tentative[0] + 1)
+            if c_cert.slot >= self.tentative[0]:
+                self.tentative = self.checkpoint = None  # all committed
+        for i in range(start, c_cert.slot + 1):
+            self._execute_request(i)
+        self.applied_c_cert = c_cert
+
+    def _execute_tentatively(self, a_cert: ACert) -> None:
+        '''Executes the operations in the log up to the slot of a new A-cert
+        and sends tentative replies, saving a checkpoint of the application
+        first if everything executed so far is committed.'''
+        self._check_tentative()
+        applied = -1 if self.applied_c_cert is None \
+            else self.applied_c_cert.slot
+        start = applied + 1
+        if self.tentative is not None:
+            start = self.tentative[0] + 1
+        if start > a_cert.slot:
+            return
+        if self.tentative is None:
+            self.server.checkpoint()
+            self.checkpoint = (applied, dict(self.latest_req_per_client))
+        for i in range(start, a_cert.slot + 1):
+            self._execute_request(i, True)
+        self.tentative = (a_cert.slot, a_cert.incremental_hash)
+
+    def _check_tentative(self) -> None:
+        '''Rolls back the operations executed tentatively if an election
+        has replaced their entries in our log, and executes again the ones
+        committed since the checkpoint.'''
+        if self.tentative is None:
+            return
+        slot, incremental_hash = self.tentative
+        if slot < len(self.log) \
+                and self.log[slot].incremental_hash() == incremental_hash:
+            return
+        self.server.rollback()
+        checkpoint_slot, latest_req_per_client = self.checkpoint
+        self.latest_req_per_client = dict(latest_req_per_client)
+        self.tentative = self.checkpoint = None
+        self.tentative_replies.clear()
+        if self.applied_c_cert is not None:
+            for i in range(checkpoint_slot + 1, self.applied_c_cert.slot + 1):
+                self._execute_request(i)
+
+    def _reply_committed(self, slot: int) -> None:
+        '''Called when a C-cert covers a slot executed tentatively. Sends the
+        client the final reply: the response if the request was executed
+        there (once it has been), or else the failure for a duplicate.'''
+        reply = self.tentative_replies.pop(slot, None)
+        if reply is None:
+            self._execute_request(slot)  # (a duplicate, so not executed)
+            return
+        result, _ = reply
+        if result is None:
+            reply[1] = True  # (see _execute_request)
+            return
+        entry = self.log[slot]
+        resp = ClientResponse(self.config.server_id, entry.client_id,
+                              entry.seqno, result)
+        self.server.messenger.send_client_message(entry.client_id, resp)
 
     def _a_cert_formed(self, a_cert: ACert) -> None:
         '''Called when we get enough AppendEntriesSuccess messages to form
@@ -125,46 +260,117 @@ class NormalOperationBase(State):
         assert self.latest_a_cert is None \
             or a_cert.slot > self.latest_a_cert.slot
         self.latest_a_cert = a_cert
+        if self.config.tentative_execution:
+            self._execute_tentatively(a_cert)
 
         # broadcast commit message
-        commit = CommitMessage(self.config.server_id, self.term, a_cert)
-        self.server.messenger.broadcast_server_message(commit)
+        commit = CommitMessage(self.config.server_id, self.term,
+                               a_cert.slot, a_cert.incremental_hash)
+
+        def on_signed(signed_commit: SignedMessage[CommitMessage]):
+            self._send_certified(commit, signed_commit)
+            if self.latest_a_cert is a_cert:
+                self._add_commit(commit, signed_commit)
 
         # find all commit messages that we have with this slot
         self.commit_messages = {}
-        self._add_commit(commit, SignedMessage(commit, self.config.private_key))
+        self._when_signed(commit, on_signed)
         assert self.config.server_id not in self.future_commits[a_cert.slot]
         for c, signed in self.future_commits[a_cert.slot].values():
-            assert c.a_cert.verify(self.config)
-            self._add_commit(c, signed)
+            if c.incremental_hash == a_cert.incremental_hash:
+                self._add_commit(c, signed)
 
-        # clean up self.future_commits
+        # clean up self.future_commits and self.requested_a_certs
         for slot in list(self.future_commits):
             if slot <= a_cert.slot:
                 del self.future_commits[slot]
+        self.requested_a_certs = {slot for slot in self.requested_a_certs
+                                  if slot > a_cert.slot}
+        self.distant_cert_requests = dict(
+            (server_id, slot) for server_id, slot
+            in self.distant_cert_requests.items() if slot > a_cert.slot)
 
         # Clean up self.append_entries_success
         for slot in list(self.append_entries_success):
             if slot <= a_cert.slot:
                 del self.append_entries_success[slot]
 
-    def _execute_request(self, slot: int):
+    def _send_certified(self, msg: CertifiedMessage,
+                        signed: SignedMessage[CertifiedMessage]) -> None:
+        '''Sends our AppendEntriesSuccess or commit message to every other
+        server, or if config.collector_commit is set, only to the leader,
+        which broadcasts the certificate once it has one.'''
+        if not self.config.collector_commit:
+            self.server.messenger.broadcast_server_message(msg, signed)
+            return
+        leader = self.term % self.config.num_servers
+        if leader != self.config.server_id:
+            self.server.messenger.send_server_message(leader, msg, signed)
+
+    def _request_a_cert(self, msg: CommitMessage) -> None:
+        '''Called when a commit arrives for a slot beyond our latest A-cert.
+        Once f + 1 servers have committed the slot, at least one correct server
+        has its A-cert, so we ask the sender of msg for it instead of waiting
+        for AppendEntriesSuccess messages we may never get.'''
+        slot = msg.slot
+        if slot in self.requested_a_certs \
+                or len(self.future_commits[slot]) < self.config.f + 1:
+            return
+        self.requested_a_certs.add(slot)
+        req = CertRequest(self.config.server_id, self.term, slot)
+        self.server.messenger.send_server_message(msg.sender_id, req)
+
+    def _request_distant_a_cert(self, msg: CommitMessage) -> None:
+        '''Called when a commit arrives for a slot beyond our high watermark,
+        so we have fallen behind. Asks the sender for its A-cert, at most once
+        per window it moves ahead, since we can't count such commits.'''
+        requested = self.distant_cert_requests.get(msg.sender_id)
+        if requested is not None \
+                and msg.slot < requested + self.config.log_window:
+            return
+        self.distant_cert_requests[msg.sender_id] = msg.slot
+        req = CertRequest(self.config.server_id, self.term, msg.slot)
+        self.server.messenger.send_server_message(msg.sender_id, req)
+
+    def _execute_request(self, slot: int, tentative: bool = False):
         entry = self.log[slot]
         client_id = entry.client_id
 
-        # Check that sequence number is > than the max used for this client
+        # Check that sequence number is > than the max used for this client.
+        # (Failures aren't sent for tentative executions: their result may
+        # be one that is rolled back. _reply_committed sends them once the
+        # slot is committed.)
         if client_id in self.latest_req_per_client \
                 and self.latest_req_per_client[client_id][0] >= entry.seqno:
-            resp = ClientRequestFailure(
-                self.config.server_id, client_id,
-                self.latest_req_per_client[client_id][0],
-                self.latest_req_per_client[client_id][1])
-        else:
-            result = self.server.application.handle_request(
-                entry.operation, entry.client_id)
-            resp = ClientResponse(self.config.server_id,  # type: ignore
-                                  client_id, entry.seqno, result)
-            self.latest_req_per_client[client_id] = (entry.seqno, result)
+            max_seqno, result = self.latest_req_per_client[client_id]
+            if result is None or tentative:
+                return  # (or still executing; its response is on its way)
+            resp = ClientRequestFailure(self.config.server_id, client_id,
+                                        max_seqno, result)
+            self.server.messenger.send_client_message(client_id, resp)
+            return
 
-        # Send response to client
-        self.server.messenger.send_client_message(client_id, resp)
+        # Execute the operation (maybe in another stage, see
+        # BaseServer.execute), then send the response to the client
+        latest_req_per_client = self.latest_req_per_client
+        latest_req_per_client[client_id] = (entry.seqno, None)
+        tentative_replies = self.tentative_replies
+        reply = None
+        if tentative:
+            reply = tentative_replies[slot] = [None, False]
+
+        def on_executed(result: bytes) -> None:
+            if latest_req_per_client.get(client_id) == (entry.seqno, None):
+                latest_req_per_client[client_id] = (entry.seqno, result)
+            response_class = ClientResponse
+            if tentative:
+                committed = reply[1]
+                if not committed and tentative_replies.get(slot) is not reply:
+                    return  # rolled back before it ran
+                reply[0] = result
+                if not committed:
+                    response_class = TentativeClientResponse
+            resp = response_class(self.config.server_id,  # type: ignore
+                                  client_id, entry.seqno, result)
+            self.server.messenger.send_client_message(client_id, resp)
+        self.server.execute(entry.operation, client_id, on_executed)
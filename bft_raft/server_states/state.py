@@ -1,13 +1,16 @@
 from collections import defaultdict
-from typing import Dict, List, Tuple, TypeVar  # pylint:disable=W0611
+from typing import (Callable, Dict, List, Tuple,  # pylint:disable=W0611
+                    TypeVar)
 
 from ..config import ServerConfig
 from ..messages import (ACert, AppendEntriesRequest,  # pylint:disable=W0611
                         AppendEntriesSuccess, CatchupRequest, CatchupResponse,
-                        CCert, ClientRequest, ClientViewChangeRequest,
-                        CommitMessage, ElectedMessage, ElectionProofRequest,
-                        LogEntry, LogResend, Message, SignedMessage,
-                        VoteMessage, VoteRequest)
+                        CCert, CertMessage, CertRequest, ClientRequest,
+                        ClientViewChangeRequest, CommitMessage,
+                        ElectedMessage, ElectionProofRequest,
+                        FetchedRequests, LogEntry, LogResend, Message,
+                        RequestFetch, SignedMessage, VoteMessage,
+                        VoteRequest)
 
 if False:  # pylint:disable=W0125
     # (just for type checking; if statement avoids circular import)
@@ -27,6 +30,19 @@ class State(object):
         # greatest sequence number executed by a client.
         self.latest_req_per_client = {}  # type: Dict[int, Tuple[int, bytes]]
 
+        # With tentative execution (see NormalOperationBase._a_cert_formed),
+        # (slot, incremental hash) of the last entry executed before a C-cert
+        # covered it, and (applied slot, latest_req_per_client) when the
+        # application's checkpoint was saved, or None if everything executed
+        # is committed.
+        self.tentative = None  # type: Tuple[int, bytes]
+        self.checkpoint = None  # type: Tuple[int, Dict[int, Tuple[int, bytes]]]
+
+        # Map from the slots executed tentatively that no C-cert covers yet
+        # to [result, or None while executing, whether a C-cert has covered
+        # it since], to send the final replies once they are committed.
+        self.tentative_replies = {}  # type: Dict[int, list]
+
         # Votes received by this server.
         # Map from term id to server id to signed vote message.
         self.votes = defaultdict(dict)  # type: Dict[int, Dict[int, SignedMessage[VoteMessage]]]
@@ -36,7 +52,10 @@ class State(object):
             self.term = copy_from.term
             self.latest_a_cert = copy_from.latest_a_cert
             self.applied_c_cert = copy_from.applied_c_cert
-            self.latest_req_per_client = self.latest_req_per_client
+            self.latest_req_per_client = copy_from.latest_req_per_client
+            self.tentative = copy_from.tentative
+            self.checkpoint = copy_from.checkpoint
+            self.tentative_replies = copy_from.tentative_replies
             self.votes = copy_from.votes
 
         if term is not None:
@@ -74,6 +93,14 @@ class State(object):
             return self.on_catchup_response(msg, signed)
         elif isinstance(msg, ClientViewChangeRequest):
             return self.on_client_view_change_request(msg, signed)
+        elif isinstance(msg, CertRequest):
+            return self.on_cert_request(msg, signed)
+        elif isinstance(msg, CertMessage):
+            return self.on_cert_message(msg, signed)
+        elif isinstance(msg, RequestFetch):
+            return self.on_request_fetch(msg, signed)
+        elif isinstance(msg, FetchedRequests):
+            return self.on_fetched_requests(msg, signed)
         else:
             assert False, 'unhandled message type %s' % msg.__class__.__name__
 
@@ -163,6 +190,22 @@ class State(object):
                                       signed: SignedMessage[ClientViewChangeRequest]) -> 'State':
         return self
 
+    def on_cert_request(self, msg: CertRequest,
+                        signed: SignedMessage[CertRequest]) -> 'State':
+        return self
+
+    def on_cert_message(self, msg: CertMessage,
+                        signed: SignedMessage[CertMessage]) -> 'State':
+        return self
+
+    def on_request_fetch(self, msg: RequestFetch,
+                         signed: SignedMessage[RequestFetch]) -> 'State':
+        return self
+
+    def on_fetched_requests(self, msg: FetchedRequests,
+                            signed: SignedMessage[FetchedRequests]) -> 'State':
+        return self
+
     def on_timeout(self, context: object) -> 'State':
         '''Returns resulting state.'''
         return self
@@ -181,14 +224,33 @@ class State(object):
             # become a voter
             return Voter(next_term, self.server, self)  # type: ignore
 
+    def _when_signed(self, message: Message,
+                     callback: Callable[[SignedMessage], None]) -> None:
+        '''Signs message (see Messenger.sign_async) and calls callback with
+        the result. If the signature isn't ready right away, the callback is
+        dropped unless this is still the server's state once it is.'''
+        future = self.server.messenger.sign_async(message)
+        if future.done():
+            callback(future.result())
+            return
+
+        def on_signed(future) -> None:
+            if not future.cancelled() and self.server.state is self:
+                callback(future.result())
+        future.add_done_callback(on_signed)
+
     def _request_election_proof(self, term) -> None:
         primary = term % self.config.num_servers
+        if not self.server.messenger.is_server_up(primary):
+            return  # (we'll ask again after the next timeout)
         leader_proof_req = ElectionProofRequest(
             self.config.server_id, term)
         self.server.messenger.send_server_message(primary, leader_proof_req)
 
     def _request_log_resend(self, most_recent_known_entry) -> None:
         primary = self.term % self.config.num_servers
+        if not self.server.messenger.is_server_up(primary):
+            return
         log_resend_req = LogResend(self.config.server_id, self.term, most_recent_known_entry)
         self.server.messenger.send_server_message(primary, log_resend_req)
 
@@ -1,11 +1,13 @@
 import asyncio
+import typing
 
 from ..application import Application
 from ..config import ServerConfig
 from ..messengers.asyncio import AsyncIoMessenger
 from ..timeout_managers.asyncio import AsyncIoTimeoutManager
 from ..util.asyncio_shutdown import shutdown
-from .base import BaseServer
+from ..util.pipeline import Pipeline, Stage, create_executor
+from .base import CHECKPOINT, ROLLBACK, ApplicationRunner, BaseServer
 
 
 class AsyncIoServer(BaseServer):
@@ -22,6 +24,53 @@ class AsyncIoServer(BaseServer):
         self.loop = loop
         self.asyncio_messenger = messenger
 
+        # With a message pipeline, requests are executed in a stage of their
+        # own, between the protocol and reply stages
+        if messenger.pipeline is not None:
+            self._add_execute_stage(messenger.pipeline)
+
+    def execute(self, operation: bytes, client_id: int,
+                callback: typing.Callable[[bytes], None]) -> None:
+        pipeline = self.asyncio_messenger.pipeline
+        if pipeline is None:
+            super(AsyncIoServer, self).execute(operation, client_id, callback)
+        else:
+            pipeline['execute'].add(callback, (operation, client_id))
+
+    def checkpoint(self) -> None:
+        pipeline = self.asyncio_messenger.pipeline
+        if pipeline is None:
+            super(AsyncIoServer, self).checkpoint()
+        else:
+            pipeline['execute'].add(_ignore, CHECKPOINT)
+
+    def rollback(self) -> None:
+        pipeline = self.asyncio_messenger.pipeline
+        if pipeline is None:
+            super(AsyncIoServer, self).rollback()
+        else:
+            pipeline['execute'].add(_ignore, ROLLBACK)
+
+    def _add_execute_stage(self, pipeline: Pipeline) -> None:
+        # (in a worker process, the application must be picklable, and its
+        # state lives in that process)
+        placement = self.config.pipeline.get('execute', 'loop')
+        if placement == 'process':
+            executor = create_executor(placement, 1, _init_worker,
+                                       (self.application,))
+            work = _execute_in_worker
+        else:
+            executor = create_executor(placement)
+            work = self.runner.run
+        stage = pipeline.add(Stage(
+            'execute', self.loop, self.config.pipeline_capacity, work,
+            lambda callback, result: callback(result),
+            lambda callback, exception: self.config.log(
+                'Failed to execute request: %r' % (exception,)),
+            executor))
+        pipeline['protocol'].blocked_by.append(stage)
+        pipeline.stages.move_to_end('reply')
+
     def run(self):
         try:
             self.messenger.start_server()
@@ -32,3 +81,21 @@ class AsyncIoServer(BaseServer):
             self.config.log('Shutting down')
             self.loop.run_until_complete(shutdown(self.loop))
             self.loop.close()
+
+
+# Runs requests on the application of the worker process executing them, if
+# any (see ApplicationRunner)
+_runner = None  # type: ApplicationRunner
+
+
+def _init_worker(application: Application) -> None:
+    global _runner  # pylint:disable=W0603
+    _runner = ApplicationRunner(application)
+
+
+def _execute_in_worker(request: tuple) -> bytes:
+    return _runner.run(request)
+
+
+def _ignore(result) -> None:
+    pass
@@ -1,11 +1,40 @@
+from typing import Callable, Tuple  # pylint:disable=W0611
+
 from ..application import Application
 from ..config import ServerConfig
-from ..messages import Message, SignedMessage
+from ..messages import ClientRequest, Message, SignedMessage
 from ..messengers.listener import MessengerListener
 from ..messengers.messenger import Messenger
 from ..server_states.state import State
 from ..timeout_managers.listener import TimeoutListener
 from ..timeout_managers.timeout_manager import TimeoutManager
+from ..util.request_pool import RequestPool
+
+
+# Requests to ApplicationRunner besides (operation, client id) pairs
+CHECKPOINT = ('checkpoint',)
+ROLLBACK = ('rollback',)
+
+
+class ApplicationRunner(object):
+    '''Runs requests on an application, wherever it lives: (operation,
+    client id) pairs, which return the operation's result, CHECKPOINT, which
+    saves a checkpoint of the application, and ROLLBACK, which restores the
+    saved one.'''
+
+    def __init__(self, application: Application) -> None:
+        self.application = application
+        self.checkpoint = None  # type: object
+
+    def run(self, request: tuple) -> bytes:
+        if request == CHECKPOINT:
+            self.checkpoint = self.application.checkpoint()
+        elif request == ROLLBACK:
+            self.application.rollback(self.checkpoint)
+        else:
+            operation, client_id = request
+            return self.application.handle_request(operation, client_id)
+        return None
 
 
 class BaseServer(MessengerListener, TimeoutListener):
@@ -13,15 +42,42 @@ class BaseServer(MessengerListener, TimeoutListener):
                  messenger: Messenger, timeout_manager: TimeoutManager) -> None:
         self.config = config
         self.application = application
+        self.runner = ApplicationRunner(application)
         self.messenger = messenger
         self.timeout_manager = timeout_manager
         messenger.add_listener(self)
         timeout_manager.add_listener(self)
+
+        # Requests received from clients, whatever our state, which log
+        # entries may refer to by digest
+        self.request_pool = RequestPool(config.request_pool_size)
         self.state = self.initial_state()
 
     def on_message(self, msg: Message, signed: SignedMessage) -> None:
+        if isinstance(msg, ClientRequest):
+            self.request_pool.add(signed)
         self.state = self.state.on_message(msg, signed)
 
+    def current_term(self) -> int:
+        return self.state.term
+
+    def execute(self, operation: bytes, client_id: int,
+                callback: Callable[[bytes], None]) -> None:
+        '''Runs a client's operation in the application and calls callback
+        with the result. Operations are executed in the order they are
+        passed here.'''
+        callback(self.runner.run((operation, client_id)))
+
+    def checkpoint(self) -> None:
+        '''Saves a checkpoint of the application once the operations passed
+        to execute before have run, replacing the last one.'''
+        self.runner.run(CHECKPOINT)
+
+    def rollback(self) -> None:
+        '''Rolls the application back to the last checkpoint once the
+        operations passed to execute before have run.'''
+        self.runner.run(ROLLBACK)
+
     def on_timeout(self, context: object) -> None:
         self.state = self.state.on_timeout(context)
 
@@ -0,0 +1,69 @@
+import typing
+
+from ...messages import ClientRequest, SignedMessage
+from ...servers.memory_queue import MemoryQueueServer, SentMessage
+from .echo_app import EchoApp
+
+
+class MemoryQueueCluster(object):
+    '''Runs a group of MemoryQueueServers in a single process by delivering the
+    messages they send to each other directly. Timeouts are never fired, so
+    runs are deterministic. Used by tests and benchmarks.'''
+
+    def __init__(self, configs: list, application_factory=EchoApp) -> None:
+        self.servers = [MemoryQueueServer(c, application_factory())
+                        for c in configs]
+
+        # Messages sent by servers to clients, as (client id, message) pairs
+        self.client_messages = []  # type: typing.List[tuple]
+
+        # Number of messages delivered to servers, by message type name
+        self.delivered = {}  # type: typing.Dict[str, int]
+
+        # Optional predicate taking (server, envelope); messages for which it
+        # returns true are dropped instead of being delivered to server
+        self.drop = None  # type: typing.Callable
+
+    def pump(self) -> int:
+        '''Delivers sent messages until no server has anything left to send.
+        Returns the number of messages delivered.'''
+        num_delivered = 0
+        progress = True
+        while progress:
+            progress = False
+            for sender in self.servers:
+                sent = sender.get_sent_message()
+                while sent is not None:
+                    progress = True
+                    num_delivered += self._route(sender, sent)
+                    sent = sender.get_sent_message()
+        return num_delivered
+
+    def submit(self, client_id: int, private_key, seqno: int,
+               operation: bytes) -> None:
+        '''Signs a client request and delivers it to every server, as
+        AsyncIoClient does.'''
+        req = ClientRequest(client_id, seqno, operation)
+        signed = SignedMessage(req, private_key,
+                               self.servers[0].config.crypto_backend)
+        for server in self.servers:
+            self._deliver(server, signed)
+
+    def _route(self, sender: MemoryQueueServer, sent: SentMessage) -> int:
+        if sent.send_type == SentMessage.Type.TO_CLIENT:
+            self.client_messages.append((sent.recipient, sent.message))
+            return 0
+        if sent.send_type == SentMessage.Type.TO_SERVER:
+            self._deliver(self.servers[sent.recipient], sent.signed)
+            return 1
+        recipients = [s for s in self.servers if s is not sender]
+        for server in recipients:
+            self._deliver(server, sent.signed)
+        return len(recipients)
+
+    def _deliver(self, server: MemoryQueueServer, signed: SignedMessage) -> None:
+        if self.drop is not None and self.drop(server, signed):
+            return
+        name = signed.message.__class__.__name__
+        self.delivered[name] = self.delivered.get(name, 0) + 1
+        server.messenger.verify_and_deliver(signed)
@@ -4,3 +4,9 @@ from ...application import Application
 class EchoApp(Application):
     def handle_request(self, operation: bytes, client_id: int) -> bytes:
         return operation
+
+    def checkpoint(self) -> object:
+        return None  # (no state)
+
+    def rollback(self, checkpoint: object) -> None:
+        pass
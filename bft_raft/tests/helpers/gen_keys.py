@@ -1,16 +1,39 @@
+import os
 from typing import Tuple
-from Crypto.PublicKey import RSA
 
+from ...crypto.backend import CryptoBackend
+from ...crypto.rsa import RSABackend
 
-def gen_keys(node_ids, bits=1024) -> Tuple[dict, dict]:
+
+def gen_keys(node_ids, bits=1024, backend: CryptoBackend = None) -> Tuple[dict, dict]:
     '''Generates maps from node_id -> public key and node_id -> private key
-    (key pairs are randomly generated).'''
+    (key pairs are randomly generated). Uses bits-bit RSA keys unless another
+    backend is given.'''
+    if backend is None:
+        backend = RSABackend(bits)
 
     pubkeys = {}
     privkeys = {}
     for i in node_ids:
-        key = RSA.generate(bits)
-        pubkey = key.publickey()
+        pubkey, privkey = backend.generate_keys()
         pubkeys[i] = pubkey
-        privkeys[i] = key
+        privkeys[i] = privkey
     return pubkeys, privkeys
+
+
+def gen_session_keys(num_servers: int, num_clients: int) -> Tuple[dict, dict]:
+    '''Generates a random session key for every pair of servers and every
+    (server, client) pair. Returns maps from server id and client id to the
+    config.session_keys map of that node.'''
+    server_keys = {i: {} for i in range(num_servers)}  # type: dict
+    client_keys = {i: {} for i in range(num_clients)}  # type: dict
+    for i in range(num_servers):
+        for j in range(i + 1, num_servers):
+            key = os.urandom(32)
+            server_keys[i][(False, j)] = key
+            server_keys[j][(False, i)] = key
+        for j in range(num_clients):
+            key = os.urandom(32)
+            server_keys[i][(True, j)] = key
+            client_keys[j][(False, i)] = key
+    return server_keys, client_keys
@@ -0,0 +1,74 @@
+import unittest
+
+from ..messages import ClientRequest, CommitMessage, Hello, SignedMessage
+from ..messages.frame import EnvelopeView
+from ..messengers.admission import (DUPLICATE, RATE_LIMITED, STALE_TERM,
+                                    TOO_LARGE, AdmissionFilter)
+from .configs.four_servers_four_clients import (build_server_config,
+                                                client_private_keys,
+                                                server_configs)
+
+
+def view_of(message, private_key) -> EnvelopeView:
+    return EnvelopeView(SignedMessage(message, private_key).encode())
+
+
+class TestAdmissionFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.config = build_server_config(0)
+        self.admission = AdmissionFilter(self.config)
+
+    def admit(self, view: EnvelopeView, current_term: int = None) -> str:
+        return self.admission.admit(view, len(view.payload), False, current_term)
+
+    def test_size_and_rate_limits(self):
+        self.config.max_message_sizes['ClientRequest'] = 200
+        self.config.client_rate_limit = (0.001, 3)
+        small = view_of(ClientRequest(0, 0, b'op'), client_private_keys[0])
+        large = view_of(ClientRequest(0, 1, b'x' * 200), client_private_keys[0])
+        self.assertEqual(self.admit(large), TOO_LARGE)
+        self.assertEqual([self.admit(small) for _ in range(4)],
+                         [None, None, None, RATE_LIMITED])
+
+        # Each sender has its own bucket
+        other = view_of(ClientRequest(1, 0, b'op'), client_private_keys[1])
+        self.assertIsNone(self.admit(other))
+        self.assertEqual(self.admission.rejection_counts(),
+                         {TOO_LARGE: {'ClientRequest': 1},
+                          RATE_LIMITED: {'ClientRequest': 1}})
+
+    def test_hellos_limited_per_remote_host(self):
+        self.config.client_rate_limit = (0.001, 2)
+        # A Hello claiming to come from server 1, which isn't verified yet
+        hello = view_of(Hello(1, False, 0, False, 1),
+                        server_configs[1].private_key)
+
+        def admit_hello(remote_host: str) -> str:
+            return self.admission.admit(hello, len(hello.payload), True,
+                                        None, remote_host)
+        self.assertEqual([admit_hello('10.0.0.1') for _ in range(3)],
+                         [None, None, RATE_LIMITED])
+
+        # Other hosts can still connect, as can server 1 itself
+        self.assertIsNone(admit_hello('10.0.0.2'))
+        commit = view_of(CommitMessage(1, 3, 5, b'h' * 32),
+                         server_configs[1].private_key)
+        self.assertIsNone(self.admit(commit))
+
+    def test_stale_terms_and_duplicates(self):
+        commit = view_of(CommitMessage(1, 3, 5, b'h' * 32),
+                         server_configs[1].private_key)
+        self.assertEqual(commit.term, 3)
+        self.assertEqual(self.admit(commit, 4), STALE_TERM)
+        self.assertIsNone(self.admit(commit, 3))
+
+        # Only copies of delivered messages are dropped
+        self.assertIsNone(self.admit(commit, 3))
+        self.admission.delivered(commit)
+        self.assertEqual(self.admit(commit, 3), DUPLICATE)
+
+        # Client requests may be retried
+        request = view_of(ClientRequest(0, 0, b'op'), client_private_keys[0])
+        self.admission.delivered(request)
+        self.assertIsNone(self.admit(request, 3))
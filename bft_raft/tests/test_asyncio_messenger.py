@@ -0,0 +1,219 @@
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from Crypto.Hash import SHA256
+
+from ..config import ClientConfig
+from ..crypto.rsa import RSABackend
+from ..messages import (ClientRequest, ClientResponse, CommitMessage, Hello,
+                        SignedMessage, VoteMessage)
+from ..messages.compression import SUPPORTED, ZLIB
+from ..messages.frame import (FRAME_HEADER, build_frame, decode_frame_payload,
+                              encode_frame)
+from ..messengers.asyncio import AsyncIoMessenger, Link
+from ..messengers.listener import MessengerListener
+from ..messengers.verification import verify_encoding, worker_config
+from .configs.four_servers_four_clients import (build_server_config,
+                                                client_private_keys,
+                                                client_public_keys,
+                                                server_configs,
+                                                server_public_keys)
+from .test_messages import nested_envelope
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.written = []
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def close(self):
+        pass
+
+
+class FakeWriter(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+
+
+def payload(message, private_key) -> bytes:
+    frame = encode_frame(SignedMessage(message, private_key))
+    return frame[FRAME_HEADER.size:]
+
+
+class CountingBackend(RSABackend):
+    def __init__(self):
+        super(CountingBackend, self).__init__()
+        self.num_signatures = 0
+
+    def sign(self, private_key, digest: bytes) -> bytes:
+        self.num_signatures += 1
+        return super(CountingBackend, self).sign(private_key, digest)
+
+
+class Recorder(MessengerListener):
+    def __init__(self):
+        self.received = []
+
+    def on_message(self, msg, signed):
+        self.received.append(msg)
+
+
+class TestAsyncIoMessenger(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        config = build_server_config(0)
+        config.enable_logging = False
+        self.messenger = AsyncIoMessenger(config, {}, {}, 0, False, self.loop)
+
+    def tearDown(self):
+        self.messenger.connections.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    def receive(self, message) -> Link:
+        link = Link()
+        link.writer = FakeWriter()
+        accepted = self.messenger._receive(
+            link, payload(message, client_private_keys[0]))
+        return link if accepted else None
+
+    def test_hello_identifies_connection(self):
+        # Connections must start with a Hello addressed to us
+        self.assertIsNone(self.receive(ClientRequest(0, 0, b'op')))
+        self.assertIsNone(self.receive(Hello(0, True, 1, False, 5)))
+        self.assertIsNone(self.receive(Hello(0, True, 0, True, 5)))
+
+        link = self.receive(Hello(0, True, 0, False, 5))
+        self.assertEqual(link.peer, (True, 0))
+        self.assertEqual(len(link.writer.transport.written), 1)  # our Hello
+        self.assertIs(self.messenger.connections.queue((True, 0))._writer,
+                      link.writer)
+
+        # Replays are rejected
+        self.assertIsNone(self.receive(Hello(0, True, 0, False, 5)))
+        self.assertIsNotNone(self.receive(Hello(0, True, 0, False, 6)))
+
+        # Only the client may send over its connection, and only once
+        self.assertFalse(self.messenger._receive(
+            link, payload(Hello(0, True, 0, False, 7), client_private_keys[0])))
+        self.assertFalse(self.messenger._receive(
+            link, payload(ClientRequest(1, 0, b'op'), client_private_keys[1])))
+        self.assertTrue(self.messenger._receive(
+            link, payload(ClientRequest(0, 0, b'op'), client_private_keys[0])))
+
+    def test_broadcast_signed_once(self):
+        config = build_server_config(0)
+        config.enable_logging = False
+        config.crypto_backend = CountingBackend()
+        servers = dict((i, ('127.0.0.1', 9000 + i)) for i in range(4))
+        self.messenger = AsyncIoMessenger(config, {}, servers, 0, False,
+                                          self.loop)
+        queues = [self.messenger.connections.queue((False, i))
+                  for i in range(1, 4)]
+
+        # Each broadcast is signed and serialized once for all n - 1 peers
+        for slot in range(2):
+            self.messenger.broadcast_server_message(
+                CommitMessage(0, 1, slot, b'h' * 32))
+            self.assertEqual(self.messenger.num_signed, slot + 1)
+            self.assertEqual(config.crypto_backend.num_signatures, slot + 1)
+            self.assertEqual([len(queue._frames) for queue in queues],
+                             [slot + 1] * 3)
+            frames = [queue._frames[-1] for queue in queues]
+            self.assertTrue(all(frame is frames[0] for frame in frames))
+        self.assertEqual(self.messenger.num_broadcasts, 2)
+
+    def test_deeply_nested_frame_closes_connection(self):
+        link = Link()
+        link.writer = FakeWriter()
+        hello = Hello(1, False, 0, False, 5)
+        self.assertTrue(self.messenger._receive(
+            link, payload(hello, server_configs[1].private_key)))
+
+        # A validly signed vote whose A-cert is a request wrapped in 5000
+        # SignedMessages
+        vote = VoteMessage(1, 0, None).encode()
+        body = vote[6:-1] + b'\x01' + nested_envelope(5000)
+        vote = vote[:2] + struct.pack('!I', len(body)) + body
+        config = server_configs[1]
+        signature = config.crypto_backend.sign(
+            config.private_key, SHA256.new(vote).digest())
+        body = vote + struct.pack('!I', len(signature)) + signature
+        envelope = struct.pack('!HI', SignedMessage.type_tag, len(body)) + body
+        self.assertIsNone(verify_encoding(worker_config(config), envelope))
+        frame = build_frame(envelope)
+        self.assertFalse(self.messenger._receive(
+            link, frame[FRAME_HEADER.size:]))
+
+    def test_compression_negotiated_in_hello(self):
+        config = build_server_config(0)
+        config.enable_logging = False
+        config.compression = 'zlib'
+        self.messenger = AsyncIoMessenger(config, {}, {}, 0, False, self.loop)
+        response = ClientResponse(0, 0, 0, b'x' * 8192)
+        queue = self.messenger.connections.queue((True, 0))
+
+        # Frames are only compressed for nodes that listed the codec
+        self.messenger.send_client_message(0, response)
+        self.receive(Hello(0, True, 0, False, 5, SUPPORTED))
+        self.messenger.send_client_message(0, response)
+        codecs = [decode_frame_payload(frame[FRAME_HEADER.size:], SUPPORTED,
+                                       100000)[1]
+                  for frame in queue._frames]
+        self.assertEqual(codecs, [0, ZLIB])
+        self.assertEqual(
+            self.messenger.compression_summary()['ClientResponse']['compressed'], 1)
+
+    def test_pipeline_with_protocol_transport(self):
+        # Payloads parsed in place must outlive the receive buffer when the
+        # decode stage runs off the event loop
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for placement in ('thread', 'process'):
+            servers = {0: 'unix:' + os.path.join(directory, 's0-' + placement)}
+            clients = {0: 'unix:' + os.path.join(directory, 'c0-' + placement)}
+            config = build_server_config(0)
+            config.enable_logging = False
+            config.transport = 'protocol'
+            config.pipeline = {'decode': placement}
+            server = AsyncIoMessenger(config, clients, servers, 0, False,
+                                      self.loop)
+            recorder = Recorder()
+            server.add_listener(recorder)
+            client_config = ClientConfig(0, server_public_keys,
+                                         client_public_keys[0],
+                                         client_private_keys[0])
+            client_config.enable_logging = False
+            client_config.transport = 'protocol'
+            client = AsyncIoMessenger(client_config, {0: clients[0]}, servers,
+                                      0, True, self.loop)
+
+            async def run():
+                server.start_server()
+                await asyncio.sleep(0.1)
+                for seqno in range(100):
+                    client.send_server_message(
+                        0, ClientRequest(0, seqno, b'op %d' % seqno))
+                for _ in range(500):
+                    if len(recorder.received) == 100:
+                        break
+                    await asyncio.sleep(0.01)
+
+            try:
+                self.loop.run_until_complete(run())
+            finally:
+                server.pipeline.close()
+                client.connections.close()
+                server.connections.close()
+            self.assertEqual([m.seqno for m in recorder.received],
+                             list(range(100)), placement)
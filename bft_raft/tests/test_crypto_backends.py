@@ -0,0 +1,94 @@
+import hashlib
+import pickle
+import unittest
+
+from ..config import ServerConfig
+from ..crypto import ecdsa
+from ..crypto.ecdsa import ECDSABackend
+from ..crypto.hmac import HMACBackend, NullBackend
+from ..messages import ClientResponse
+from ..server_states.leader import Leader
+from .helpers.cluster import MemoryQueueCluster
+from .helpers.gen_keys import gen_keys
+
+DIGEST = hashlib.sha256(b'message').digest()
+OTHER_DIGEST = hashlib.sha256(b'other message').digest()
+
+
+class TestCryptoBackends(unittest.TestCase):
+
+    def check_backend(self, backend):
+        public_key, private_key = backend.generate_keys()
+        other_public_key, other_private_key = backend.generate_keys()
+        signature = backend.sign(private_key, DIGEST)
+        self.assertTrue(backend.verify(public_key, DIGEST, signature))
+
+        # Tampered messages and signatures, and other nodes' keys
+        self.assertFalse(backend.verify(public_key, OTHER_DIGEST, signature))
+        tampered = bytes([signature[0] ^ 1]) + signature[1:]
+        self.assertFalse(backend.verify(public_key, DIGEST, tampered))
+        self.assertFalse(backend.verify(public_key, DIGEST, signature[:-1]))
+        self.assertFalse(backend.verify(other_public_key, DIGEST, signature))
+        self.assertFalse(backend.verify(
+            public_key, DIGEST, backend.sign(other_private_key, DIGEST)))
+
+    @unittest.skipIf(ecdsa.ec is None, 'requires the cryptography package')
+    def test_ecdsa(self):
+        backend = ECDSABackend()
+        self.check_backend(backend)
+
+        # Can be sent to worker processes
+        public_key, private_key = backend.generate_keys()
+        copy = pickle.loads(pickle.dumps(backend))
+        self.assertTrue(copy.verify(public_key, DIGEST,
+                                    backend.sign(private_key, DIGEST)))
+
+    def test_hmac(self):
+        backend = HMACBackend()
+        self.check_backend(backend)
+
+        # Each node's key is its own public key, so verifiers look up the
+        # sender's key in the same maps as with the other backends
+        public_keys, private_keys = gen_keys(range(3), backend=backend)
+        self.assertEqual(public_keys, private_keys)
+        self.assertEqual(len(set(public_keys.values())), 3)
+        signature = backend.sign(private_keys[1], DIGEST)
+        self.assertEqual([backend.verify(public_keys[i], DIGEST, signature)
+                          for i in range(3)], [False, True, False])
+
+    def test_null(self):
+        backend = NullBackend()
+        public_key, private_key = backend.generate_keys()
+        signature = backend.sign(private_key, DIGEST)
+        self.assertTrue(backend.verify(public_key, OTHER_DIGEST, signature))
+        self.assertFalse(backend.verify(public_key, DIGEST, b'signature'))
+
+    def check_commit(self, backend):
+        client_public_keys, client_private_keys = gen_keys(
+            range(4), backend=backend)
+        server_public_keys, server_private_keys = gen_keys(
+            range(4), backend=backend)
+        configs = []
+        for i in range(4):
+            config = ServerConfig(i, client_public_keys, server_public_keys,
+                                  server_private_keys[i], backend)
+            config.enable_logging = False
+            configs.append(config)
+        cluster = MemoryQueueCluster(configs)
+        cluster.pump()  # initial election
+        self.assertIsInstance(cluster.servers[0].state, Leader)
+        for seqno in range(3):
+            cluster.submit(1, client_private_keys[1], seqno, b'op %d' % seqno)
+            cluster.pump()
+        responses = [m for _, m in cluster.client_messages
+                     if isinstance(m, ClientResponse)]
+        self.assertEqual(len(responses), 3 * 4)
+        for server in cluster.servers:
+            self.assertEqual(server.state.applied_c_cert.slot, 2)
+
+    def test_commit_with_hmac(self):
+        self.check_commit(HMACBackend())
+
+    @unittest.skipIf(ecdsa.ec is None, 'requires the cryptography package')
+    def test_commit_with_ecdsa(self):
+        self.check_commit(ECDSABackend())
@@ -0,0 +1,54 @@
+import struct
+import unittest
+
+from messaging.frame_protocol import INITIAL_BUFFER_SIZE, FrameProtocol
+
+HEADER = struct.Struct('!I')
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestFrameProtocol(unittest.TestCase):
+
+    def feed(self, protocol, data, chunk_size):
+        # Delivers data like a transport would, chunk_size bytes at a time
+        while data:
+            buf = protocol.get_buffer(-1)
+            n = min(len(buf), chunk_size, len(data))
+            buf[:n] = data[:n]
+            protocol.buffer_updated(n)
+            data = data[n:]
+
+    def test_split_and_large_frames(self):
+        payloads = [b'', b'a', b'b' * 1000, b'c' * (3 * INITIAL_BUFFER_SIZE), b'd']
+        data = b''.join(HEADER.pack(len(p)) + p for p in payloads)
+        for chunk_size in (1, 7, 4096, len(data)):
+            received = []
+            protocol = FrameProtocol(HEADER, lambda h: HEADER.unpack(h)[0],
+                                     lambda f: received.append(bytes(f)) or True)
+            protocol.connection_made(FakeTransport())
+            self.feed(protocol, data, chunk_size)
+            self.assertEqual(received, payloads)
+
+    def test_rejected_header_closes_connection(self):
+        def payload_size(header):
+            size = HEADER.unpack(header)[0]
+            if size > 10:
+                raise ValueError('frame too large')
+            return size
+
+        received = []
+        transport = FakeTransport()
+        protocol = FrameProtocol(HEADER, payload_size,
+                                 lambda f: received.append(bytes(f)) or True)
+        protocol.connection_made(transport)
+        self.feed(protocol, HEADER.pack(1) + b'a' + HEADER.pack(11) + b'b' * 11,
+                  100)
+        self.assertEqual(received, [b'a'])
+        self.assertTrue(transport.closed)
@@ -0,0 +1,196 @@
+import pickle
+import struct
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from Crypto.Hash import SHA256
+
+from ..messages import (ACert, AppendEntriesRequest, AppendEntriesSuccess,
+                        CCert, ClientRequest, CommitMessage, LogEntry,
+                        SignedMessage)
+from ..messages.compression import NONE, SUPPORTED, ZLIB, compress
+from ..messages.encoding import MAX_DEPTH, DecodeError, decode
+from ..messages.frame import (FRAME_HEADER, EnvelopeView, build_frame,
+                              decode_frame_header, decode_frame_payload,
+                              encode_frame)
+from ..messages.log_entry import verify_entries
+from .configs.four_servers_four_clients import client_private_keys, server_configs
+
+
+def build_entries(num_entries: int, private_key=client_private_keys[0]) -> list:
+    entries = []
+    prev_ihash = b'0'
+    for i in range(num_entries):
+        req = SignedMessage(ClientRequest(0, i, b'op %d' % i), private_key)
+        entry = LogEntry(0, prev_ihash, req)
+        prev_ihash = entry.incremental_hash()
+        entries.append(entry)
+    return entries
+
+
+def nested_envelope(depth: int) -> bytes:
+    '''Returns the encoding of a client request wrapped in depth
+    SignedMessages, built directly since encoding it would recurse as
+    deeply.'''
+    data = ClientRequest(0, 0, b'op').encode()
+    for _ in range(depth):
+        body = data + struct.pack('!I', 0)  # (empty signature)
+        data = struct.pack('!HI', SignedMessage.type_tag, len(body)) + body
+    return data
+
+
+class TestMessages(unittest.TestCase):
+
+    def test_frozen_after_construction(self):
+        msg = AppendEntriesSuccess(1, 0, 0, b'hash')
+        with self.assertRaises(AttributeError):
+            msg.slot = 1
+        entry = LogEntry(0, b'0', SignedMessage(ClientRequest(0, 0, b'op'),
+                                                client_private_keys[0]))
+        with self.assertRaises(AttributeError):
+            entry.term = 1
+
+    def test_digest_cached(self):
+        msg = AppendEntriesSuccess(1, 0, 0, b'hash')
+        digest = msg.hash()
+        self.assertIs(msg.hash(), digest)
+
+    def test_digest_not_pickled(self):
+        msg = AppendEntriesSuccess(1, 0, 0, b'hash')
+        digest = msg.hash()
+        state = msg.__getstate__()
+        self.assertNotIn('_digest', state)
+        state['_digest'] = b'forged'
+        copy = pickle.loads(pickle.dumps(msg))
+        copy.__setstate__(state)
+        self.assertEqual(copy.hash(), digest)
+        with self.assertRaises(AttributeError):
+            copy.slot = 1
+
+    def test_encoding_round_trip(self):
+        config = server_configs[0]
+        entries = build_entries(3)
+        success = SignedMessage(AppendEntriesSuccess(0, 0, 2, b'hash'),
+                                server_configs[0].private_key)
+        msg = SignedMessage(AppendEntriesRequest(0, 0, entries, 0, success),
+                            server_configs[0].private_key)
+        data = msg.encode()
+        copy = decode(data)
+        self.assertEqual(copy.hash(), msg.hash())
+        self.assertEqual(copy.hash(), SHA256.new(data).digest())
+        self.assertEqual(copy.message.entries[2].operation, b'op 2')
+        self.assertTrue(copy.verify(config))
+        with self.assertRaises(AttributeError):
+            copy.message.first_slot = 1
+
+    def test_decode_rejects_non_canonical(self):
+        data = ClientRequest(0, 0, b'op').encode()
+        self.assertIsInstance(decode(data), ClientRequest)
+        with self.assertRaises(DecodeError):
+            decode(data + b'\x00')  # trailing data
+        with self.assertRaises(DecodeError):
+            decode(data[:-1])  # truncated
+        with self.assertRaises(DecodeError):
+            decode(data[:14] + b'\x02' + data[15:])  # from_client not 0 or 1
+        with self.assertRaises(DecodeError):
+            decode(b'\xff\xff' + data[2:])  # unknown type tag
+
+    def test_decode_rejects_deep_nesting(self):
+        self.assertIsInstance(decode(nested_envelope(MAX_DEPTH)),
+                              SignedMessage)
+        with self.assertRaises(DecodeError):
+            decode(nested_envelope(MAX_DEPTH + 1))
+        with self.assertRaises(DecodeError):
+            decode(nested_envelope(5000))  # (about 50 KB)
+
+    def test_envelope_view(self):
+        signed = SignedMessage(AppendEntriesRequest(2, 1, build_entries(2), 0, None),
+                               server_configs[2].private_key)
+        frame = encode_frame(signed)
+        size = decode_frame_header(frame[:FRAME_HEADER.size], len(frame))
+        encoding, codec = decode_frame_payload(frame[FRAME_HEADER.size:],
+                                               SUPPORTED, len(frame))
+        self.assertEqual(codec, NONE)
+        view = EnvelopeView(encoding)
+        self.assertEqual(size, len(frame) - FRAME_HEADER.size)
+        self.assertIs(view.message_class, AppendEntriesRequest)
+        self.assertEqual((view.sender_id, view.from_client), (2, False))
+        self.assertEqual(view.signature, signed.signature)
+        self.assertEqual(view.message_digest(), signed.message.hash())
+        self.assertEqual(view.decode().hash(), signed.hash())
+
+        with self.assertRaises(DecodeError):
+            decode_frame_header(frame[:FRAME_HEADER.size], size - 1)
+        with self.assertRaises(DecodeError):
+            decode_frame_header(b'\x00' + frame[1:FRAME_HEADER.size], size)
+        with self.assertRaises(DecodeError):
+            EnvelopeView(signed.message.encode())  # not an envelope
+
+    def test_compressed_frame(self):
+        signed = SignedMessage(AppendEntriesRequest(2, 1, build_entries(20), 0, None),
+                               server_configs[2].private_key)
+        encoding = signed.encode()
+        frame = build_frame(compress(ZLIB, encoding), ZLIB)
+        self.assertLess(len(frame), len(encoding))
+        payload = frame[FRAME_HEADER.size:]
+        self.assertEqual(decode_frame_payload(payload, SUPPORTED, len(encoding)),
+                         (encoding, ZLIB))
+
+        with self.assertRaises(DecodeError):
+            decode_frame_payload(payload, b'', len(encoding))  # not negotiated
+        with self.assertRaises(DecodeError):
+            decode_frame_payload(payload, SUPPORTED, len(encoding) - 1)
+        with self.assertRaises(DecodeError):
+            decode_frame_payload(payload[:-1], SUPPORTED, len(encoding))
+
+    def test_verify_entries(self):
+        config = server_configs[0]
+        config.signature_cache.clear()
+        entries = build_entries(10)
+        self.assertTrue(verify_entries(entries, config))
+        self.assertEqual(config.signature_cache.misses, 10)
+
+        # swapping two entries breaks the hash chain
+        swapped = entries[:4] + [entries[5], entries[4]] + entries[6:]
+        self.assertFalse(verify_entries(swapped, config))
+
+        # a request signed by the wrong client is rejected
+        forged = build_entries(3, private_key=client_private_keys[1])
+        config.signature_cache.clear()
+        self.assertFalse(verify_entries(forged, config))
+
+    def test_verify_entries_with_executor(self):
+        config = server_configs[0]
+        config.signature_cache.clear()
+        with ThreadPoolExecutor(2) as executor:
+            config.verify_executor = executor
+            try:
+                self.assertTrue(verify_entries(build_entries(10), config))
+                self.assertFalse(verify_entries(
+                    build_entries(3, private_key=client_private_keys[1]), config))
+            finally:
+                config.verify_executor = None
+
+    def test_compact_cert(self):
+        config = server_configs[0]
+        successes = [SignedMessage(AppendEntriesSuccess(i, 1, 5, b'hash'),
+                                   server_configs[i].private_key)
+                     for i in (3, 1, 2)]
+        cert = ACert(5, b'hash', 1, successes)
+        self.assertEqual(cert.signer_ids(), [1, 2, 3])
+        self.assertEqual(len(cert.signatures), 3)
+        self.assertTrue(cert.verify(config))
+
+        # signatures only count for the digest and signers they were made for
+        self.assertFalse(ACert(5, b'other', 1, successes).verify(config))
+        self.assertFalse(ACert(5, b'hash', 2, successes).verify(config))
+        self.assertFalse(CCert(5, b'hash', 1, successes).verify(config))
+        forged = ACert(5, b'hash', 1, successes)
+        forged.__dict__['signers'] = 0b1011
+        self.assertFalse(forged.verify(config))
+        self.assertFalse(ACert(5, b'hash', 1, successes[:2]).verify(config))
+
+        commits = [SignedMessage(CommitMessage(i, 1, 5, b'hash'),
+                                 server_configs[i].private_key)
+                   for i in range(3)]
+        self.assertTrue(CCert(5, b'hash', 1, commits).verify(config))
@@ -0,0 +1,342 @@
+import unittest
+
+from ..application import Application
+from .configs.four_servers_four_clients import (NUM_CLIENTS, NUM_SERVERS,
+                                                build_server_config,
+                                                client_private_keys)
+from .helpers.cluster import MemoryQueueCluster
+from .helpers.gen_keys import gen_session_keys
+from ..messages import (AppendEntriesRequest, AppendEntriesSuccess,
+                        AuthenticatedMessage, CertMessage, ClientBusy,
+                        ClientRequest, ClientRequestFailure, ClientResponse,
+                        CommitMessage, DigestLogEntry, LogResend,
+                        SignedMessage, TentativeClientResponse, VoteMessage)
+from ..messages.frame import EnvelopeView
+from ..messengers.memory_queue import MemoryQueueMessenger
+from ..server_states.follower import Follower
+from ..server_states.leader import Leader
+
+
+class HistoryApp(Application):
+    '''Records the operations it has handled.'''
+
+    def __init__(self) -> None:
+        self.history = []  # type: list
+
+    def handle_request(self, operation: bytes, client_id: int) -> bytes:
+        self.history.append(operation)
+        return b'%d' % len(self.history)
+
+    def checkpoint(self) -> object:
+        return list(self.history)
+
+    def rollback(self, checkpoint: object) -> None:
+        self.history = list(checkpoint)
+
+
+class TestNormalOperation(unittest.TestCase):
+
+    def build_cluster(self, setup=None, **kwargs) -> MemoryQueueCluster:
+        configs = [build_server_config(i) for i in range(NUM_SERVERS)]
+        for config in configs:
+            config.enable_logging = False
+            if setup is not None:
+                setup(config)
+        cluster = MemoryQueueCluster(configs, **kwargs)
+        cluster.pump()  # initial election
+        self.assertIsInstance(cluster.servers[0].state, Leader)
+        for server in cluster.servers[1:]:
+            self.assertIsInstance(server.state, Follower)
+        return cluster
+
+    def assert_executed(self, cluster: MemoryQueueCluster, num_requests: int):
+        responses = [m for _, m in cluster.client_messages
+                     if isinstance(m, ClientResponse)]
+        self.assertEqual(len(responses), num_requests * NUM_SERVERS)
+        for server in cluster.servers:
+            self.assertEqual(server.state.applied_c_cert.slot, num_requests - 1)
+
+    def test_commit(self):
+        cluster = self.build_cluster()
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 3)
+
+    def test_missing_a_cert_fetched(self):
+        cluster = self.build_cluster()
+
+        # server 3 never sees the successes of others, so it can't form the
+        # A-cert itself and has to ask for it once f + 1 servers commit
+        cluster.drop = lambda server, envelope: \
+            server is cluster.servers[3] \
+            and isinstance(envelope.message, AppendEntriesSuccess)
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 3)
+        self.assertEqual(cluster.delivered[CertMessage.__name__], 3)
+
+    def test_requests_batched_while_committing(self):
+        cluster = self.build_cluster()
+        leader = cluster.servers[0].state
+
+        # The first request goes out alone; the batch size then grows while
+        # requests keep arriving: [1], [2, 3], [4, 5, 6]
+        for seqno in range(7):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+        self.assertEqual(len(leader.log), 7)
+        cluster.pump()
+
+        # Once idle, it shrinks, and a request that doesn't fill a batch
+        # goes out when the ones before it are committed
+        for seqno in range(7, 9):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+        self.assertEqual(len(leader.log), 8)
+        cluster.pump()
+        self.assert_executed(cluster, 9)
+        self.assertEqual(leader.batching.stats()['batches'],
+                         {'full': 3, 'idle': 2, 'drained': 1, 'window': 0})
+        self.assertEqual(leader.batching.size, 2)
+
+    def test_full_log_window_turns_requests_away(self):
+        def setup(config):
+            config.log_window = 2
+            config.max_queued_requests = 2
+        cluster = self.build_cluster(setup)
+        leader = cluster.servers[0].state
+
+        # Two slots fit in the window and two requests wait for it to move;
+        # the rest are turned away
+        for seqno in range(7):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+        self.assertEqual(len(leader.log), 2)
+        self.assertEqual(len(leader.batch), 2)
+        cluster.pump()
+        self.assertEqual(leader.applied_c_cert.slot, 3)
+        busy = [m.seqno for _, m in cluster.client_messages
+                if isinstance(m, ClientBusy)]
+        self.assertEqual(busy, [4, 5, 6])
+
+        # Successes beyond the window are dropped
+        leader._add_append_entries_success(
+            AppendEntriesSuccess(1, leader.term, 6, b'hash'), None)
+        self.assertNotIn(6, leader.append_entries_success)
+
+        # The client sends them again once told the leader is busy
+        for seqno in range(4, 7):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 7)
+
+    def test_digest_entries(self):
+        def setup(config):
+            config.digest_entries = True
+            if config.server_id == 0:
+                config.request_pool_size = 0  # (the leader uses its log)
+        cluster = self.build_cluster(setup)
+
+        # Server 3 never gets request 1 from the client, so it fetches it
+        # from the leader; entries only carry digests
+        sent_entries = []
+
+        def drop(server, envelope):
+            message = envelope.message
+            if isinstance(message, AppendEntriesRequest):
+                sent_entries.extend(message.entries)
+            return server is cluster.servers[3] \
+                and isinstance(message, ClientRequest) and message.seqno == 1
+        cluster.drop = drop
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 3)
+        self.assertTrue(sent_entries)
+        self.assertTrue(all(isinstance(entry, DigestLogEntry)
+                            for entry in sent_entries))
+        self.assertEqual(cluster.delivered['RequestFetch'], 1)
+        self.assertEqual(cluster.delivered['FetchedRequests'], 1)
+        self.assertEqual(cluster.servers[3].state.log[1].seqno, 1)
+
+    def test_collector_commit(self):
+        def setup(config):
+            config.collector_commit = True
+        cluster = self.build_cluster(setup)
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 3)
+
+        # Followers only send to the leader, which broadcasts an A-cert and a
+        # C-cert for each slot
+        self.assertEqual(cluster.delivered[AppendEntriesSuccess.__name__],
+                         3 * (NUM_SERVERS - 1))
+        self.assertEqual(cluster.delivered[CertMessage.__name__],
+                         2 * 3 * (NUM_SERVERS - 1))
+
+    def test_tentative_execution(self):
+        def setup(config):
+            config.tentative_execution = True
+        cluster = self.build_cluster(setup, application_factory=HistoryApp)
+
+        # Requests are executed on A-certs, before (here, without) C-certs
+        cluster.drop = lambda server, envelope: \
+            isinstance(envelope.message, CommitMessage)
+        for seqno in range(2):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        responses = [m for _, m in cluster.client_messages
+                     if isinstance(m, ClientResponse)]
+        self.assertEqual(len(responses), 2 * NUM_SERVERS)
+        self.assertTrue(all(isinstance(m, TentativeClientResponse)
+                            for m in responses))
+        for server in cluster.servers:
+            self.assertIsNone(server.state.applied_c_cert)
+            self.assertEqual(server.application.history, [b'op 0', b'op 1'])
+
+        # Once the C-cert comes, nothing is executed again, and the final
+        # replies are sent
+        cluster.drop = None
+        cluster.client_messages = []
+        cluster.submit(0, client_private_keys[0], 2, b'op 2')
+        cluster.pump()
+        for server in cluster.servers:
+            self.assertEqual(server.state.applied_c_cert.slot, 2)
+            self.assertEqual(server.application.history,
+                             [b'op 0', b'op 1', b'op 2'])
+            self.assertIsNone(server.state.tentative)
+        final = sorted(m.seqno for _, m in cluster.client_messages
+                       if type(m) is ClientResponse)
+        self.assertEqual(final, sorted(list(range(3)) * NUM_SERVERS))
+
+        # Only server 2 forms the A-cert for op 3 and executes it
+        # tentatively, and it doesn't vote when server 1 is elected for the
+        # next term, so server 1 starts its term from slot 2
+        cluster.client_messages = []
+        cluster.drop = lambda server, envelope: \
+            isinstance(envelope.message, CommitMessage) \
+            or (isinstance(envelope.message, AppendEntriesSuccess)
+                and server is not cluster.servers[2]) \
+            or (isinstance(envelope.message, VoteMessage)
+                and envelope.message.sender_id == 2)
+        cluster.submit(0, client_private_keys[0], 3, b'op 3')
+        cluster.pump()
+        self.assertEqual([(i, type(m)) for i, m in cluster.client_messages],
+                         [(0, TentativeClientResponse)])
+        self.assertEqual(cluster.servers[2].application.history,
+                         [b'op 0', b'op 1', b'op 2', b'op 3'])
+        for server in cluster.servers:
+            server.state = server.state.increment_term()
+        cluster.pump()
+        self.assertIsInstance(cluster.servers[1].state, Leader)
+
+        # Server 1 puts another client's request in slot 3, so server 2 rolls
+        # op 3 back (once it sees slot 3 committed), and the retried op 3
+        # goes in slot 4
+        cluster.drop = None
+        cluster.client_messages = []
+        cluster.submit(1, client_private_keys[1], 0, b'other op')
+        cluster.pump()
+        cluster.submit(0, client_private_keys[0], 3, b'op 3')
+        cluster.pump()
+        for server in cluster.servers:
+            self.assertEqual(server.state.applied_c_cert.slot, 4)
+            self.assertEqual(server.application.history,
+                             [b'op 0', b'op 1', b'op 2', b'other op', b'op 3'])
+        final = sorted((i, m.seqno, m.result)
+                       for i, m in cluster.client_messages
+                       if type(m) is ClientResponse)
+        self.assertEqual(final, [(0, 3, b'5')] * NUM_SERVERS
+                         + [(1, 0, b'4')] * NUM_SERVERS)
+
+    def test_tentative_execution_with_crashed_server(self):
+        def setup(config):
+            config.tentative_execution = True
+        cluster = self.build_cluster(setup, application_factory=HistoryApp)
+        cluster.drop = lambda server, envelope: server is cluster.servers[3]
+
+        # The three servers left send a final reply once each slot commits
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        replies = [(type(m), m.seqno) for _, m in cluster.client_messages]
+        self.assertEqual(len(replies), 3 * 2 * 3)
+        for seqno in range(3):
+            self.assertEqual(replies.count((TentativeClientResponse, seqno)), 3)
+            self.assertEqual(replies.count((ClientResponse, seqno)), 3)
+
+        # A retried request isn't executed again, but is answered with a
+        # failure once its duplicate slot commits
+        cluster.client_messages = []
+        cluster.submit(0, client_private_keys[0], 2, b'op 2')
+        cluster.pump()
+        self.assertEqual([(type(m), m.max_seqno, m.result)
+                          for _, m in cluster.client_messages],
+                         [(ClientRequestFailure, 2, b'3')] * 3)
+        for server in cluster.servers[:3]:
+            self.assertEqual(server.application.history,
+                             [b'op 0', b'op 1', b'op 2'])
+
+    def test_executed_requests_remembered_across_elections(self):
+        cluster = self.build_cluster(application_factory=HistoryApp)
+        for seqno in range(2):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+
+        # Every server moves to the next term, where server 1 leads; the
+        # executed requests must carry over to the new states
+        for server in cluster.servers:
+            server.state = server.state.increment_term()
+            self.assertEqual(server.state.latest_req_per_client[0][0], 1)
+        cluster.pump()
+        self.assertIsInstance(cluster.servers[1].state, Leader)
+
+        # so that a retried request isn't executed again
+        cluster.client_messages = []
+        cluster.submit(0, client_private_keys[0], 1, b'op 1')
+        cluster.pump()
+        for server in cluster.servers:
+            self.assertEqual(server.application.history, [b'op 0', b'op 1'])
+        self.assertEqual(len(cluster.client_messages), NUM_SERVERS)
+        self.assertTrue(all(isinstance(m, ClientRequestFailure)
+                            for _, m in cluster.client_messages))
+
+    def test_commit_with_authenticators(self):
+        server_keys, _ = gen_session_keys(NUM_SERVERS, NUM_CLIENTS)
+
+        def setup(config):
+            config.session_keys = server_keys[config.server_id]
+        cluster = self.build_cluster(setup)
+        for seqno in range(3):
+            cluster.submit(0, client_private_keys[0], seqno, b'op %d' % seqno)
+            cluster.pump()
+        self.assert_executed(cluster, 3)
+
+        # heartbeats and replies use MACs; certificate contents are signed
+        leader = cluster.servers[0].memqueue_messenger
+        self.assertGreater(leader.num_authenticated, 0)
+        self.assertGreater(leader.num_signed, 0)
+
+    def test_transferable_messages_need_signatures(self):
+        server_keys, _ = gen_session_keys(NUM_SERVERS, NUM_CLIENTS)
+        config = build_server_config(0)
+        config.session_keys = server_keys[0]
+        sender = build_server_config(1)
+        sender.session_keys = server_keys[1]
+        messenger = MemoryQueueMessenger(sender)
+
+        resend = messenger.authenticate(LogResend(1, 0, 0), False, [0])
+        self.assertIsInstance(resend, AuthenticatedMessage)
+        self.assertTrue(resend.verify(config))
+        self.assertFalse(resend.verify(sender))  # not addressed to server 1
+
+        success = AppendEntriesSuccess(1, 0, 0, b'hash')
+        self.assertIsInstance(messenger.authenticate(success, False, [0]),
+                              SignedMessage)
+        forged = AuthenticatedMessage(success, False, [0], sender.session_keys)
+        self.assertFalse(forged.verify(config))
+
+        # the same checks are made on received frames before they are decoded
+        receiver = MemoryQueueMessenger(config)
+        self.assertTrue(receiver.check_envelope_view(EnvelopeView(resend.encode())))
+        self.assertFalse(receiver.check_envelope_view(EnvelopeView(forged.encode())))
@@ -0,0 +1,89 @@
+import asyncio
+import copy
+import socket
+import unittest
+
+from messaging.peer_queue import PeerQueue
+
+from .configs.four_servers_four_clients import server_configs
+
+
+class TestPeerQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_frames_sent_in_order(self):
+        received = bytearray()
+        closed = self.loop.create_future()
+
+        async def handle(reader, writer):
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                received.extend(data)
+            writer.close()
+            closed.set_result(None)
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            peer = PeerQueue(server_configs[0], ('127.0.0.1', port), self.loop,
+                             50)
+            for i in range(100):
+                peer.send(bytes([i]))
+            self.assertEqual(peer.depth, 50)
+            self.assertEqual(peer.num_dropped, 50)
+            await asyncio.sleep(0.1)
+            for i in range(50, 100):
+                peer.send(bytes([i]))
+            await asyncio.sleep(0.1)
+            self.assertEqual(peer.depth, 0)
+            self.assertEqual(peer.bytes_in_flight, 0)
+            self.assertLess(peer.num_writes, peer.num_sent)
+            peer.close()
+            await closed
+            server.close()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(bytes(received), bytes(range(100)))
+
+    def test_reconnects_to_peer_that_was_down(self):
+        config = copy.copy(server_configs[0])
+        config.send_drop_policy = 'oldest'
+        config.reconnect_delay = 0.01
+        received = bytearray()
+
+        async def handle(reader, writer):
+            received.extend(await reader.readexactly(3))
+            writer.close()
+
+        async def run():
+            # Find a port nobody listens on
+            sock = socket.socket()
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+            sock.close()
+
+            peer = PeerQueue(config, ('127.0.0.1', port), self.loop, 3)
+            for i in range(5):
+                peer.send(bytes([i]))
+            await asyncio.sleep(0.05)
+            self.assertIs(peer.up, False)
+            self.assertGreater(peer.failures, 1)
+            self.assertEqual(peer.depth, 3)
+            self.assertEqual(peer.num_dropped, 2)
+
+            server = await asyncio.start_server(handle, '127.0.0.1', port)
+            await asyncio.sleep(0.2)
+            self.assertIs(peer.up, True)
+            self.assertEqual(peer.failures, 0)
+            peer.close()
+            server.close()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(bytes(received), bytes([2, 3, 4]))
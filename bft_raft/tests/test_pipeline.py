@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from ..util.pipeline import Pipeline, Stage
+
+
+def slow_square(data: int) -> int:
+    if data < 0:
+        raise ValueError(data)
+    time.sleep(0.001 * (data % 3))
+    return data * data
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_stages_keep_order(self):
+        finished = []
+        failed = []
+        pipeline = Pipeline()
+        pipeline.add(Stage('square', self.loop, 100, slow_square,
+                           lambda context, result: (context, result + 1),
+                           lambda context, exception: failed.append(context),
+                           ThreadPoolExecutor(3), 3))
+        pipeline.add(Stage('record', self.loop, 100, finish=lambda *item:
+                           finished.append(item)))
+        pipeline.link('square', 'record')
+
+        async def run():
+            for i in [1, 2, -1, 3, 4, 5, 6]:
+                pipeline['square'].add('item %d' % i, i)
+            while len(finished) + len(failed) < 7:
+                await asyncio.sleep(0.01)
+            pipeline.close()
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(finished, [('item %d' % i, i * i + 1)
+                                    for i in [1, 2, 3, 4, 5, 6]])
+        self.assertEqual(failed, ['item -1'])
+        stats = pipeline.stats()
+        self.assertEqual(list(stats), ['square', 'record'])
+        self.assertEqual(stats['square']['processed'], 6)
+        self.assertEqual(stats['square']['failed'], 1)
+        self.assertEqual(stats['record']['processed'], 6)
+
+    def test_full_stages_hold_back_the_ones_feeding_them(self):
+        released = threading.Event()
+        feeding = Stage('feeding', self.loop, 5, finish=lambda context, data:
+                        blocked.add(context, data))
+        blocked = Stage('blocked', self.loop, 2, lambda data: released.wait(),
+                        lambda context, data: None, None,
+                        ThreadPoolExecutor(1))
+        feeding.blocked_by.append(blocked)
+
+        async def run():
+            for i in range(5):
+                self.assertTrue(feeding.offer(i, i))
+            await asyncio.sleep(0.01)
+            self.assertEqual((feeding.depth, blocked.depth), (2, 2))
+
+            # Items offered beyond a stage's capacity are dropped
+            for i in range(5, 8):
+                self.assertTrue(feeding.offer(i, i))
+            self.assertFalse(feeding.offer(8, 8))
+
+            released.set()
+            while blocked.stats()['processed'] < 8:
+                await asyncio.sleep(0.01)
+            self.assertEqual(feeding.stats()['dropped'], 1)
+            self.assertEqual(blocked.stats()['max_depth'], 2)
+            feeding.close()
+            blocked.close()
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(run())
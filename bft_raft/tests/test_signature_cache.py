@@ -0,0 +1,44 @@
+import unittest
+
+from .configs.four_servers_four_clients import server_configs
+from ..messages import AppendEntriesSuccess, SignedMessage
+from ..util.signature_cache import SignatureCache
+
+
+class TestSignatureCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = SignatureCache(capacity=2)
+        cache.add('a')
+        cache.add('b')
+        self.assertTrue(cache.contains('a'))  # 'a' is now most recently used
+        cache.add('c')
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.contains('a'))
+        self.assertFalse(cache.contains('b'))
+        self.assertTrue(cache.contains('c'))
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def test_signature_verified_once(self):
+        sender = server_configs[1]
+        receiver = server_configs[0]
+        receiver.signature_cache.clear()
+        msg = AppendEntriesSuccess(1, 0, 0, b'hash')
+        signed = SignedMessage(msg, sender.private_key)
+
+        self.assertTrue(signed.verify(receiver))
+        self.assertEqual(receiver.signature_cache.misses, 1)
+        self.assertTrue(signed.verify(receiver))
+        self.assertEqual(receiver.signature_cache.hits, 1)
+
+    def test_invalid_signature_not_cached(self):
+        receiver = server_configs[0]
+        receiver.signature_cache.clear()
+        msg = AppendEntriesSuccess(1, 0, 0, b'hash')
+        forged = SignedMessage(msg, server_configs[2].private_key)
+
+        self.assertFalse(forged.verify(receiver))
+        self.assertFalse(forged.verify(receiver))
+        self.assertEqual(len(receiver.signature_cache), 0)
+        self.assertEqual(receiver.signature_cache.hits, 0)
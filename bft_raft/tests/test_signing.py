@@ -0,0 +1,40 @@
+import asyncio
+import unittest
+
+from ..messages import ClientResponse, CommitMessage
+from ..messengers.signing import SigningService
+from .configs.four_servers_four_clients import server_configs
+
+
+class TestSigningService(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_futures_resolved_in_order(self):
+        config = server_configs[0]
+        commits = [CommitMessage(0, 1, i, b'h' * 32) for i in range(6)]
+        response = ClientResponse(0, 0, 0, b'result')
+        results = []
+
+        async def run():
+            service = SigningService(config, self.loop, 2)
+            futures = [service.sign(commit) for commit in commits[:3]]
+            futures.append(service.ready(response))
+            futures += [service.sign(commit) for commit in commits[3:]]
+            for i, future in enumerate(futures):
+                future.add_done_callback(
+                    lambda future, i=i: results.append((i, future.result())))
+            await asyncio.gather(*futures)
+            self.assertEqual(service.depth, 0)
+            service.close()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([i for i, _ in results], list(range(7)))
+        self.assertIs(results[3][1], response)
+        for i, signed in results[:3] + results[4:]:
+            self.assertEqual(signed.message, commits[i if i < 3 else i - 1])
+            self.assertTrue(signed.verify(server_configs[1]))
@@ -0,0 +1,34 @@
+import unittest
+
+from messaging import transports
+from messaging.transports import SHM, TCP, UNIX, SharedMemoryRing, parse_address
+
+
+class TestTransports(unittest.TestCase):
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address(('127.0.0.1', 9000)),
+                         (TCP, ('127.0.0.1', 9000)))
+        self.assertEqual(parse_address('unix:/tmp/s0.sock'), (UNIX, '/tmp/s0.sock'))
+        self.assertEqual(parse_address('shm:/tmp/s0.sock'), (SHM, '/tmp/s0.sock'))
+        with self.assertRaises(ValueError):
+            parse_address('/tmp/s0.sock')
+
+    @unittest.skipUnless(transports.shared_memory, 'requires Python 3.8')
+    def test_ring_wraps_around(self):
+        writer = SharedMemoryRing(capacity=10)
+        reader = SharedMemoryRing(writer.name)
+        try:
+            buf = bytearray(10)
+            self.assertEqual(writer.write(memoryview(b'abcdefgh')), 8)
+            self.assertEqual(reader.read_into(memoryview(buf)[:5]), 5)
+            self.assertEqual(bytes(buf[:5]), b'abcde')
+
+            # Only 7 bytes are free, and they wrap around the end of the ring
+            self.assertEqual(writer.write(memoryview(b'ijklmnopq')), 7)
+            self.assertEqual(reader.read_into(memoryview(buf)), 10)
+            self.assertEqual(bytes(buf), b'fghijklmno')
+            self.assertEqual(reader.read_into(memoryview(buf)), 0)
+        finally:
+            reader.close()
+            writer.close()
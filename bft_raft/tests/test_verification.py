@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+
+from ..messages import (AppendEntriesRequest, AppendEntriesSuccess,
+                        ClientRequest, SignedMessage)
+from ..messengers.verification import VerificationPool
+from .configs.four_servers_four_clients import (client_private_keys,
+                                                server_configs)
+from .test_messages import build_entries
+
+
+class TestVerificationPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_results_in_order_per_sender(self):
+        config = server_configs[0]
+        entries = build_entries(20)
+        success = SignedMessage(
+            AppendEntriesSuccess(1, 1, 19, entries[-1].incremental_hash()),
+            server_configs[1].private_key)
+        large = SignedMessage(AppendEntriesRequest(1, 1, entries, 0, success),
+                              server_configs[1].private_key).encode()
+        small = SignedMessage(ClientRequest(0, 0, b'op'),
+                              client_private_keys[0]).encode()
+        forged = SignedMessage(ClientRequest(0, 1, b'op'),
+                               client_private_keys[1]).encode()
+        results = []
+
+        async def run():
+            pool = VerificationPool(config, self.loop, 2)
+            done = self.loop.create_future()
+            for i, encoding in enumerate([large, small, forged, small]):
+                pool.submit((True, 0), encoding,
+                            lambda keys, i=i: results.append((i, keys)))
+            pool.submit(None, small, done.set_result)
+            await done
+            while pool.depth:
+                await asyncio.sleep(0.01)
+            pool.close()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual([i for i, _ in results], [0, 1, 2, 3])
+        self.assertEqual(len(results[0][1]), 22)
+        self.assertEqual(len(results[1][1]), 1)
+        self.assertIsNone(results[2][1])
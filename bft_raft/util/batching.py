@@ -0,0 +1,46 @@
+import typing
+
+# Why a batch was sent: it reached the target size (or the byte limit),
+# nothing else was waiting to be committed, everything sent before it was
+# committed, or its first request waited a whole batch window
+FULL = 'full'
+IDLE = 'idle'
+DRAINED = 'drained'
+WINDOW = 'window'
+
+
+class BatchController(object):
+    '''Chooses how many client requests the leader appends to its log in one
+    AppendEntriesRequest, with additive increase and multiplicative decrease.
+
+    The target size grows by one each time a batch fills up before anything
+    else sends it, i.e. requests arrive faster than batches are committed,
+    and halves each time a batch is sent because the cluster was idle or its
+    window ran out. It stays between 1 and max_size.'''
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 1
+
+        # Number of batches sent for each reason, and number of requests in
+        # them
+        self.num_batches = dict((reason, 0) for reason in
+                                (FULL, IDLE, DRAINED, WINDOW))
+        self.num_requests = 0
+
+    def sent(self, num_requests: int, reason: str) -> None:
+        '''Records a batch of num_requests requests sent for reason.'''
+        self.num_batches[reason] += 1
+        self.num_requests += num_requests
+        if reason == FULL:
+            self.size = min(self.max_size, self.size + 1)
+        elif reason in (IDLE, WINDOW):
+            self.size = max(1, self.size // 2)
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        '''Returns the target size, the number of batches sent for each
+        reason, and their mean number of requests.'''
+        num_batches = sum(self.num_batches.values())
+        return {'size': self.size,
+                'batches': dict(self.num_batches),
+                'mean_size': self.num_requests / max(1, num_batches)}
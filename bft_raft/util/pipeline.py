@@ -0,0 +1,244 @@
+import asyncio
+import typing
+from collections import OrderedDict, deque
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+# Where a stage can run: on the event loop, in a worker thread or in worker
+# processes
+PLACEMENTS = ('loop', 'thread', 'process')
+
+
+class Stage(object):
+    '''One stage of handling messages: a bounded queue of items, and the work
+    done on each of them.
+
+    Items are (context, data) pairs. work(data) runs on the event loop, or in
+    executor if one is given, with up to concurrency items in flight. Then
+    finish(context, result) runs on the event loop, in the order the items
+    were queued, and returns the (context, data) item to pass to the next
+    stage, or None. If work raises an exception, fail(context, exception) is
+    called instead. If executor is a ProcessPoolExecutor, work, data and
+    the result must be picklable.
+
+    The queue holds up to capacity items. put waits for room and offer drops
+    the item if there is none; add always queues it, for items that can
+    neither wait nor be lost, but then the stages that feed this one (see
+    blocked_by) wait before taking their next item.'''
+
+    def __init__(self,
+                 name: str,
+                 loop: asyncio.AbstractEventLoop,
+                 capacity: int,
+                 work: typing.Callable = None,
+                 finish: typing.Callable = None,
+                 fail: typing.Callable = None,
+                 executor: Executor = None,
+                 concurrency: int = 1) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self.executor = executor
+        self.next_stage = None  # type: Stage
+        self._loop = loop
+        self._work = work
+        self._finish = finish
+        self._fail = fail
+
+        # Stages this one feeds outside of next_stage; it waits while any of
+        # them is full
+        self.blocked_by = []  # type: typing.List[Stage]
+
+        # (context, data, time queued) triples waiting to be worked on, and
+        # (context, future of the result, time started) triples in flight
+        self._items = deque()  # type: deque
+        self._in_flight = deque()  # type: deque
+        self._task = None  # type: asyncio.Task
+        self._wakeup = None  # type: asyncio.Future
+        self._room = None  # type: asyncio.Future
+
+        self.max_depth = 0
+        self.num_processed = 0
+        self.num_dropped = 0
+        self.num_failed = 0
+        self.queue_time = 0.0  # Seconds items waited in the queue, in total
+        self.service_time = 0.0  # Seconds spent working on items, in total
+        self._started = loop.time()
+
+    @property
+    def depth(self) -> int:
+        '''Number of items waiting to be worked on.'''
+        return len(self._items)
+
+    def full(self) -> bool:
+        return len(self._items) >= self.capacity
+
+    def offer(self, context, data) -> bool:
+        '''Queues an item if there is room. Returns false if it was dropped.'''
+        if self.full():
+            self.num_dropped += 1
+            return False
+        self.add(context, data)
+        return True
+
+    async def put(self, context, data) -> None:
+        '''Queues an item once there is room for it.'''
+        await self.wait_for_room()
+        self.add(context, data)
+
+    def add(self, context, data) -> None:
+        '''Queues an item, even if the queue is full.'''
+        self._items.append((context, data, self._loop.time()))
+        self.max_depth = max(self.max_depth, len(self._items))
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        elif self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def wait_for_room(self) -> None:
+        while self.full():
+            if self._room is None:
+                self._room = self._loop.create_future()
+            await self._room
+
+    def close(self) -> None:
+        '''Stops the stage, dropping the items it hasn't finished.'''
+        if self._task is not None:
+            self._task.cancel()
+        for _, future, _ in self._in_flight:
+            future.cancel()
+        self.num_dropped += len(self._items) + len(self._in_flight)
+        self._items.clear()
+        self._in_flight.clear()
+
+    def stats(self) -> dict:
+        '''Returns the number of items queued, in flight and at most queued
+        so far, the number processed, dropped and failed, the mean seconds
+        items waited in the queue and were worked on, and the fraction of
+        time the stage's workers have been busy.'''
+        num_started = self.num_processed + self.num_failed
+        elapsed = self._loop.time() - self._started
+        return {'depth': self.depth,
+                'in_flight': len(self._in_flight),
+                'max_depth': self.max_depth,
+                'capacity': self.capacity,
+                'processed': self.num_processed,
+                'dropped': self.num_dropped,
+                'failed': self.num_failed,
+                'queue_time': self.queue_time / max(1, num_started),
+                'service_time': self.service_time / max(1, num_started),
+                'utilization': self.service_time / max(
+                    1e-9, elapsed * self.concurrency)}
+
+    async def _run(self) -> None:
+        while True:
+            if not self._items and not self._in_flight:
+                self._wakeup = self._loop.create_future()
+                await self._wakeup
+                self._wakeup = None
+
+            # Start work on as many items as we may have in flight, unless a
+            # stage we feed is full
+            for stage in self.blocked_by:
+                await stage.wait_for_room()
+            while self._items and len(self._in_flight) < self.concurrency:
+                self._start(*self._items.popleft())
+            if self._room is not None and not self.full():
+                self._room.set_result(None)
+                self._room = None
+
+            # Finish the oldest one
+            context, future, start = self._in_flight[0]
+            try:
+                result = await future
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:  # pylint:disable=W0703
+                self._in_flight.popleft()
+                self.num_failed += 1
+                self.service_time += self._loop.time() - start
+                if self._fail is not None:
+                    self._fail(context, exception)
+                continue
+            self._in_flight.popleft()
+            item = (context, result)
+            if self._finish is not None:
+                item = self._finish(context, result)
+            self.num_processed += 1
+            self.service_time += self._loop.time() - start
+            if item is not None and self.next_stage is not None:
+                await self.next_stage.put(*item)
+
+    def _start(self, context, data, queued: float) -> None:
+        start = self._loop.time()
+        self.queue_time += start - queued
+        if self._work is None:
+            future = self._loop.create_future()
+            future.set_result(data)
+        elif self.executor is None:
+            future = self._loop.create_future()
+            try:
+                future.set_result(self._work(data))
+            except Exception as exception:  # pylint:disable=W0703
+                future.set_exception(exception)
+        else:
+            future = self._loop.run_in_executor(self.executor, self._work,
+                                                data)
+        self._in_flight.append((context, future, start))
+
+
+class Pipeline(object):
+    '''The stages a node handles messages in, by name, in order.'''
+
+    def __init__(self) -> None:
+        self.stages = OrderedDict()  # type: typing.Dict[str, Stage]
+
+    def __getitem__(self, name: str) -> Stage:
+        return self.stages[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.stages
+
+    def add(self, stage: Stage) -> Stage:
+        '''Adds a stage (see link to pass it items from another).'''
+        self.stages[stage.name] = stage
+        return stage
+
+    def link(self, *names: str) -> None:
+        '''Makes each of the named stages pass its items to the next one.'''
+        for name, next_name in zip(names, names[1:]):
+            self.stages[name].next_stage = self.stages[next_name]
+
+    def stats(self) -> typing.Dict[str, dict]:
+        '''Returns the statistics of each stage (see Stage.stats).'''
+        return OrderedDict((name, stage.stats())
+                           for name, stage in self.stages.items())
+
+    def bottleneck(self) -> str:
+        '''Returns the name of the stage whose workers have been busiest.'''
+        return max(self.stages.values(),
+                   key=lambda stage: stage.stats()['utilization']).name
+
+    def close(self) -> None:
+        '''Stops every stage and its workers, waiting for the items they are
+        working on.'''
+        for stage in self.stages.values():
+            stage.close()
+            if stage.executor is not None:
+                stage.executor.shutdown(wait=True)
+
+
+def create_executor(placement: str, num_workers: int = 1,
+                    initializer: typing.Callable = None,
+                    initargs: tuple = ()) -> Executor:
+    '''Returns the executor to run a stage's work in: None for 'loop', or a
+    pool of num_workers threads or processes. initializer(*initargs) is only
+    run in processes; work run in threads shouldn't need it.'''
+    if placement not in PLACEMENTS:
+        raise ValueError('unknown placement %r' % (placement,))
+    if placement == 'thread':
+        return ThreadPoolExecutor(num_workers)
+    if placement == 'process':
+        return ProcessPoolExecutor(num_workers, initializer=initializer,
+                                   initargs=initargs)
+    return None
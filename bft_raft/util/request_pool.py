@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+from ..messages import ClientRequest, SignedMessage  # pylint:disable=W0611
+
+
+class RequestPool(object):
+    '''Bounded LRU map from digest (SignedMessage.hash) to the signed client
+    requests a server has received, so that log entries can refer to requests
+    by digest alone (see DigestLogEntry).
+
+    Only requests that have already been verified are added.'''
+
+    def __init__(self, capacity: int = 10000) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._requests = OrderedDict()  # type: OrderedDict
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(self, signed: 'SignedMessage[ClientRequest]') -> None:
+        '''Adds a request, evicting the least recently used one if the pool
+        is full.'''
+        if self.capacity <= 0:
+            return
+        digest = signed.hash()
+        self._requests[digest] = signed
+        self._requests.move_to_end(digest)
+        while len(self._requests) > self.capacity:
+            self._requests.popitem(last=False)
+
+    def get(self, digest: bytes) -> 'SignedMessage[ClientRequest]':
+        '''Returns the request with the given digest, or None if we don't
+        have it, and updates the hit/miss counters accordingly.'''
+        signed = self._requests.get(digest)
+        if signed is None:
+            self.misses += 1
+            return None
+        self._requests.move_to_end(digest)
+        self.hits += 1
+        return signed
@@ -0,0 +1,44 @@
+from collections import OrderedDict
+
+
+class SignatureCache(object):
+    '''Bounded LRU set of signatures that have already been verified.
+
+    Entries are keyed by (from_client, sender_id, message digest, signature).
+    Only successful verifications are added, so an invalid signature is checked
+    (and rejected) every time it is seen.'''
+
+    def __init__(self, capacity: int = 10000) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # type: OrderedDict
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, key) -> bool:
+        '''Returns whether the signature identified by key has already been
+        verified, and updates the hit/miss counters accordingly.'''
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key) -> None:
+        '''Records that the signature identified by key is valid, evicting the
+        least recently used entry if the cache is full.'''
+        if self.capacity <= 0:
+            return
+        self._entries[key] = None
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        '''Removes all entries and resets the counters.'''
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,69 @@
+import asyncio
+import typing
+
+from .peer_queue import PeerQueue
+from .transports import Address
+
+
+class ConnectionManager(object):
+    '''Keeps the send queue of each peer a messenger talks to, creating it on
+    first use, and reports which peers are reachable.
+
+    Peers are identified by keys chosen by the messenger. address_of maps a key
+    to the peer's address, and connect_to, if given, returns the coroutine
+    function used to open a connection to the peer (see PeerQueue). config is
+    the BaseConfig of the raft or bft_raft node sending.'''
+
+    def __init__(self,
+                 config: typing.Any,
+                 loop: asyncio.AbstractEventLoop,
+                 address_of: typing.Callable[[typing.Any], Address],
+                 connect_to: typing.Callable = None) -> None:
+        self.config = config
+        self._loop = loop
+        self._address_of = address_of
+        self._connect_to = connect_to
+        self._queues = {}  # type: typing.Dict[typing.Any, PeerQueue]
+
+    def queue(self, key) -> PeerQueue:
+        '''Returns the send queue of a peer.'''
+        queue = self._queues.get(key)
+        if queue is None:
+            connect = None
+            if self._connect_to is not None:
+                connect = self._connect_to(key)
+            queue = PeerQueue(self.config, self._address_of(key), self._loop,
+                              self.config.send_queue_size, connect)
+            self._queues[key] = queue
+        return queue
+
+    def send(self, key, frame: bytes) -> None:
+        '''Queues a frame to be sent to a peer.'''
+        self.queue(key).send(frame)
+
+    def is_up(self, key) -> bool:
+        '''Returns false if the last attempt to connect to a peer failed.
+        Peers we haven't tried to connect to yet are assumed to be up.'''
+        queue = self._queues.get(key)
+        return queue is None or queue.up is not False
+
+    def close(self) -> None:
+        '''Closes every connection and stops reconnecting.'''
+        for queue in self._queues.values():
+            queue.close()
+
+    def stats(self) -> typing.Dict[typing.Any, dict]:
+        '''Returns, for each peer, whether it is up (None if unknown), the
+        number of consecutive failed connection attempts and the seconds until
+        the next one, the number of frames waiting to be written, the number of
+        bytes not yet handed to the operating system, the number of frames sent
+        and dropped, and the number of writes used to send them.'''
+        return {key: {'up': queue.up,
+                      'failures': queue.failures,
+                      'retry_in': queue.retry_in,
+                      'depth': queue.depth,
+                      'bytes_in_flight': queue.bytes_in_flight,
+                      'sent': queue.num_sent,
+                      'dropped': queue.num_dropped,
+                      'writes': queue.num_writes}
+                for key, queue in self._queues.items()}
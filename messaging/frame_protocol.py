@@ -0,0 +1,117 @@
+import asyncio
+import struct
+import typing
+
+# Initial size of each connection's receive buffer
+INITIAL_BUFFER_SIZE = 64 * 1024
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    '''Receives length-prefixed frames without the StreamReader layer.
+
+    The transport reads straight into a per-connection buffer, and frames are
+    parsed in place: each payload is passed to on_frame as a memoryview into
+    the buffer, which is only valid until on_frame returns. The buffer grows to
+    fit the largest frame received and is otherwise reused.
+
+    header is the layout of the frame header, and payload_size returns the
+    length of the payload following a header; it may raise ValueError to
+    reject the frame. If it does, or on_frame returns false, the connection is
+    closed.
+
+    Like asyncio.StreamWriter, the protocol has a transport attribute and a
+    drain coroutine, which waits while the transport's write buffer is above
+    its high-water mark, so it can also be used to send frames.'''
+
+    def __init__(self,
+                 header: struct.Struct,
+                 payload_size: typing.Callable[[memoryview], int],
+                 on_frame: typing.Callable[[memoryview], bool]) -> None:
+        self._header = header
+        self._payload_size = payload_size
+        self._on_frame = on_frame
+        self.transport = None  # type: asyncio.Transport
+        self._paused = False  # Whether the transport asked us to stop writing
+        self._drain_waiters = []  # type: typing.List[asyncio.Future]
+        self._buffer = bytearray(INITIAL_BUFFER_SIZE)
+        self._start = 0  # Position of the first unparsed byte
+        self._end = 0  # Position just past the last received byte
+
+        # Number of bytes needed to parse the next header or payload, and
+        # whether it is a payload
+        self._needed = header.size
+        self._in_payload = False
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self._start == self._end:
+            self._start = self._end = 0
+        want = max(sizehint, self._needed - (self._end - self._start), 1)
+        if len(self._buffer) - self._end < want:
+            # Move the unparsed bytes to the front, into a larger buffer if
+            # the next header or payload doesn't fit otherwise
+            pending = self._end - self._start
+            if pending + want > len(self._buffer):
+                buffer = bytearray(max(pending + want, 2 * len(self._buffer)))
+                buffer[:pending] = self._buffer[self._start:self._end]
+                self._buffer = buffer
+            else:
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        return memoryview(self._buffer)[self._end:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._end += nbytes
+        view = memoryview(self._buffer)
+        while self._end - self._start >= self._needed:
+            data = view[self._start:self._start + self._needed]
+            self._start += self._needed
+            if self._in_payload:
+                self._needed = self._header.size
+                self._in_payload = False
+                if not self._on_frame(data):
+                    self.transport.close()
+                    return
+            else:
+                try:
+                    self._needed = self._payload_size(data)
+                except ValueError:
+                    self.transport.close()
+                    return
+                self._in_payload = True
+
+    def eof_received(self) -> None:
+        return None
+
+    def pause_writing(self) -> None:
+        self._paused = True
+
+    def resume_writing(self) -> None:
+        self._paused = False
+        self._wake_drain_waiters(None)
+
+    def connection_lost(self, exc) -> None:
+        self._wake_drain_waiters(ConnectionResetError('Connection lost'))
+
+    async def drain(self) -> None:
+        '''Waits until the transport's write buffer has drained below its
+        high-water mark. Raises ConnectionError if the connection is lost.'''
+        if self.transport.is_closing():
+            raise ConnectionResetError('Connection lost')
+        if not self._paused:
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._drain_waiters.append(waiter)
+        await waiter
+
+    def _wake_drain_waiters(self, exc: Exception) -> None:
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                if exc is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(exc)
+        self._drain_waiters = []
@@ -0,0 +1,188 @@
+import asyncio
+import random
+import typing
+from collections import deque
+
+from .transports import Address, create_connection, format_address
+
+
+class PeerQueue(object):
+    '''Bounded queue of frames waiting to be sent to one peer.
+
+    A single writer task per peer opens the connection (unless one the peer
+    opened has been attached), then repeatedly takes every frame queued since
+    its last write, sends them with one writelines call, and waits for the
+    transport to drain before writing again. Frames are therefore sent in the
+    order they were queued, including those queued while the connection is
+    being opened.
+
+    A connection is represented by its writer: any object with a transport
+    attribute and a drain coroutine, like asyncio.StreamWriter.
+
+    If the connection can't be opened, the peer is marked down and the task
+    keeps retrying with exponential backoff and jitter (see
+    config.reconnect_delay), even if nothing is queued, until it is up again.
+    Frames keep being queued meanwhile. If the queue is full, either the new
+    frame or the oldest queued one is dropped, depending on
+    config.send_drop_policy; the protocol already tolerates lost messages.
+
+    config is the BaseConfig of the raft or bft_raft node sending.'''
+
+    def __init__(self,
+                 config: typing.Any,
+                 address: Address,
+                 loop: asyncio.AbstractEventLoop,
+                 max_frames: int,
+                 connect: typing.Callable[[], typing.Awaitable] = None) -> None:
+        self.config = config
+        self.address = address
+        self.max_frames = max_frames
+        self._loop = loop
+        self._frames = deque()  # type: deque
+        self._bytes_queued = 0
+        self._writer = None  # type: asyncio.StreamWriter
+        self._task = None  # type: asyncio.Task
+        self._wakeup = None  # type: asyncio.Future
+
+        # Whether the peer is reachable: None until we first connect or fail
+        # to, then true while connected and false after a failed attempt
+        self.up = None  # type: bool
+        self.failures = 0  # Number of consecutive failed connection attempts
+        self._next_attempt = 0.0  # Loop time before which we don't reconnect
+
+        # Coroutine function that opens a connection to the peer and returns
+        # its writer; by default, a plain stream connection to address
+        self._connect_peer = connect or self._open_connection
+
+        # Number of frames sent and dropped, and number of writes used to send
+        # them
+        self.num_sent = 0
+        self.num_dropped = 0
+        self.num_writes = 0
+
+    @property
+    def depth(self) -> int:
+        '''Number of frames waiting to be written.'''
+        return len(self._frames)
+
+    @property
+    def bytes_in_flight(self) -> int:
+        '''Number of bytes queued or buffered by the transport, i.e. not yet
+        handed to the operating system.'''
+        buffered = 0
+        if self._writer is not None and not self._writer.transport.is_closing():
+            buffered = self._writer.transport.get_write_buffer_size()
+        return self._bytes_queued + buffered
+
+    @property
+    def connected(self) -> bool:
+        '''Whether the queue has an open connection to the peer.'''
+        return self._writer is not None and not self._writer.transport.is_closing()
+
+    @property
+    def retry_in(self) -> float:
+        '''Seconds until the next connection attempt, if the peer is down.'''
+        if self.up is not False:
+            return 0.0
+        return max(0.0, self._next_attempt - self._loop.time())
+
+    def attach(self, writer) -> None:
+        '''Sends over a connection that is already open (e.g. one the peer
+        opened to us), unless the queue already has one.'''
+        if not self.connected:
+            self._writer = writer
+            self._mark_up()
+
+    def send(self, frame: bytes) -> None:
+        '''Queues a frame, starting the writer task if it isn't running.'''
+        if len(self._frames) >= self.max_frames:
+            self.num_dropped += 1
+            if self.config.send_drop_policy == 'newest':
+                return
+            assert self.config.send_drop_policy == 'oldest'
+            self._bytes_queued -= len(self._frames.popleft())
+        self._frames.append(frame)
+        self._bytes_queued += len(frame)
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        elif self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def close(self) -> None:
+        '''Stops the writer task and closes the connection, dropping any
+        queued frames. The queue shouldn't be used afterwards.'''
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.transport.close()
+        self.num_dropped += len(self._frames)
+        self._frames.clear()
+        self._bytes_queued = 0
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                # (while the peer is down, keep trying to reconnect)
+                if not self._frames and self.up is not False:
+                    self._wakeup = self._loop.create_future()
+                    await self._wakeup
+                    self._wakeup = None
+                if not self.connected:
+                    delay = self._next_attempt - self._loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if not self.connected and not await self._connect():
+                        continue
+                if not self._frames:
+                    continue
+
+                # Send everything queued so far in one write
+                frames = list(self._frames)
+                self._frames.clear()
+                self._bytes_queued = 0
+                self._writer.transport.writelines(frames)
+                self.num_sent += len(frames)
+                self.num_writes += 1
+                try:
+                    await self._writer.drain()
+                except ConnectionError:
+                    self.config.log('Lost connection with %s' %
+                                    format_address(self.address))
+                    self._writer.transport.close()
+        finally:
+            self._task = None
+
+    async def _connect(self) -> bool:
+        try:
+            self._writer = await self._connect_peer()
+        except OSError:
+            self._writer = None
+            self.up = False
+            self.failures += 1
+
+            # Back off exponentially, waiting between half and all of the
+            # delay so that nodes that lost a peer at the same time don't
+            # reconnect in lockstep
+            delay = min(self.config.max_reconnect_delay,
+                        self.config.reconnect_delay * 2 ** min(self.failures - 1, 32))
+            delay = random.uniform(delay / 2, delay)
+            self._next_attempt = self._loop.time() + delay
+            self.config.log('Failed to open connection with %s, retrying in %.2fs'
+                            % (format_address(self.address), delay))
+            return False
+        self.config.log('Opened connection with %s' %
+                        format_address(self.address))
+        self._mark_up()
+        return True
+
+    def _mark_up(self) -> None:
+        self.up = True
+        self.failures = 0
+        self._next_attempt = 0.0
+
+    async def _open_connection(self):
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        transport, _ = await create_connection(
+            self._loop, lambda: protocol, self.address)
+        return asyncio.StreamWriter(transport, protocol, reader, self._loop)
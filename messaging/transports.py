@@ -0,0 +1,336 @@
+'''Connections to the addresses in AsyncIoMessenger's address maps.
+
+An address is one of
+
+    (host, port)        TCP
+    'unix:<path>'       Unix domain socket bound to path
+    'shm:<path>'        Shared-memory rings, set up over a Unix domain socket
+                        bound to path
+
+create_connection and create_server mirror the event loop methods of the same
+names for all three kinds of address.
+
+Over a shared-memory connection, each side writes its frames into a
+SharedMemoryRing it created and read by the other side. The Unix domain socket
+is only used to exchange the names of the rings and, after that, as a doorbell:
+one byte is sent whenever new data has been written to a ring, so readers
+don't have to poll.'''
+
+import asyncio
+import os
+import struct
+import typing
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # (Python < 3.8)
+    shared_memory = None
+
+# (host, port) or 'unix:<path>' or 'shm:<path>'
+Address = typing.Union[typing.Tuple[str, int], str]
+
+TCP = 'tcp'
+UNIX = 'unix'
+SHM = 'shm'
+
+# Data capacity of each shared-memory ring
+RING_SIZE = 4 * 1024 * 1024
+
+# Seconds to wait before retrying a write to a full ring
+RING_RETRY_DELAY = 0.0005
+
+_DOORBELL = b'\x00'
+_READ_SIZE = 64 * 1024  # Bytes passed to Protocol.data_received at a time
+_NAME_LENGTH = struct.Struct('!H')
+
+# Names of the rings created by this process
+_created_rings = set()  # type: typing.Set[str]
+
+
+def parse_address(address: Address) -> typing.Tuple[str, typing.Any]:
+    '''Returns the kind of an address (TCP, UNIX or SHM) and its target: a
+    (host, port) pair or a socket path.'''
+    if isinstance(address, str):
+        kind, sep, path = address.partition(':')
+        if sep and kind in (UNIX, SHM):
+            return kind, path
+        raise ValueError('invalid address %r' % address)
+    host, port = address
+    return TCP, (host, port)
+
+
+def format_address(address: Address) -> str:
+    '''Returns an address as a string, for logging.'''
+    if isinstance(address, tuple):
+        return '%s:%d' % address
+    return str(address)
+
+
+async def create_connection(loop: asyncio.AbstractEventLoop,
+                            protocol_factory: typing.Callable,
+                            address: Address):
+    '''Connects to address. Returns a (transport, protocol) pair.'''
+    kind, target = parse_address(address)
+    if kind == TCP:
+        return await loop.create_connection(protocol_factory, *target)
+    elif kind == UNIX:
+        return await loop.create_unix_connection(protocol_factory, target)
+    doorbell = _DoorbellProtocol(loop, protocol_factory, SharedMemoryRing())
+    await loop.create_unix_connection(lambda: doorbell, target)
+    return await doorbell.ready
+
+
+async def create_server(loop: asyncio.AbstractEventLoop,
+                        protocol_factory: typing.Callable,
+                        address: Address):
+    '''Accepts connections to address, creating a protocol for each with
+    protocol_factory. Returns the asyncio.Server.'''
+    kind, target = parse_address(address)
+    if kind == TCP:
+        return await loop.create_server(protocol_factory, *target)
+    if os.path.exists(target):
+        os.unlink(target)  # left over from an earlier run
+    if kind == UNIX:
+        return await loop.create_unix_server(protocol_factory, target)
+    return await loop.create_unix_server(
+        lambda: _DoorbellProtocol(loop, protocol_factory), target)
+
+
+class SharedMemoryRing(object):
+    '''Single-producer, single-consumer byte ring in a shared memory block.
+
+    The block starts with the ring's capacity and the total number of bytes
+    ever written and read; the producer only updates the first count and the
+    consumer only the second.'''
+
+    _HEADER = struct.Struct('=QQQ')  # capacity, bytes written, bytes read
+
+    def __init__(self, name: str = None, capacity: int = RING_SIZE) -> None:
+        if shared_memory is None:
+            raise ImportError('shared-memory transports require Python 3.8')
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=self._HEADER.size + capacity)
+            self._HEADER.pack_into(self._shm.buf, 0, capacity, 0, 0)
+            _created_rings.add(self._shm.name)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            if name not in _created_rings:
+                # (the creator unlinks the block; don't let this process's
+                # resource tracker do it too)
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.name = self._shm.name
+        self.capacity = self._HEADER.unpack_from(self._shm.buf, 0)[0]
+        self._data = self._shm.buf[self._HEADER.size:
+                                   self._HEADER.size + self.capacity]
+
+    def write(self, data: memoryview) -> int:
+        '''Writes as much of data as fits. Returns the number of bytes
+        written.'''
+        _, written, read = self._HEADER.unpack_from(self._shm.buf, 0)
+        count = min(len(data), self.capacity - (written - read))
+        start = written % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = data[:first]
+        self._data[:count - first] = data[first:count]
+        struct.pack_into('=Q', self._shm.buf, 8, written + count)
+        return count
+
+    def read_into(self, buf: memoryview) -> int:
+        '''Moves as many bytes as are available and fit into buf. Returns the
+        number of bytes read.'''
+        _, written, read = self._HEADER.unpack_from(self._shm.buf, 0)
+        count = min(len(buf), written - read)
+        start = read % self.capacity
+        first = min(count, self.capacity - start)
+        buf[:first] = self._data[start:start + first]
+        buf[first:count] = self._data[:count - first]
+        struct.pack_into('=Q', self._shm.buf, 16, read + count)
+        return count
+
+    def close(self) -> None:
+        '''Detaches from the ring, destroying it if we created it.'''
+        self._data.release()
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+            _created_rings.discard(self.name)
+
+
+class RingTransport(asyncio.Transport):
+    '''Transport of a shared-memory connection: writes go to the outgoing
+    ring, and data from the incoming ring is passed to the protocol whenever
+    the other side rings the doorbell.'''
+
+    # Write buffer limits used for flow control, in bytes
+    HIGH_WATER = 64 * 1024
+    LOW_WATER = 16 * 1024
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, doorbell,
+                 outgoing: SharedMemoryRing, incoming: SharedMemoryRing,
+                 protocol: asyncio.BaseProtocol) -> None:
+        super(RingTransport, self).__init__()
+        self._loop = loop
+        self._doorbell = doorbell  # the Unix socket's transport
+        self._outgoing = outgoing
+        self._incoming = incoming
+        self._protocol = protocol
+        self._pending = bytearray()  # Written data that didn't fit in the ring
+        self._retry = None  # type: asyncio.Handle
+        self._paused = False
+        self._closed = False
+
+    def get_extra_info(self, name, default=None):
+        return self._doorbell.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self._closed or self._doorbell.is_closing()
+
+    def close(self) -> None:
+        self._doorbell.close()
+
+    def abort(self) -> None:
+        self._doorbell.abort()
+
+    def get_protocol(self):
+        return self._protocol
+
+    def get_write_buffer_size(self) -> int:
+        return len(self._pending)
+
+    def write(self, data) -> None:
+        if self._closed:
+            return
+        if self._pending:
+            self._pending += data
+        else:
+            written = self._outgoing.write(memoryview(data))
+            if written:
+                self._doorbell.write(_DOORBELL)
+            if written < len(data):
+                self._pending += memoryview(data)[written:]
+        self._update_flow_control()
+
+    def writelines(self, list_of_data) -> None:
+        self.write(b''.join(list_of_data))
+
+    def can_write_eof(self) -> bool:
+        return False
+
+    def _update_flow_control(self) -> None:
+        if self._pending and self._retry is None:
+            self._retry = self._loop.call_later(RING_RETRY_DELAY, self._flush)
+        if not self._paused and len(self._pending) > self.HIGH_WATER:
+            self._paused = True
+            self._protocol.pause_writing()
+        elif self._paused and len(self._pending) <= self.LOW_WATER:
+            self._paused = False
+            self._protocol.resume_writing()
+
+    def _flush(self) -> None:
+        self._retry = None
+        if self._closed:
+            return
+        with memoryview(self._pending) as view:
+            written = self._outgoing.write(view)
+        if written:
+            del self._pending[:written]
+            self._doorbell.write(_DOORBELL)
+        self._update_flow_control()
+
+    def _read_ready(self) -> None:
+        '''Passes everything in the incoming ring to the protocol.'''
+        if isinstance(self._protocol, asyncio.BufferedProtocol):
+            while not self._closed:
+                buf = self._protocol.get_buffer(-1)
+                count = self._incoming.read_into(buf)
+                if not count:
+                    break
+                self._protocol.buffer_updated(count)
+        else:
+            buf = bytearray(_READ_SIZE)
+            while not self._closed:
+                count = self._incoming.read_into(memoryview(buf))
+                if not count:
+                    break
+                self._protocol.data_received(bytes(buf[:count]))
+
+    def _connection_lost(self, exc) -> None:
+        self._closed = True
+        if self._retry is not None:
+            self._retry.cancel()
+        self._protocol.connection_lost(exc)
+        self._outgoing.close()
+        self._incoming.close()
+
+
+class _DoorbellProtocol(asyncio.Protocol):
+    '''Protocol of the Unix domain socket underlying a shared-memory
+    connection. Each side first sends the name of the ring it writes to, as a
+    uint16 length followed by the name; every byte after that is a doorbell.
+
+    outgoing is the ring this side created, which the connecting side sends
+    first; the accepting side creates its ring on receiving the name.'''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 protocol_factory: typing.Callable,
+                 outgoing: SharedMemoryRing = None) -> None:
+        self._loop = loop
+        self._protocol_factory = protocol_factory
+        self._outgoing = outgoing
+        self._received = b''
+        self._socket = None  # type: asyncio.Transport
+        self.transport = None  # type: RingTransport
+
+        # Set to (transport, protocol) once the rings are set up
+        self.ready = loop.create_future()
+
+    def connection_made(self, transport) -> None:
+        self._socket = transport
+        if self._outgoing is not None:
+            self._send_name()
+
+    def data_received(self, data: bytes) -> None:
+        if self.transport is None:
+            self._received += data
+            if len(self._received) < _NAME_LENGTH.size:
+                return
+            end = _NAME_LENGTH.size + \
+                _NAME_LENGTH.unpack_from(self._received)[0]
+            if len(self._received) < end:
+                return
+            try:
+                incoming = SharedMemoryRing(self._received[
+                    _NAME_LENGTH.size:end].decode())
+            except (OSError, ValueError):
+                self._socket.close()
+                return
+            if self._outgoing is None:
+                self._outgoing = SharedMemoryRing()
+                self._send_name()
+            protocol = self._protocol_factory()
+            self.transport = RingTransport(self._loop, self._socket,
+                                           self._outgoing, incoming, protocol)
+            protocol.connection_made(self.transport)
+            if not self.ready.done():
+                self.ready.set_result((self.transport, protocol))
+            data = self._received[end:]
+            self._received = b''
+            if not data:
+                return
+        self.transport._read_ready()
+
+    def connection_lost(self, exc) -> None:
+        if self.transport is not None:
+            self.transport._connection_lost(exc)
+        else:
+            if self._outgoing is not None:
+                self._outgoing.close()
+            if not self.ready.done():
+                self.ready.set_exception(
+                    exc or ConnectionResetError('Connection lost'))
+
+    def _send_name(self) -> None:
+        name = self._outgoing.name.encode()
+        self._socket.write(_NAME_LENGTH.pack(len(name)) + name)
@@ -9,6 +9,26 @@ class BaseConfig(object):
         self._timeout = 3  # type: float
         self.enable_logging = True
 
+        # Maximum number of frames queued for each peer; further frames are
+        # dropped until the queue drains.
+        self.send_queue_size = 1024
+
+        # Which frame is dropped when a peer's send queue is full: the new one
+        # ('newest') or the oldest queued one ('oldest')
+        self.send_drop_policy = 'newest'
+
+        # Seconds to wait before reconnecting to a peer after a failed attempt;
+        # doubled after each further failure, up to max_reconnect_delay
+        self.reconnect_delay = 0.1
+        self.max_reconnect_delay = 5.0
+
+        # How AsyncIoMessenger receives frames: 'stream' (asyncio streams) or
+        # 'protocol' (FrameProtocol, which parses frames in place)
+        self.transport = 'stream'
+
+        # Frames larger than this many bytes are rejected without being read.
+        self.max_frame_size = 16 * 1024 * 1024
+
     def double_timeout(self) -> None:
         self._timeout *= 2
 
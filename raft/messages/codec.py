@@ -0,0 +1,197 @@
+'''Fixed-layout binary encoding of raft messages.
+
+Each message is encoded as a one byte type tag followed by its integer fields
+packed with a fixed struct layout, in network byte order, followed by any
+variable-length data. Optional integers (e.g. the previous log index of the
+first AppendEntriesRequest) are encoded as NULL.
+
+The entries of an AppendEntriesRequest are encoded as one contiguous batch:
+the fixed-size headers of all entries, packed with a single struct call,
+followed by all of their operations.'''
+
+import struct
+from functools import lru_cache
+from typing import List
+
+from .append_entries import AppendEntriesRequest, AppendEntriesResponse
+from .base import Message
+from .client_request import ClientRequest, ClientRequestFailure, ClientResponse
+from .election import VoteMessage, VoteRequest
+from .log_entry import LogEntry
+
+# Encodes None in optional integer fields
+NULL = -2 ** 63
+
+# Size prefix of each frame sent by AsyncIoMessenger
+FRAME_HEADER = struct.Struct('!I')
+
+_TAG = struct.Struct('!B')
+
+# Layouts of the fixed-size part of each message, after the type tag
+_CLIENT_REQUEST = struct.Struct('!qqI')  # sender, seqno, operation length
+_CLIENT_RESPONSE = struct.Struct('!qqqI')  # sender, requester, seqno, length
+_VOTE_MESSAGE = struct.Struct('!qq')  # sender, term
+_VOTE_REQUEST = struct.Struct('!qqqq')  # sender, term, last index, last term
+_APPEND_ENTRIES_RESPONSE = struct.Struct('!qqq?')  # sender, term, slot, success
+# sender, term, prev log index, prev log term, leader commit, number of entries
+_APPEND_ENTRIES_REQUEST = struct.Struct('!qqqqqI')
+_ENTRY_FIELDS = 'qqqI'  # term, client id, seqno, operation length
+_ENTRY_SIZE = struct.calcsize('!' + _ENTRY_FIELDS)
+
+_TAGS = {
+    ClientRequest: 1,
+    ClientResponse: 2,
+    ClientRequestFailure: 3,
+    VoteMessage: 4,
+    VoteRequest: 5,
+    AppendEntriesRequest: 6,
+    AppendEntriesResponse: 7,
+}
+
+
+class CodecError(ValueError):
+    '''Raised when decoding malformed data.'''
+
+
+def encode(msg: Message) -> bytes:
+    '''Returns the encoding of a raft message.'''
+    tag = _TAG.pack(_TAGS[type(msg)])
+    if isinstance(msg, ClientRequest):
+        return tag + _CLIENT_REQUEST.pack(
+            msg.sender_id, msg.seqno, len(msg.operation)) + msg.operation
+    elif isinstance(msg, ClientResponse):
+        return tag + _CLIENT_RESPONSE.pack(
+            msg.sender_id, msg.requester, msg.seqno, len(msg.result)) + msg.result
+    elif isinstance(msg, ClientRequestFailure):
+        return tag + _CLIENT_RESPONSE.pack(
+            msg.sender_id, msg.requester, msg.max_seqno,
+            len(msg.result)) + msg.result
+    elif isinstance(msg, VoteMessage):
+        return tag + _VOTE_MESSAGE.pack(msg.sender_id, msg.term)
+    elif isinstance(msg, VoteRequest):
+        return tag + _VOTE_REQUEST.pack(
+            msg.sender_id, msg.term, _nullable(msg.last_log_index),
+            _nullable(msg.last_log_term))
+    elif isinstance(msg, AppendEntriesResponse):
+        return tag + _APPEND_ENTRIES_RESPONSE.pack(
+            msg.sender_id, msg.term, _nullable(msg.slot), msg.success)
+    elif isinstance(msg, AppendEntriesRequest):
+        return tag + _APPEND_ENTRIES_REQUEST.pack(
+            msg.sender_id, msg.term, _nullable(msg.prev_log_index),
+            _nullable(msg.prev_log_term), _nullable(msg.leader_commit),
+            len(msg.entries)) + encode_entries(msg.entries)
+    raise TypeError('cannot encode %s' % type(msg).__name__)
+
+
+def encode_entries(entries: List[LogEntry]) -> bytes:
+    '''Encodes a batch of log entries as one buffer.'''
+    if not entries:
+        return b''
+    fields = []  # type: list
+    for entry in entries:
+        fields += (entry.term, entry.client_id, entry.seqno,
+                   len(entry.operation))
+    headers = _entry_headers(len(entries)).pack(*fields)
+    return b''.join([headers] + [entry.operation for entry in entries])
+
+
+def decode_frame_header(header: bytes, max_size: int) -> int:
+    '''Returns the payload length given by a frame header. Raises CodecError
+    if the frame is larger than max_size.'''
+    length = FRAME_HEADER.unpack(header)[0]
+    if length > max_size:
+        raise CodecError('frame of %d bytes exceeds limit' % length)
+    return length
+
+
+def decode(data: bytes) -> Message:
+    '''Decodes a message encoded with encode from any bytes-like object (the
+    result doesn't reference data). Raises CodecError if data is malformed.'''
+    try:
+        tag = data[0]
+        if tag == 1:
+            sender_id, seqno, length = _CLIENT_REQUEST.unpack_from(data, 1)
+            operation = _read(data, 1 + _CLIENT_REQUEST.size, length, True)
+            return ClientRequest(sender_id, seqno, operation)
+        elif tag == 2 or tag == 3:
+            sender_id, requester, seqno, length = \
+                _CLIENT_RESPONSE.unpack_from(data, 1)
+            result = _read(data, 1 + _CLIENT_RESPONSE.size, length, True)
+            if tag == 2:
+                return ClientResponse(sender_id, requester, seqno, result)
+            return ClientRequestFailure(sender_id, requester, seqno, result)
+        elif tag == 4:
+            _check_size(data, _VOTE_MESSAGE)
+            return VoteMessage(*_VOTE_MESSAGE.unpack_from(data, 1))
+        elif tag == 5:
+            _check_size(data, _VOTE_REQUEST)
+            sender_id, term, last_index, last_term = \
+                _VOTE_REQUEST.unpack_from(data, 1)
+            return VoteRequest(sender_id, term, _optional(last_index),
+                               _optional(last_term))
+        elif tag == 6:
+            sender_id, term, prev_index, prev_term, commit, num_entries = \
+                _APPEND_ENTRIES_REQUEST.unpack_from(data, 1)
+            entries = decode_entries(
+                data, 1 + _APPEND_ENTRIES_REQUEST.size, num_entries)
+            return AppendEntriesRequest(
+                sender_id, term, _optional(prev_index), _optional(prev_term),
+                entries, _optional(commit))
+        elif tag == 7:
+            _check_size(data, _APPEND_ENTRIES_RESPONSE)
+            sender_id, term, slot, success = \
+                _APPEND_ENTRIES_RESPONSE.unpack_from(data, 1)
+            return AppendEntriesResponse(sender_id, term, _optional(slot), success)
+    except (IndexError, struct.error) as e:
+        raise CodecError('truncated message') from e
+    raise CodecError('unknown message type %d' % tag)
+
+
+def decode_entries(data: bytes, pos: int, num_entries: int) -> List[LogEntry]:
+    '''Decodes a batch of num_entries log entries encoded with encode_entries
+    at data[pos:], which must end at the end of data.'''
+    if num_entries == 0:
+        _read(data, pos, 0, True)
+        return []
+    if pos + num_entries * _ENTRY_SIZE > len(data):
+        raise CodecError('message has wrong length')
+    headers = _entry_headers(num_entries)
+    fields = headers.unpack_from(data, pos)
+    pos += headers.size
+    entries = []
+    for i in range(0, len(fields), 4):
+        term, client_id, seqno, length = fields[i:i + 4]
+        # (positions only increase, so checking the final one below is enough
+        # to catch operations that run past the end of data)
+        operation = bytes(data[pos:pos + length])
+        pos += length
+        entries.append(LogEntry(term, ClientRequest(client_id, seqno, operation)))
+    _read(data, pos, 0, True)
+    return entries
+
+
+@lru_cache(maxsize=64)
+def _entry_headers(num_entries: int) -> struct.Struct:
+    # Layout of the headers of a batch of num_entries entries
+    return struct.Struct('!' + _ENTRY_FIELDS * num_entries)
+
+
+def _nullable(value: int) -> int:
+    return NULL if value is None else value
+
+
+def _optional(value: int) -> int:
+    return None if value == NULL else value
+
+
+def _read(data: bytes, pos: int, length: int, last: bool) -> bytes:
+    # Returns data[pos:pos + length]; if last is set, this must be the end
+    end = pos + length
+    if end > len(data) or (last and end != len(data)):
+        raise CodecError('message has wrong length')
+    return bytes(data[pos:end])
+
+
+def _check_size(data: bytes, layout: struct.Struct) -> None:
+    if len(data) != 1 + layout.size:
+        raise CodecError('message has wrong length')
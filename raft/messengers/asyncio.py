@@ -1,129 +1,111 @@
 import asyncio
-import pickle
-import struct
 import typing
-from collections import defaultdict
+
+from messaging.connection_manager import ConnectionManager
+from messaging.frame_protocol import FrameProtocol
+from messaging.transports import Address, create_server
 
 from ..config import BaseConfig
 from ..messages import Message, ServerMessage
+from ..messages.codec import (FRAME_HEADER, CodecError, decode,
+                              decode_frame_header, encode)
 from .messenger import Messenger
 
 
 class AsyncIoMessenger(Messenger):
-    '''asyncio implementation of Messenger.'''
+    '''asyncio implementation of Messenger, over TCP, Unix domain sockets or
+    shared memory depending on the addresses of the nodes.'''
 
     def __init__(self,
                  config: BaseConfig,
-                 clients: typing.Dict[int, typing.Tuple[str, int]],
-                 servers: typing.Dict[int, typing.Tuple[str, int]],
+                 clients: typing.Dict[int, Address],
+                 servers: typing.Dict[int, Address],
                  node_id: int,
                  is_client: bool,
                  loop: asyncio.AbstractEventLoop) -> None:
         super(AsyncIoMessenger, self).__init__(config)
-        self._clients = clients  # map from client id to (ip, port)
-        self._servers = servers  # map from server id to (ip, port)
+        # Maps from client and server ids to addresses: (ip, port) pairs, or
+        # Unix domain socket or shared-memory addresses (see messaging.transports)
+        self._clients = clients
+        self._servers = servers
         self._node_id = node_id
         self._is_client = is_client
         self._loop = loop
         self._started_server = False  # Whether start_server has been called
-        self._writers = defaultdict(list)  # type: ignore
-        self._opening_queues = defaultdict(lambda: None)  # type: ignore
+        # Send queues and health of the nodes we talk to, keyed by address
+        self.connections = ConnectionManager(config, loop, lambda a: a)
 
     def start_server(self) -> None:
         '''Start listening for incoming messages.'''
         assert not self._started_server
         self._started_server = True
         if self._is_client:
-            my_addr = self._clients[self._node_id][0]
-            my_port = self._clients[self._node_id][1]
+            address = self._clients[self._node_id]
         else:
-            my_addr = self._servers[self._node_id][0]
-            my_port = self._servers[self._node_id][1]
+            address = self._servers[self._node_id]
         self._loop.create_task(
-            asyncio.start_server(
-                lambda r, w: self._loop.create_task(
-                    self._handle_connection(r, w)),
-                my_addr,
-                my_port,
-                loop=self._loop))
+            create_server(self._loop, self._new_protocol, address))
 
     def send_server_message(self, server_id: int, message: ServerMessage) -> None:
-        addr = self._servers[server_id][0]
-        port = self._servers[server_id][1]
-        self._loop.create_task(self._send_message(addr, port, message))
+        self.connections.send(self._servers[server_id], self._frame(message))
 
     def send_client_message(self, client_id: int, message: Message) -> None:
-        addr = self._clients[client_id][0]
-        port = self._clients[client_id][1]
-        self._loop.create_task(self._send_message(addr, port, message))
+        self.connections.send(self._clients[client_id], self._frame(message))
 
     def broadcast_server_message(self, message) -> None:
+        # Serialize the message once and send the same frame to every server.
+        frame = self._frame(message)
         for i in range(0, len(self._servers)):
             if not self._is_client and i == self._node_id:
                 continue
-            self.send_server_message(i, message)
-
-    async def _send_message(self, addr: str, port: int, message: Message) -> None:
-        # Remove any closed StreamWriters from this node's writers list
-        self._writers[(addr, port)] = [
-            w for w in self._writers[(addr, port)] if not w.transport.is_closing()]
-
-        # If there are any left in the writers list, send the message
-        if self._writers[(addr, port)]:
-            msg_raw = pickle.dumps(message)
-            writer = self._writers[(addr, port)][0]
-            writer.write(struct.pack('I', len(msg_raw)))  # send message size
-            writer.write(msg_raw)
-            return
-
-        # Otherwise, we wait until we open a new connection to send the message.
-        # If we are currently trying to open a connection, add the message to the
-        # appropriate opening queue.
-        if self._opening_queues[(addr, port)] is not None:
-            self._opening_queues[(addr, port)].append(message)
-
-        # If we are not currently trying to open the connection, we try to open
-        # the connection ourself.
-        else:
-            # Create the opening queue and add the message to it.
-            self._opening_queues[(addr, port)] = [message]
-
-            # Try to open the connection.
-            try:
-                _, writer = await asyncio.open_connection(addr, port)
-                self._writers[(addr, port)].append(writer)
-                self.config.log('Opened connection with %s:%d' % (addr, port))
-
-                # Send queued messages to the node if the connection was successful.
-                if self._opening_queues[(addr, port)] is not None:
-                    for m in self._opening_queues[(addr, port)]:
-                        m_raw = pickle.dumps(m)
-                        # send message size
-                        writer.write(struct.pack('I', len(m_raw)))
-                        writer.write(m_raw)
-                    self._opening_queues[(addr, port)] = None
-
-            except ConnectionError:
-                self.config.log('Failed to open connection with %s:%d' % (addr, port))
-
-            # Erase the opening queue
-            self._opening_queues[(addr, port)] = None
+            self.connections.send(self._servers[i], frame)
+
+    @staticmethod
+    def _frame(message: Message) -> bytes:
+        '''Encodes a message, prefixed by its size.'''
+        msg_raw = encode(message)
+        return FRAME_HEADER.pack(len(msg_raw)) + msg_raw
+
+    def is_server_up(self, server_id: int) -> bool:
+        return self.connections.is_up(self._servers[server_id])
+
+    def send_queue_stats(self) -> typing.Dict[Address, dict]:
+        '''Returns the health and send queue statistics of each node this
+        node has sent messages to (see ConnectionManager.stats).'''
+        return self.connections.stats()
+
+    def _new_protocol(self) -> asyncio.BaseProtocol:
+        '''Returns the protocol that receives frames over a new connection:
+        FrameProtocol or a stream reader, depending on config.transport.'''
+        if self.config.transport == 'protocol':
+            return FrameProtocol(FRAME_HEADER, self._payload_size, self._receive)
+        assert self.config.transport == 'stream'
+        return asyncio.StreamReaderProtocol(asyncio.StreamReader(),
+                                            self._handle_connection)
 
     async def _handle_connection(self, reader: asyncio.StreamReader,
                                  writer: asyncio.StreamWriter) -> None:
         # Recv message and pass to callback
         while True:
             try:
-                msg_size_raw = await reader.readexactly(struct.calcsize('I'))
-                msg_size = struct.unpack('I', msg_size_raw)[0]
-                msg_raw = await reader.readexactly(msg_size)
-                message = pickle.loads(msg_raw)
-            except asyncio.IncompleteReadError:
-                break
-            if not isinstance(message, Message):
+                header = await reader.readexactly(FRAME_HEADER.size)
+                payload = await reader.readexactly(self._payload_size(header))
+            except (asyncio.IncompleteReadError, CodecError):
                 break
-
-            # Verify signature / message validity and invoke callback
-            if not self.deliver(message):
+            if not self._receive(payload):
                 break
         writer.close()
+
+    def _payload_size(self, header: bytes) -> int:
+        return decode_frame_header(header, self.config.max_frame_size)
+
+    def _receive(self, payload: bytes) -> bool:
+        '''Decodes and delivers a received frame payload. Returns false if
+        the connection should be closed.'''
+        try:
+            message = decode(payload)
+        except CodecError:
+            return False
+
+        # Verify signature / message validity and invoke callback
+        return self.deliver(message)
@@ -32,6 +32,11 @@ class Messenger(object):
         '''Sends a message to all other servers.'''
         raise NotImplementedError
 
+    def is_server_up(self, server_id: int) -> bool:
+        '''Returns false if a server is known to be unreachable, so that
+        messages to it can be skipped. By default, servers are assumed up.'''
+        return True
+
     def deliver(self, msg: Message) -> bool:
         '''Invokes on_message on all attached listeners.
         Returns true on success, false, on failure.'''
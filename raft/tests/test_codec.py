@@ -0,0 +1,112 @@
+import struct
+import unittest
+
+from ..messages import (AppendEntriesRequest, AppendEntriesResponse,
+                        ClientRequest, ClientRequestFailure, ClientResponse,
+                        LogEntry, VoteMessage, VoteRequest)
+from ..messages.codec import (FRAME_HEADER, CodecError, decode,
+                              decode_entries, decode_frame_header, encode,
+                              encode_entries)
+
+
+def fields(obj):
+    # Attributes of a message or log entry, with nested ones expanded
+    if isinstance(obj, list):
+        return [fields(item) for item in obj]
+    if hasattr(obj, '__dict__'):
+        return (type(obj).__name__,
+                dict((k, fields(v)) for k, v in vars(obj).items()))
+    return obj
+
+
+def build_entries(num_entries: int) -> list:
+    return [LogEntry(i // 3, ClientRequest(i % 4, i, b'op %d' % i * i))
+            for i in range(num_entries)]
+
+
+MESSAGES = [
+    ClientRequest(3, 7, b'operation'),
+    ClientRequest(0, 0, b''),
+    ClientResponse(1, 3, 7, b'result'),
+    ClientRequestFailure(2, 3, 6, b''),
+    VoteMessage(1, 5),
+    VoteRequest(2, 5, 10, 4),
+    VoteRequest(2, 1, None, None),
+    AppendEntriesRequest(0, 5, None, None, [], None),
+    AppendEntriesRequest(0, 5, 9, 4, build_entries(10), 8),
+    AppendEntriesResponse(1, 5, 9, True),
+    AppendEntriesResponse(1, 5, None, False),
+]
+
+
+class TestCodec(unittest.TestCase):
+
+    def assertRoundTrips(self, msg):
+        decoded = decode(encode(msg))
+        self.assertEqual(fields(decoded), fields(msg))
+
+    def test_round_trip(self):
+        for msg in MESSAGES:
+            self.assertRoundTrips(msg)
+
+        # Negative and extreme integers, and bytes-like inputs
+        self.assertRoundTrips(VoteRequest(-1, 2 ** 63 - 1, 0, -2 ** 63 + 1))
+        msg = ClientRequest(1, 2, b'op')
+        self.assertEqual(fields(decode(memoryview(encode(msg)))), fields(msg))
+        self.assertEqual(fields(decode(bytearray(encode(msg)))), fields(msg))
+
+    def test_entry_batches(self):
+        for num_entries in (0, 1, 2, 100):
+            entries = build_entries(num_entries)
+            data = b'prefix' + encode_entries(entries)
+            self.assertEqual(fields(decode_entries(data, 6, num_entries)),
+                             fields(entries))
+
+        # The batch must end exactly at the end of the data
+        data = encode_entries(build_entries(3))
+        with self.assertRaises(CodecError):
+            decode_entries(data + b'x', 0, 3)
+        with self.assertRaises(CodecError):
+            decode_entries(data[:-1], 0, 3)
+        with self.assertRaises(CodecError):
+            decode_entries(data, 0, 4)
+
+        # Operations are copied out of the buffer they are decoded from
+        buf = bytearray(encode(MESSAGES[-3]))
+        decoded = decode(memoryview(buf))
+        buf[:] = bytes(len(buf))
+        self.assertEqual(fields(decoded), fields(MESSAGES[-3]))
+
+    def test_truncated_messages(self):
+        for msg in MESSAGES:
+            data = encode(msg)
+            for end in range(len(data)):
+                with self.assertRaises(CodecError):
+                    decode(data[:end])
+
+    def test_malformed_messages(self):
+        # Trailing data
+        for msg in MESSAGES:
+            with self.assertRaises(CodecError):
+                decode(encode(msg) + b'\0')
+
+        # Unknown type tags
+        for tag in (0, 8, 255):
+            with self.assertRaises(CodecError):
+                decode(bytes([tag]) + encode(VoteMessage(1, 5))[1:])
+
+        # Lengths that run past the end of the message
+        data = bytearray(encode(ClientRequest(3, 7, b'operation')))
+        struct.pack_into('!I', data, 17, 2 ** 32 - 1)
+        with self.assertRaises(CodecError):
+            decode(data)
+        data = bytearray(encode(AppendEntriesRequest(0, 5, 9, 4,
+                                                     build_entries(2), 8)))
+        struct.pack_into('!I', data, 41, 2 ** 32 - 1)
+        with self.assertRaises(CodecError):
+            decode(data)
+
+    def test_frame_size_limit(self):
+        self.assertEqual(decode_frame_header(FRAME_HEADER.pack(100), 100), 100)
+        with self.assertRaises(CodecError):
+            decode_frame_header(FRAME_HEADER.pack(101), 100)
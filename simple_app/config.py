@@ -6,10 +6,14 @@ sys.path.insert(0, os.path.abspath(
 from Crypto.PublicKey import RSA
 
 
+# Servers reply to clients over the connections their requests arrive on, and
+# only connect to these addresses if that connection has closed
 client_addrs = {}
 for i in range(50):
     client_addrs[i] = ('127.0.0.1', 8000 + i)
 
+# Replicas on the same host can also use Unix domain sockets ('unix:<path>') or
+# shared memory ('shm:<path>'); see messaging.transports
 server_addrs = {
     0: ('127.0.0.1', 9000),
     1: ('127.0.0.1', 9001),